@@ -1,51 +1,47 @@
-from .math.max_node import NODE_CLASS_MAPPINGS as MAX_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS as MAX_DISPLAY_MAPPINGS
-from .math.min_node import NODE_CLASS_MAPPINGS as MIN_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS as MIN_DISPLAY_MAPPINGS
-from .math.average_node import NODE_CLASS_MAPPINGS as AVG_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS as AVG_DISPLAY_MAPPINGS
-from .image.image_url_loader_node import NODE_CLASS_MAPPINGS as IMAGE_URL_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS as IMAGE_URL_DISPLAY_MAPPINGS
-from .image.qwen_image_edit_node import NODE_CLASS_MAPPINGS as QWEN_EDIT_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS as QWEN_EDIT_DISPLAY_MAPPINGS
-from .image.wanx_image_generation_node import NODE_CLASS_MAPPINGS as WANX_GEN_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS as WANX_GEN_DISPLAY_MAPPINGS
-from .image.seedream_image_to_image_node import NODE_CLASS_MAPPINGS as SEEDREAM_I2I_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS as SEEDREAM_I2I_DISPLAY_MAPPINGS
-from .llm.llm_api_node import NODE_CLASS_MAPPINGS as LLM_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS as LLM_DISPLAY_MAPPINGS
-from .llm.llm_vision_node import NODE_CLASS_MAPPINGS as LLM_VISION_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS as LLM_VISION_DISPLAY_MAPPINGS
-from .llm.llm_web_search_node import NODE_CLASS_MAPPINGS as LLM_WEB_SEARCH_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS as LLM_WEB_SEARCH_DISPLAY_MAPPINGS
-from .llm.doubao_vision_websearch_node import NODE_CLASS_MAPPINGS as DOUBAO_VISION_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS as DOUBAO_VISION_DISPLAY_MAPPINGS
-from .utils.string_is_not_empty_node import NODE_CLASS_MAPPINGS as STRING_NOT_EMPTY_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS as STRING_NOT_EMPTY_DISPLAY_MAPPINGS
-from .utils.conditional_pass_node import NODE_CLASS_MAPPINGS as CONDITIONAL_PASS_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS as CONDITIONAL_PASS_DISPLAY_MAPPINGS
+import importlib
+
+from .utils.logger import get_logger
+
+logger = get_logger("registry")
+
+# 节点模块列表（按注册顺序）
+# 节点模块内部通过 utils.lazy_import 延迟导入 torch / numpy / PIL / requests，
+# 因此这里导入模块只会加载节点类定义，重量级依赖在节点第一次执行时才会加载
+NODE_MODULES = [
+    ".math.max_node",
+    ".math.min_node",
+    ".math.average_node",
+    ".image.image_url_loader_node",
+    ".image.qwen_image_edit_node",
+    ".image.wanx_image_generation_node",
+    ".image.seedream_image_to_image_node",
+    ".llm.llm_api_node",
+    ".llm.llm_vision_node",
+    ".llm.llm_batch_api_node",
+    ".llm.llm_web_search_node",
+    ".llm.llm_session_node",
+    ".llm.doubao_vision_websearch_node",
+    ".utils.string_is_not_empty_node",
+    ".utils.conditional_pass_node",
+]
 
 # 合并所有节点映射
 NODE_CLASS_MAPPINGS = {}
-NODE_CLASS_MAPPINGS.update(MAX_MAPPINGS)
-NODE_CLASS_MAPPINGS.update(MIN_MAPPINGS)
-NODE_CLASS_MAPPINGS.update(AVG_MAPPINGS)
-NODE_CLASS_MAPPINGS.update(IMAGE_URL_MAPPINGS)
-NODE_CLASS_MAPPINGS.update(QWEN_EDIT_MAPPINGS)
-NODE_CLASS_MAPPINGS.update(WANX_GEN_MAPPINGS)
-NODE_CLASS_MAPPINGS.update(SEEDREAM_I2I_MAPPINGS)
-NODE_CLASS_MAPPINGS.update(LLM_MAPPINGS)
-NODE_CLASS_MAPPINGS.update(LLM_VISION_MAPPINGS)
-NODE_CLASS_MAPPINGS.update(LLM_WEB_SEARCH_MAPPINGS)
-NODE_CLASS_MAPPINGS.update(DOUBAO_VISION_MAPPINGS)
-NODE_CLASS_MAPPINGS.update(STRING_NOT_EMPTY_MAPPINGS)
-NODE_CLASS_MAPPINGS.update(CONDITIONAL_PASS_MAPPINGS)
-
 # 合并所有显示名称映射
 NODE_DISPLAY_NAME_MAPPINGS = {}
-NODE_DISPLAY_NAME_MAPPINGS.update(MAX_DISPLAY_MAPPINGS)
-NODE_DISPLAY_NAME_MAPPINGS.update(MIN_DISPLAY_MAPPINGS)
-NODE_DISPLAY_NAME_MAPPINGS.update(AVG_DISPLAY_MAPPINGS)
-NODE_DISPLAY_NAME_MAPPINGS.update(IMAGE_URL_DISPLAY_MAPPINGS)
-NODE_DISPLAY_NAME_MAPPINGS.update(QWEN_EDIT_DISPLAY_MAPPINGS)
-NODE_DISPLAY_NAME_MAPPINGS.update(WANX_GEN_DISPLAY_MAPPINGS)
-NODE_DISPLAY_NAME_MAPPINGS.update(SEEDREAM_I2I_DISPLAY_MAPPINGS)
-NODE_DISPLAY_NAME_MAPPINGS.update(LLM_DISPLAY_MAPPINGS)
-NODE_DISPLAY_NAME_MAPPINGS.update(LLM_VISION_DISPLAY_MAPPINGS)
-NODE_DISPLAY_NAME_MAPPINGS.update(LLM_WEB_SEARCH_DISPLAY_MAPPINGS)
-NODE_DISPLAY_NAME_MAPPINGS.update(DOUBAO_VISION_DISPLAY_MAPPINGS)
-NODE_DISPLAY_NAME_MAPPINGS.update(STRING_NOT_EMPTY_DISPLAY_MAPPINGS)
-NODE_DISPLAY_NAME_MAPPINGS.update(CONDITIONAL_PASS_DISPLAY_MAPPINGS)
+
+for _module_name in NODE_MODULES:
+    try:
+        _module = importlib.import_module(_module_name, __name__)
+    except Exception as e:
+        # 单个模块加载失败不影响其他节点注册
+        logger.error("加载节点模块 %s 失败: %s", _module_name, e)
+        continue
+    NODE_CLASS_MAPPINGS.update(getattr(_module, "NODE_CLASS_MAPPINGS", {}))
+    NODE_DISPLAY_NAME_MAPPINGS.update(getattr(_module, "NODE_DISPLAY_NAME_MAPPINGS", {}))
 
 # 导出节点映射，让ComfyUI能够识别节点
 __all__ = ['NODE_CLASS_MAPPINGS', 'NODE_DISPLAY_NAME_MAPPINGS']
 
 # 版本信息
-__version__ = "2.0.0"
\ No newline at end of file
+__version__ = "2.0.0"
@@ -0,0 +1,123 @@
+"""
+基准测试公共工具
+
+基准脚本不依赖 ComfyUI：直接把仓库根目录作为 "xj_nodes" 包加载。
+"""
+
+import importlib
+import importlib.util
+import json
+import os
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE_NAME = "xj_nodes"
+
+
+def load_package():
+    """
+    以 xj_nodes 包名加载仓库（执行顶层 __init__，注册全部节点）
+
+    Returns:
+        module: xj_nodes 包
+    """
+    if PACKAGE_NAME in sys.modules:
+        return sys.modules[PACKAGE_NAME]
+    spec = importlib.util.spec_from_file_location(
+        PACKAGE_NAME,
+        os.path.join(REPO_ROOT, "__init__.py"),
+        submodule_search_locations=[REPO_ROOT],
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[PACKAGE_NAME] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def import_submodule(name):
+    """
+    导入 xj_nodes 的子模块，例如 import_submodule("utils.logger")
+    """
+    load_package()
+    return importlib.import_module(f"{PACKAGE_NAME}.{name}")
+
+
+def percentile(values, pct):
+    """
+    计算百分位数（线性插值）
+
+    Args:
+        values (list[float]): 样本
+        pct (float): 0-100
+
+    Returns:
+        float: 百分位值，样本为空时返回 0.0
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100.0
+    lower = int(k)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (k - lower)
+
+
+def peak_rss_mb():
+    """返回当前进程的峰值常驻内存（MB）"""
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    if sys.platform == "darwin":
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+def current_rss_mb():
+    """返回当前进程的常驻内存（MB）；非 Linux 平台退化为峰值 RSS"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return peak_rss_mb()
+
+
+def open_fd_counts():
+    """
+    返回 (打开的文件描述符数, 其中 socket 数)；无 /proc 时返回 (None, None)
+    """
+    fd_dir = "/proc/self/fd"
+    if not os.path.isdir(fd_dir):
+        return None, None
+    total = sockets = 0
+    for name in os.listdir(fd_dir):
+        try:
+            target = os.readlink(os.path.join(fd_dir, name))
+        except OSError:
+            continue
+        total += 1
+        if target.startswith("socket:"):
+            sockets += 1
+    return total, sockets
+
+
+def os_thread_count():
+    """返回进程的系统线程数（包括 torch/OpenMP 等原生线程）；无 /proc 时返回 None"""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("Threads:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def write_report(report, output=None):
+    """将报告以 JSON 写入文件或标准输出"""
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
@@ -0,0 +1,256 @@
+"""
+图像编解码微基准矩阵
+
+覆盖包内每一条 tensor <-> bytes 路径：
+
+- 编码器（tensor -> base64）：LLMVisionNode.image_to_base64（含按模型 / detail_level 缩放的变体）、
+  LLMWebSearchNode.image_to_base64、
+  DoubaoVisionWebSearchNode.encode_image_to_base64、SeedreamImageToImageNode.encode_image_to_base64、
+  QwenImageEditNode.tensor_to_base64、WanxImageGenerationNode.tensor_to_base64
+- 解码器（bytes/base64 -> tensor）：SeedreamImageToImageNode.decode_base64_to_tensor、
+  QwenImageEditNode.base64_to_tensor、WanxImageGenerationNode.base64_to_tensor、
+  ImageUrlLoaderNode.decode_image_bytes
+
+维度：分辨率 × 批大小 ×（解码器的输入格式/质量）。编码器的格式由节点自身决定，
+另外输出 PIL 直接编码各格式的参考行，便于区分节点开销与编码器本身的开销。
+
+每个单元格报告：每批耗时（p50/min）、每张耗时、吞吐（MP/s）、tracemalloc 峰值分配与分配块数、
+输出字节数。`--baseline` 指定之前的报告时会打印每个单元格的加速比。
+
+用法:
+    python benchmarks/codec_matrix.py --output codec_before.json
+    python benchmarks/codec_matrix.py --baseline codec_before.json --output codec_after.json
+    python benchmarks/codec_matrix.py --codecs "Seedream.encode,Seedream.decode" --resolutions 1024,4k --batches 1,4
+"""
+
+import argparse
+import base64
+import io
+import json
+import sys
+import time
+import tracemalloc
+
+from _common import import_submodule, load_package, percentile, write_report
+
+RESOLUTIONS = {
+    "512": (512, 512),
+    "1024": (1024, 1024),
+    "2048": (2048, 2048),
+    "4k": (3840, 2160),
+}
+
+
+def make_images(batch, width, height, content, seed):
+    """
+    生成 [B,H,W,3] float32 输入
+
+    smooth 为渐变叠加少量噪声（接近照片的压缩率），noise 为纯噪声（PNG 最坏情况）
+    """
+    import torch
+
+    generator = torch.Generator().manual_seed(seed)
+    if content == "noise":
+        return torch.rand(batch, height, width, 3, generator=generator)
+    ys = torch.linspace(0, 1, height).view(1, height, 1, 1)
+    xs = torch.linspace(0, 1, width).view(1, 1, width, 1)
+    phase = torch.rand(batch, 1, 1, 3, generator=generator)
+    base = (torch.sin((xs * 3 + ys * 2 + phase) * 3.14159) + 1) / 2
+    noise = torch.rand(batch, height, width, 3, generator=generator) * 0.05
+    return (base * 0.95 + noise).clamp(0, 1)
+
+
+def encode_reference(image, fmt, quality):
+    """PIL 直接编码（参考行）：返回文件字节"""
+    import numpy as np
+    from PIL import Image
+
+    array = (image.numpy() * 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    kwargs = {"quality": quality} if quality else {}
+    Image.fromarray(array).save(buffer, format=fmt, **kwargs)
+    return buffer.getvalue()
+
+
+def build_codecs(package):
+    """
+    返回 {名称: (类型, 函数)}
+
+    编码器函数接收单张 [H,W,3] 张量，返回 base64 字符串；
+    解码器函数接收 (文件字节, base64 字符串)，返回 [1,H,W,3] 张量。
+    """
+    nodes = package.NODE_CLASS_MAPPINGS
+    vision = nodes["LLMVisionNode"]()
+    search = nodes["LLMWebSearchNode"]()
+    doubao = nodes["DoubaoVisionWebSearchNode"]()
+    seedream = nodes["SeedreamImageToImageNode"]()
+    qwen = nodes["QwenImageEditNode"]()
+    wanx = nodes["WanxImageGenerationNode"]()
+    loader = nodes["ImageUrlLoaderNode"]()
+
+    return {
+        "LLMVision.encode": ("encode", vision.image_to_base64),
+        # 带模型名时按该模型在对应 detail_level 下的实际使用尺寸缩小后再编码
+        "LLMVision.encode[gpt-4o/low]": ("encode", lambda img: vision.image_to_base64(img, "gpt-4o", "low")),
+        "LLMVision.encode[gpt-4o/auto]": ("encode", lambda img: vision.image_to_base64(img, "gpt-4o", "auto")),
+        "LLMVision.encode[qwen-vl-plus]": ("encode", lambda img: vision.image_to_base64(img, "qwen-vl-plus")),
+        "LLMWebSearch.encode": ("encode", search.image_to_base64),
+        "Doubao.encode": ("encode", doubao.encode_image_to_base64),
+        "Doubao.encode[low]": ("encode", lambda img: doubao.encode_image_to_base64(img, "low")),
+        "Seedream.encode": ("encode", seedream.encode_image_to_base64),
+        "Qwen.encode": ("encode", qwen.tensor_to_base64),
+        "Wanx.encode": ("encode", wanx.tensor_to_base64),
+        "Seedream.decode": ("decode", lambda data, b64: seedream.decode_base64_to_tensor(b64)),
+        "Qwen.decode": ("decode", lambda data, b64: qwen.base64_to_tensor(b64)),
+        "Wanx.decode": ("decode", lambda data, b64: wanx.base64_to_tensor(b64)),
+        "ImageUrlLoader.decode": ("decode", lambda data, b64: loader.decode_image_bytes(data)),
+    }
+
+
+def parse_formats(text):
+    """'png,jpeg:95,webp:90' -> [("PNG", None), ("JPEG", 95), ("WEBP", 90)]"""
+    formats = []
+    for item in text.split(","):
+        if not item:
+            continue
+        name, _, quality = item.partition(":")
+        formats.append((name.upper(), int(quality) if quality else None))
+    return formats
+
+
+def measure(run, repeat, warmup):
+    """返回 (耗时列表 ms, tracemalloc 峰值字节, 分配块数, 最后一次结果)"""
+    result = None
+    for _ in range(warmup):
+        result = run()
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = run()
+        times.append((time.perf_counter() - start) * 1000)
+
+    # 分配统计单独跑一次，避免 tracemalloc 的开销混入计时
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before = tracemalloc.take_snapshot()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    blocks = sum(max(stat.count_diff, 0) for stat in after.compare_to(before, "filename"))
+    return times, peak, blocks, result
+
+
+def cell_key(row):
+    return f"{row['codec']}|{row['resolution']}|b{row['batch']}|{row['format']}"
+
+
+def run_matrix(args):
+    import torch
+
+    package = load_package()
+    codecs = build_codecs(package)
+    selected = [c for c in args.codecs.split(",") if c] or list(codecs)
+    formats = parse_formats(args.formats)
+    rows = []
+
+    for res_name in [r for r in args.resolutions.split(",") if r]:
+        width, height = RESOLUTIONS[res_name]
+        for batch in [int(b) for b in args.batches.split(",") if b]:
+            images = make_images(batch, width, height, args.content, args.seed)
+            megapixels = batch * width * height / 1e6
+
+            def add_row(codec, fmt, quality, run, output_size):
+                times, peak, blocks, result = measure(run, args.repeat, args.warmup)
+                row = {
+                    "codec": codec,
+                    "resolution": res_name,
+                    "width": width,
+                    "height": height,
+                    "batch": batch,
+                    "format": f"{fmt}:{quality}" if quality else fmt,
+                    "time_ms": {
+                        "p50": round(percentile(times, 50), 3),
+                        "min": round(min(times), 3),
+                    },
+                    "per_image_ms": round(percentile(times, 50) / batch, 3),
+                    "mp_per_s": round(megapixels / (percentile(times, 50) / 1000), 2),
+                    "alloc_peak_mb": round(peak / (1024 * 1024), 2),
+                    "alloc_blocks": blocks,
+                    "output_bytes": output_size(result),
+                }
+                rows.append(row)
+                print(f"{codec:24s} {res_name:>5s} b{batch:<2d} {row['format']:9s} "
+                      f"p50={row['time_ms']['p50']:>9.2f}ms  {row['mp_per_s']:>7.2f}MP/s  "
+                      f"peak={row['alloc_peak_mb']:>8.2f}MB  out={row['output_bytes']}", file=sys.stderr)
+
+            # 参考行：PIL 直接编码
+            if args.reference:
+                for fmt, quality in formats:
+                    add_row(f"PIL.{fmt.lower()}", fmt, quality,
+                            lambda: [encode_reference(images[i], fmt, quality) for i in range(batch)],
+                            lambda out: sum(len(o) for o in out))
+
+            for codec in selected:
+                kind, func = codecs[codec]
+                if kind == "encode":
+                    add_row(codec, "node", None,
+                            lambda: [func(images[i]) for i in range(batch)],
+                            lambda out: sum(len(o or "") for o in out))
+                    continue
+                # 解码器：按每种输入格式预先编码好载荷，批内逐张解码再拼接（与节点的批处理方式一致）
+                for fmt, quality in formats:
+                    payloads = []
+                    for i in range(batch):
+                        data = encode_reference(images[i], fmt, quality)
+                        payloads.append((data, base64.b64encode(data).decode("utf-8")))
+                    add_row(codec, fmt, quality,
+                            lambda: torch.cat([func(data, b64) for data, b64 in payloads], dim=0),
+                            lambda out: out.numel() * out.element_size())
+    return rows
+
+
+def compare(rows, baseline_path):
+    """打印相对基线报告的加速比（基线 p50 / 当前 p50）"""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {cell_key(r): r for r in json.load(f)["rows"]}
+    print("\n相对基线的加速比（>1 表示更快）:", file=sys.stderr)
+    for row in rows:
+        old = baseline.get(cell_key(row))
+        if not old:
+            continue
+        speedup = old["time_ms"]["p50"] / row["time_ms"]["p50"] if row["time_ms"]["p50"] else float("inf")
+        row["speedup_vs_baseline"] = round(speedup, 3)
+        print(f"{cell_key(row):48s} {old['time_ms']['p50']:>9.2f}ms -> {row['time_ms']['p50']:>9.2f}ms  "
+              f"x{speedup:.2f}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="XJ Nodes 图像编解码微基准矩阵")
+    parser.add_argument("--codecs", default="", help="逗号分隔的编解码器名，默认全部")
+    parser.add_argument("--resolutions", default="512,1024,2048,4k",
+                        help=f"逗号分隔，可选: {', '.join(RESOLUTIONS)}")
+    parser.add_argument("--batches", default="1,4", help="逗号分隔的批大小")
+    parser.add_argument("--formats", default="png,jpeg:95,jpeg:75,webp:90",
+                        help="解码器输入与参考行的格式:质量")
+    parser.add_argument("--content", choices=["smooth", "noise"], default="smooth")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-reference", dest="reference", action="store_false",
+                        help="不输出 PIL 直接编码的参考行")
+    parser.add_argument("--baseline", default=None, help="之前的 JSON 报告，用于计算加速比")
+    parser.add_argument("--output", default=None, help="JSON 报告输出路径")
+    args = parser.parse_args()
+
+    import_submodule("utils.logger").set_quiet(True)
+
+    rows = run_matrix(args)
+    if args.baseline:
+        compare(rows, args.baseline)
+    write_report({"config": vars(args), "rows": rows}, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+导入耗时基准
+
+每个节点模块在独立的子进程中导入（不执行包顶层 __init__），记录导入耗时以及
+导入后已加载的重量级依赖，用于衡量 ComfyUI 冷启动成本。
+
+用法:
+    python benchmarks/import_time.py [--repeat 5] [--output import_time.json]
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+from _common import REPO_ROOT, PACKAGE_NAME, load_package, write_report
+
+HEAVY_MODULES = ["torch", "numpy", "PIL", "requests"]
+
+# 子进程代码：先注册一个不执行 __init__ 的空包，再导入目标模块
+_CHILD_TEMPLATE = r"""
+import importlib, json, sys, time, types
+pkg = types.ModuleType({package!r})
+pkg.__path__ = [{root!r}]
+sys.modules[{package!r}] = pkg
+start = time.perf_counter()
+if {target!r} == "__package__":
+    del sys.modules[{package!r}]
+    import importlib.util
+    spec = importlib.util.spec_from_file_location({package!r}, {root!r} + "/__init__.py",
+                                                  submodule_search_locations=[{root!r}])
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[{package!r}] = module
+    spec.loader.exec_module(module)
+elif {target!r} == "__heavy__":
+    for name in {heavy!r}:
+        importlib.import_module(name)
+else:
+    importlib.import_module({package!r} + {target!r})
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed,
+                  "heavy_loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(target, repeat):
+    """在子进程中重复导入 target，返回耗时统计"""
+    samples = []
+    heavy_loaded = []
+    for _ in range(repeat):
+        code = _CHILD_TEMPLATE.format(package=PACKAGE_NAME, root=REPO_ROOT,
+                                      target=target, heavy=HEAVY_MODULES)
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True,
+                             text=True, check=True, cwd="/")
+        data = json.loads(out.stdout.strip().splitlines()[-1])
+        samples.append(data["seconds"] * 1000)
+        heavy_loaded = data["heavy_loaded"]
+    return {
+        "median_ms": round(statistics.median(samples), 3),
+        "min_ms": round(min(samples), 3),
+        "max_ms": round(max(samples), 3),
+        "heavy_loaded": heavy_loaded,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="XJ Nodes 导入耗时基准")
+    parser.add_argument("--repeat", type=int, default=5, help="每个模块重复次数")
+    parser.add_argument("--output", default=None, help="JSON 报告输出路径")
+    args = parser.parse_args()
+
+    package = load_package()
+    report = {"python": sys.version.split()[0], "repeat": args.repeat, "modules": {}}
+    for module_name in package.NODE_MODULES:
+        report["modules"][module_name] = measure(module_name, args.repeat)
+    report["package"] = measure("__package__", args.repeat)
+    # 节点首次执行时才会支付的依赖导入成本，作为对照
+    report["heavy_dependencies_first_use"] = measure("__heavy__", args.repeat)
+
+    for name, stats in report["modules"].items():
+        print(f"{name:45s} {stats['median_ms']:10.2f} ms  heavy={stats['heavy_loaded']}",
+              file=sys.stderr)
+    print(f"{'<package __init__>':45s} {report['package']['median_ms']:10.2f} ms",
+          file=sys.stderr)
+    write_report(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
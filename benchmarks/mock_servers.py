@@ -0,0 +1,766 @@
+"""
+本地模拟服务
+
+在一个 HTTP 服务中模拟各节点调用的第三方接口，支持可配置的延迟和负载大小：
+
+- OpenAI 兼容 /chat/completions（JSON 与 SSE 流式），含 ARK /api/v3/chat/completions
+- ARK 上下文缓存：/api/v3/context/create 与 /api/v3/context/chat/completions
+- DashScope 异步任务：image-synthesis 提交 + /api/v1/tasks/{task_id} 查询
+- DashScope multimodal-generation（Qwen 图像编辑）
+- ARK images/generations（Seedream，b64_json 或 url）
+- 搜索接口：SerpAPI /search、Google Custom Search /customsearch/v1、DuckDuckGo /duckduckgo/
+- 图片文件：/files/images/<name>.png
+- OpenAI 兼容 Batch API：/files 上传 JSONL、/batches 创建与查询、/files/{id}/content 下载结果
+- 图像上传：DashScope 临时存储 /api/v1/uploads getPolicy + /oss 表单上传（oss:// 地址），
+  对象存储 PUT/HEAD/GET /store/<name>
+
+支持故障注入：按比例返回 429、挂起不响应（模拟超时）、截断响应体后断开连接。
+请求体包含 SENSITIVE_MARKER 时对话与图像生成接口返回 400 InvalidParameter（模拟内容审核拒绝）。
+
+用法:
+    server = MockProviderServer(MockConfig(latency_ms=50)).start()
+    ...  # server.base_url
+    server.stop()
+"""
+
+import base64
+import hashlib
+import importlib
+import io
+import json
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+# 请求体包含该标记时，对话与图像生成接口返回 400 InvalidParameter（模拟内容审核拒绝）
+SENSITIVE_MARKER = "mock-sensitive"
+
+
+@dataclass
+class MockConfig:
+    """模拟服务配置"""
+    # 每个请求的基础延迟与随机抖动（毫秒）
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    # 返回图片的边长（像素，正方形随机噪声 PNG）
+    image_size: int = 1024
+    # 每次生成返回的图片数量（请求开启组图时改为请求的 max_images）
+    images_per_result: int = 1
+    # 组图时每张图片的生成间隔（毫秒）
+    image_interval_ms: float = 0.0
+    # 对话回复的字符数
+    completion_chars: int = 400
+    # SSE 分块数量与分块间隔（毫秒）
+    sse_chunks: int = 20
+    sse_chunk_interval_ms: float = 0.0
+    # 搜索结果数量与摘要长度
+    search_results: int = 5
+    snippet_chars: int = 200
+    # 异步任务在 SUCCEEDED 之前返回 RUNNING 的次数
+    task_polls: int = 1
+    # 故障注入比例（0-1）：429 限流、挂起不响应、截断响应体
+    fault_429_rate: float = 0.0
+    fault_timeout_rate: float = 0.0
+    fault_truncate_rate: float = 0.0
+    # 挂起故障持续的秒数（应大于客户端超时）
+    fault_timeout_s: float = 5.0
+    # 随机种子，保证负载可复现
+    seed: int = 0
+
+
+class _PayloadCache:
+    """按尺寸缓存生成的 PNG，避免每次请求重复编码"""
+
+    def __init__(self, seed):
+        self._seed = seed
+        self._png = {}
+        self._lock = threading.Lock()
+
+    def png(self, size):
+        with self._lock:
+            data = self._png.get(size)
+            if data is None:
+                import numpy as np
+                from PIL import Image
+                rng = np.random.default_rng(self._seed + size)
+                pixels = rng.integers(0, 256, size=(size, size, 3), dtype=np.uint8)
+                buffer = io.BytesIO()
+                Image.fromarray(pixels).save(buffer, format="PNG")
+                data = buffer.getvalue()
+                self._png[size] = data
+            return data
+
+
+class MockProviderServer:
+    """
+    多协议模拟服务，运行在后台线程中
+
+    Attributes:
+        config (MockConfig): 当前配置，可在运行时修改
+        stats (dict): 每个路由的请求计数
+        base_url (str): 服务地址，如 http://127.0.0.1:54321
+    """
+
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        self.config = config or MockConfig()
+        self.stats = {}
+        self.tasks = {}
+        # 上下文缓存：context_id -> 前缀 tokens
+        self.contexts = {}
+        # 自动前缀缓存：见过的消息前缀哈希 -> 前缀 tokens
+        self.prefixes = {}
+        self.files = {}
+        self.batches = {}
+        # 上传的图像：oss:// 对象键或 /store/ 下的文件名 -> 字节
+        self.objects = {}
+        # /store/ 下对象的写入时间（HEAD 响应的 Last-Modified）
+        self.object_times = {}
+        self.payloads = _PayloadCache(self.config.seed)
+        self._lock = threading.Lock()
+        self._random = random.Random(self.config.seed)
+        handler = type("BoundHandler", (_MockHandler,), {"server_ref": self})
+        self._httpd = ThreadingHTTPServer((host, port), handler)
+        self._httpd.daemon_threads = True
+        self._thread = None
+        self.base_url = f"http://{host}:{self._httpd.server_address[1]}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever,
+                                        name="mock-provider-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def count(self, route):
+        with self._lock:
+            self.stats[route] = self.stats.get(route, 0) + 1
+
+    def delay(self):
+        """按配置模拟网络/推理延迟"""
+        cfg = self.config
+        total = cfg.latency_ms
+        if cfg.jitter_ms:
+            with self._lock:
+                total += self._random.uniform(0, cfg.jitter_ms)
+        if total > 0:
+            time.sleep(total / 1000.0)
+
+    def pick_fault(self):
+        """按配置比例抽取本次请求的故障类型，None 表示正常响应"""
+        cfg = self.config
+        if not (cfg.fault_429_rate or cfg.fault_timeout_rate or cfg.fault_truncate_rate):
+            return None
+        with self._lock:
+            roll = self._random.random()
+        for fault, rate in (("429", cfg.fault_429_rate), ("timeout", cfg.fault_timeout_rate),
+                            ("truncate", cfg.fault_truncate_rate)):
+            if roll < rate:
+                return fault
+            roll -= rate
+        return None
+
+    def prefix_cached_tokens(self, messages):
+        """模拟服务商的自动前缀缓存：返回与之前请求相同的最长消息前缀的 tokens，并记录本次的全部前缀"""
+        hasher = hashlib.blake2b(digest_size=16)
+        size, cached, seen = 0, 0, []
+        for message in messages:
+            encoded = json.dumps(message, ensure_ascii=False, sort_keys=True).encode("utf-8")
+            hasher.update(encoded)
+            size += len(encoded)
+            seen.append((hasher.copy().hexdigest(), max(1, size // 4)))
+        with self._lock:
+            for digest, tokens in seen[:-1]:
+                if digest not in self.prefixes:
+                    break
+                cached = tokens
+            self.prefixes.update(seen)
+        return cached
+
+    def completion_text(self):
+        text = "Mock response. " * (self.config.completion_chars // 15 + 1)
+        return text[:self.config.completion_chars]
+
+
+class _MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # 响应头与响应体分两次写出，长连接下需关闭 Nagle，否则会与客户端延迟 ACK 叠加出约 40ms 的等待
+    disable_nagle_algorithm = True
+    server_ref = None
+
+    # 路由表：(方法, 判定函数, 处理函数名)
+    ROUTES = [
+        ("POST", lambda p: p.endswith("/context/create"), "_context_create"),
+        ("POST", lambda p: p.endswith("/chat/completions"), "_chat_completions"),
+        ("POST", lambda p: p.endswith("/files"), "_file_upload"),
+        ("GET", lambda p: p.startswith("/v1/files/") and p.endswith("/content"), "_file_content"),
+        ("POST", lambda p: p.endswith("/batches"), "_batch_create"),
+        ("GET", lambda p: "/batches/" in p, "_batch_query"),
+        ("POST", lambda p: p.endswith("/image-synthesis"), "_task_submit"),
+        ("GET", lambda p: p.startswith("/api/v1/tasks/"), "_task_query"),
+        ("POST", lambda p: p.endswith("/multimodal-generation/generation"), "_multimodal_generation"),
+        ("POST", lambda p: p.endswith("/images/generations"), "_images_generations"),
+        ("GET", lambda p: p.startswith("/files/images/"), "_image_file"),
+        ("GET", lambda p: p == "/search", "_serpapi"),
+        ("GET", lambda p: p == "/customsearch/v1", "_google_custom"),
+        ("GET", lambda p: p.startswith("/duckduckgo"), "_duckduckgo"),
+        ("GET", lambda p: p == "/api/v1/uploads", "_upload_policy"),
+        ("POST", lambda p: p == "/oss", "_oss_upload"),
+        ("PUT", lambda p: p.startswith("/store/"), "_store_put"),
+        ("HEAD", lambda p: p.startswith("/store/"), "_store_head"),
+        ("GET", lambda p: p.startswith("/store/"), "_store_get"),
+    ]
+
+    def log_message(self, format, *args):
+        # 基准运行时保持安静
+        pass
+
+    # ---------- 基础 ----------
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    def do_HEAD(self):
+        self._dispatch("HEAD")
+
+    def _dispatch(self, method):
+        parsed = urlparse(self.path)
+        self.query = parse_qs(parsed.query)
+        self.body = self._read_body() if method in ("POST", "PUT") else b""
+        for route_method, match, handler_name in self.ROUTES:
+            if route_method == method and match(parsed.path):
+                self.server_ref.count(handler_name.strip("_"))
+                fault = self.server_ref.pick_fault()
+                if fault is not None:
+                    self.server_ref.count(f"fault_{fault}")
+                    self._inject_fault(fault, getattr(self, handler_name), parsed.path)
+                    return
+                self.server_ref.delay()
+                getattr(self, handler_name)(parsed.path)
+                return
+        self.server_ref.count("not_found")
+        self._send_json({"error": {"code": "NotFound", "message": parsed.path}}, status=404)
+
+    def _inject_fault(self, fault, handler, path):
+        if fault == "429":
+            self.send_response(429)
+            self.send_header("Retry-After", "1")
+            data = json.dumps({"error": {"code": "Throttling", "message": "Requests rate limit exceeded"}})
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data.encode("utf-8"))
+            return
+        self.close_connection = True
+        if fault == "timeout":
+            # 不响应，直到客户端超时断开
+            time.sleep(self.server_ref.config.fault_timeout_s)
+            return
+        # truncate：正常生成响应，只写出一半后断开连接
+        real_wfile = self.wfile
+        self.wfile = io.BytesIO()
+        try:
+            handler(path)
+            data = self.wfile.getvalue()
+        finally:
+            self.wfile = real_wfile
+        header_end = data.find(b"\r\n\r\n") + 4
+        cut = header_end + max(1, (len(data) - header_end) // 2)
+        real_wfile.write(data[:cut])
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            return self.rfile.read(length)
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().strip() or b"0", 16)
+                if size == 0:
+                    self.rfile.readline()
+                    break
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+            return b"".join(chunks)
+        return b""
+
+    def _json_body(self):
+        try:
+            return json.loads(self.body or b"{}")
+        except ValueError:
+            return {}
+
+    def _send_bytes(self, data, content_type, status=200):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_json(self, payload, status=200):
+        self._send_bytes(json.dumps(payload).encode("utf-8"), "application/json", status)
+
+    def _reject_sensitive(self):
+        """请求体包含 SENSITIVE_MARKER 时返回 400 内容审核错误（流式请求同样在建立流之前返回）"""
+        if SENSITIVE_MARKER.encode("ascii") not in self.body:
+            return False
+        self._send_json({"error": {"code": "InvalidParameter", "message": "prompt is sensitive"}}, status=400)
+        return True
+
+    def _image_url(self, name):
+        return f"{self.server_ref.base_url}/files/images/{name}.png"
+
+    # ---------- /chat/completions ----------
+
+    def _chat_completions(self, path):
+        if self._reject_sensitive():
+            return
+        request = self._json_body()
+        body_size, cached_tokens = len(self.body), 0
+        if path.endswith("/context/chat/completions"):
+            with self.server_ref._lock:
+                cached_tokens = self.server_ref.contexts.get(request.get("context_id"))
+            if cached_tokens is None:
+                self._send_json({"error": {"code": "NotFound", "message": "context not found or expired"}},
+                                status=404)
+                return
+            body_size += cached_tokens * 4
+        elif isinstance(request.get("messages"), list):
+            cached_tokens = self.server_ref.prefix_cached_tokens(request["messages"])
+        if request.get("stream"):
+            content, usage = self._completion_content(body_size)
+            if cached_tokens:
+                usage["prompt_tokens_details"] = {"cached_tokens": cached_tokens}
+            self._stream_chat(request, content, usage)
+            return
+        payload = self._completion_payload(request, body_size)
+        if cached_tokens:
+            payload["usage"]["prompt_tokens_details"] = {"cached_tokens": cached_tokens}
+        self._send_json(payload)
+
+    def _context_create(self, path):
+        request = self._json_body()
+        context_id = f"ctx-{uuid.uuid4().hex[:16]}"
+        tokens = max(1, len(self.body) // 4)
+        with self.server_ref._lock:
+            self.server_ref.contexts[context_id] = tokens
+        self._send_json({"id": context_id, "model": request.get("model", "mock-model"),
+                         "mode": request.get("mode", "common_prefix"), "ttl": request.get("ttl", 86400),
+                         "usage": {"prompt_tokens": tokens, "completion_tokens": 0, "total_tokens": tokens}})
+
+    def _completion_content(self, body_size):
+        content = self.server_ref.completion_text()
+        usage = {
+            "prompt_tokens": max(1, body_size // 4),
+            "completion_tokens": max(1, len(content) // 4),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        return content, usage
+
+    def _completion_payload(self, request, body_size):
+        """非流式 chat.completion 响应体（Batch API 的结果复用同一结构）"""
+        content, usage = self._completion_content(body_size)
+        message = {"role": "assistant", "content": content}
+        if request.get("tools"):
+            message["tool_calls"] = [{
+                "id": "call_mock",
+                "type": "web_search",
+                "function": {"name": "web_search", "arguments": json.dumps({"query": "mock"})},
+            }]
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "mock-model"),
+            "choices": [{"index": 0, "message": message, "finish_reason": "stop"}],
+            "usage": usage,
+        }
+
+    def _stream_chat(self, request, content, usage):
+        cfg = self.server_ref.config
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        chunk_count = max(1, cfg.sse_chunks)
+        step = max(1, len(content) // chunk_count + 1)
+        base = {"id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "object": "chat.completion.chunk",
+                "created": int(time.time()), "model": request.get("model", "mock-model")}
+        if request.get("tools"):
+            # 工具调用分片：第一片带 id 与类型，参数分两片到达
+            arguments = json.dumps({"query": "mock"})
+            for part in ({"id": "call_mock", "type": "web_search", "function": {"name": "web_search"}},
+                         {"function": {"arguments": arguments[:6]}},
+                         {"function": {"arguments": arguments[6:]}}):
+                delta = {"role": "assistant", "tool_calls": [dict(part, index=0)]}
+                event = dict(base, choices=[{"index": 0, "delta": delta, "finish_reason": None}])
+                self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+        for i in range(0, len(content), step):
+            delta = {"content": content[i:i + step]}
+            if i == 0:
+                delta["role"] = "assistant"
+            event = dict(base, choices=[{"index": 0, "delta": delta, "finish_reason": None}])
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            if cfg.sse_chunk_interval_ms:
+                time.sleep(cfg.sse_chunk_interval_ms / 1000.0)
+        final = dict(base, choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}], usage=usage)
+        self.wfile.write(f"data: {json.dumps(final)}\n\n".encode("utf-8"))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    # ---------- DashScope 异步任务 ----------
+
+    def _task_submit(self, path):
+        server = self.server_ref
+        task_id = uuid.uuid4().hex
+        with server._lock:
+            server.tasks[task_id] = {"polls_left": server.config.task_polls}
+        self._send_json({"request_id": uuid.uuid4().hex,
+                         "output": {"task_id": task_id, "task_status": "PENDING"}})
+
+    def _task_query(self, path):
+        server = self.server_ref
+        task_id = path.rsplit("/", 1)[-1]
+        with server._lock:
+            task = server.tasks.get(task_id)
+            if task is not None and task["polls_left"] > 0:
+                task["polls_left"] -= 1
+                status = "RUNNING"
+            else:
+                status = "SUCCEEDED" if task is not None else "UNKNOWN"
+        if status == "UNKNOWN":
+            self._send_json({"code": "InvalidParameter", "message": "task not found"}, status=404)
+            return
+        output = {"task_id": task_id, "task_status": status}
+        if status == "SUCCEEDED":
+            # 与 DashScope 一致，成功的任务在有效期内可重复查询
+            output["results"] = [{"url": self._image_url(f"{task_id}_{i}")}
+                                 for i in range(server.config.images_per_result)]
+        self._send_json({"request_id": uuid.uuid4().hex, "output": output})
+
+    # ---------- Batch API ----------
+
+    def _multipart_file(self):
+        """从 multipart/form-data 请求体中取出 (字段, 文件内容)"""
+        content_type = self.headers.get("Content-Type", "")
+        boundary = content_type.split("boundary=", 1)[-1].strip('"').encode("utf-8")
+        fields, file_data = {}, b""
+        for part in self.body.split(b"--" + boundary):
+            head, sep, data = part.partition(b"\r\n\r\n")
+            if not sep:
+                continue
+            data = data[:-2] if data.endswith(b"\r\n") else data
+            disposition = head.decode("utf-8", "replace")
+            name = disposition.split('name="', 1)[-1].split('"', 1)[0]
+            if 'filename="' in disposition:
+                file_data = data
+            else:
+                fields[name] = data.decode("utf-8")
+        return fields, file_data
+
+    def _file_upload(self, path):
+        fields, data = self._multipart_file()
+        file_id = f"file-{uuid.uuid4().hex[:16]}"
+        with self.server_ref._lock:
+            self.server_ref.files[file_id] = data
+        self._send_json({"id": file_id, "object": "file", "bytes": len(data),
+                         "purpose": fields.get("purpose", "batch"), "created_at": int(time.time())})
+
+    def _file_content(self, path):
+        file_id = path.split("/")[-2]
+        data = self.server_ref.files.get(file_id)
+        if data is None:
+            self._send_json({"error": {"message": "file not found"}}, status=404)
+            return
+        self._send_bytes(data, "application/jsonl")
+
+    def _batch_create(self, path):
+        server = self.server_ref
+        request = self._json_body()
+        data = server.files.get(request.get("input_file_id"))
+        if data is None:
+            self._send_json({"error": {"message": "input file not found"}}, status=400)
+            return
+        # 立即生成结果，按 task_polls 次查询后才报告 completed
+        lines = []
+        for line in data.decode("utf-8").splitlines():
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            lines.append(json.dumps({
+                "id": f"batch_req_{uuid.uuid4().hex[:12]}",
+                "custom_id": item.get("custom_id"),
+                "response": {"status_code": 200, "request_id": uuid.uuid4().hex,
+                             "body": self._completion_payload(item.get("body", {}), len(line))},
+                "error": None,
+            }))
+        batch_id = f"batch_{uuid.uuid4().hex[:16]}"
+        output_file_id = f"file-{uuid.uuid4().hex[:16]}"
+        batch = {
+            "id": batch_id,
+            "object": "batch",
+            "endpoint": request.get("endpoint"),
+            "input_file_id": request.get("input_file_id"),
+            "completion_window": request.get("completion_window", "24h"),
+            "status": "validating",
+            "output_file_id": None,
+            "error_file_id": None,
+            "created_at": int(time.time()),
+            "request_counts": {"total": len(lines), "completed": 0, "failed": 0},
+        }
+        with server._lock:
+            server.files[output_file_id] = ("\n".join(lines) + "\n").encode("utf-8")
+            server.batches[batch_id] = {"batch": batch, "polls_left": server.config.task_polls,
+                                        "output_file_id": output_file_id}
+        self._send_json(batch)
+
+    def _batch_query(self, path):
+        server = self.server_ref
+        batch_id = path.rstrip("/").rsplit("/", 1)[-1]
+        with server._lock:
+            state = server.batches.get(batch_id)
+            if state is None:
+                batch = None
+            else:
+                batch = state["batch"]
+                if state["polls_left"] > 0:
+                    state["polls_left"] -= 1
+                    batch["status"] = "in_progress"
+                else:
+                    batch["status"] = "completed"
+                    batch["output_file_id"] = state["output_file_id"]
+                    counts = batch["request_counts"]
+                    counts["completed"] = counts["total"]
+                batch = dict(batch)
+        if batch is None:
+            self._send_json({"error": {"message": "batch not found"}}, status=404)
+            return
+        self._send_json(batch)
+
+    # ---------- Qwen multimodal-generation ----------
+
+    def _multimodal_generation(self, path):
+        # oss:// 地址需要请求头开启解析，且对象必须已上传
+        for message in self._json_body().get("input", {}).get("messages", []):
+            for part in message.get("content", []):
+                image = part.get("image", "") if isinstance(part, dict) else ""
+                if image.startswith("oss://"):
+                    if self.headers.get("X-DashScope-OssResourceResolve") != "enable":
+                        self._send_json({"code": "InvalidParameter",
+                                         "message": "oss url requires X-DashScope-OssResourceResolve"}, status=400)
+                        return
+                    if image[len("oss://"):] not in self.server_ref.objects:
+                        self._send_json({"code": "InvalidParameter", "message": "oss object not found"}, status=400)
+                        return
+        self._send_json({
+            "request_id": uuid.uuid4().hex,
+            "output": {"choices": [{
+                "finish_reason": "stop",
+                "message": {"role": "assistant",
+                            "content": [{"image": self._image_url(uuid.uuid4().hex)}]},
+            }]},
+            "usage": {"width": self.server_ref.config.image_size,
+                      "height": self.server_ref.config.image_size, "image_count": 1},
+        })
+
+    # ---------- ARK images/generations ----------
+
+    def _images_generations(self, path):
+        if self._reject_sensitive():
+            return
+        request = self._json_body()
+        server = self.server_ref
+        png = server.payloads.png(server.config.image_size)
+        count = server.config.images_per_result
+        if request.get("sequential_image_generation") == "auto":
+            count = (request.get("sequential_image_generation_options") or {}).get("max_images", 15)
+        data = []
+        for _ in range(count):
+            if request.get("response_format") == "b64_json":
+                data.append({"b64_json": base64.b64encode(png).decode("ascii"),
+                             "size": f"{server.config.image_size}x{server.config.image_size}"})
+            else:
+                data.append({"url": self._image_url(uuid.uuid4().hex)})
+        if request.get("stream"):
+            self._stream_images(request, data)
+            return
+        if len(data) > 1:
+            # 非流式组图在全部生成后才返回
+            time.sleep(server.config.image_interval_ms / 1000.0 * len(data))
+        self._send_json({"model": request.get("model", "mock-seedream"),
+                         "created": int(time.time()), "data": data,
+                         "usage": {"generated_images": len(data)}})
+
+    def _stream_images(self, request, data):
+        """Seedream 流式组图：每张图片一个 partial_succeeded 事件，最后是 completed 与 [DONE]"""
+        interval = self.server_ref.config.image_interval_ms / 1000.0
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        base = {"model": request.get("model", "mock-seedream"), "created": int(time.time())}
+        for index, item in enumerate(data):
+            if interval:
+                time.sleep(interval)
+            event = dict(base, type="image_generation.partial_succeeded", image_index=index, **item)
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+        event = dict(base, type="image_generation.completed",
+                     usage={"generated_images": len(data), "output_tokens": 16384 * len(data)})
+        self.wfile.write(f"data: {json.dumps(event)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+    def _image_file(self, path):
+        png = self.server_ref.payloads.png(self.server_ref.config.image_size)
+        self._send_bytes(png, "image/png")
+
+    # ---------- 图像上传 ----------
+
+    def _upload_policy(self, path):
+        model = self.query.get("model", [""])[0]
+        self._send_json({"request_id": uuid.uuid4().hex, "data": {
+            "policy": "bW9jay1wb2xpY3k=", "signature": "mock-signature",
+            "upload_dir": f"dashscope-instant/{model}/{uuid.uuid4().hex[:8]}",
+            "upload_host": f"{self.server_ref.base_url}/oss",
+            "expire_in_seconds": 300, "max_file_size_mb": 100, "capacity_limit_mb": 999999999,
+            "oss_access_key_id": "mock-access-key", "x_oss_object_acl": "private",
+            "x_oss_forbid_overwrite": "true",
+        }})
+
+    def _oss_upload(self, path):
+        fields, data = self._multipart_file()
+        if not fields.get("key") or fields.get("Signature") != "mock-signature":
+            self._send_json({"Code": "InvalidArgument"}, status=400)
+            return
+        with self.server_ref._lock:
+            self.server_ref.objects[fields["key"]] = data
+        self._send_bytes(b"", "text/plain")
+
+    def _store_put(self, path):
+        with self.server_ref._lock:
+            self.server_ref.objects[path] = self.body
+            self.server_ref.object_times[path] = time.time()
+        self._send_bytes(b"", "text/plain")
+
+    def _store_head(self, path):
+        data = self.server_ref.objects.get(path)
+        self.send_response(200 if data is not None else 404)
+        self.send_header("Content-Length", str(len(data) if data is not None else 0))
+        if data is not None:
+            self.send_header("Last-Modified", formatdate(self.server_ref.object_times[path], usegmt=True))
+        self.end_headers()
+
+    def _store_get(self, path):
+        data = self.server_ref.objects.get(path)
+        if data is None:
+            self._send_json({"error": "not found"}, status=404)
+            return
+        self._send_bytes(data, "application/octet-stream")
+
+    # ---------- 搜索 ----------
+
+    # 生成搜索摘要的词表
+    SNIPPET_WORDS = ("model", "release", "benchmark", "latest", "research", "agent", "training", "data",
+                     "open", "source", "inference", "chip", "policy", "vision", "robot", "startup")
+
+    def _snippets(self):
+        """每条结果的摘要由固定种子的词序列生成；每第 4 条是第 1 条的转载（相同摘要，不同链接）"""
+        cfg = self.server_ref.config
+        results = []
+        for i in range(cfg.search_results):
+            if i % 4 == 3:
+                results.append((f"Result {i + 1}", results[0][1], f"https://mirror.example.com/{i + 1}"))
+                continue
+            rng = random.Random(cfg.seed * 1000 + i)
+            words = []
+            while sum(len(word) + 1 for word in words) < cfg.snippet_chars:
+                words.append(rng.choice(self.SNIPPET_WORDS))
+            snippet = f"Mock snippet {i + 1}: {' '.join(words)}"[:cfg.snippet_chars]
+            results.append((f"Result {i + 1}", snippet, f"https://example.com/{i + 1}"))
+        return results
+
+    def _serpapi(self, path):
+        self._send_json({"organic_results": [
+            {"position": i + 1, "title": t, "snippet": s, "link": l}
+            for i, (t, s, l) in enumerate(self._snippets())
+        ]})
+
+    def _google_custom(self, path):
+        self._send_json({"items": [{"title": t, "snippet": s, "link": l}
+                                   for t, s, l in self._snippets()]})
+
+    def _duckduckgo(self, path):
+        snippets = self._snippets()
+        self._send_json({
+            "Abstract": snippets[0][1] if snippets else "",
+            "AbstractURL": snippets[0][2] if snippets else "",
+            "RelatedTopics": [{"Text": s, "FirstURL": l} for _, s, l in snippets[1:]],
+        })
+
+
+def serve_in_process(config, port, ready, stop):
+    """
+    子进程入口：启动模拟服务直到 stop 事件被设置
+
+    压测时把模拟服务放在独立进程中，被测进程的 RSS / socket / 线程数才不会混入服务端的开销。
+
+    Args:
+        config (MockConfig): 服务配置
+        port (int): 监听端口
+        ready (multiprocessing.Event): 服务就绪后设置
+        stop (multiprocessing.Event): 设置后停止服务
+    """
+    with MockProviderServer(config, port=port):
+        ready.set()
+        stop.wait()
+
+
+def configure_nodes(package, base_url):
+    """
+    将节点中写死的第三方端点指向模拟服务
+
+    Args:
+        package: 已加载的 xj_nodes 包
+        base_url (str): 模拟服务地址
+    """
+    mappings = package.NODE_CLASS_MAPPINGS
+    mappings["QwenImageEditNode"].API_URL = (
+        f"{base_url}/api/v1/services/aigc/multimodal-generation/generation")
+    wanx = mappings["WanxImageGenerationNode"]
+    wanx.TASK_URL = f"{base_url}/api/v1/tasks/{{task_id}}"
+    wanx.POLL_INTERVAL = 0.01
+    search = mappings["LLMWebSearchNode"]
+    search.SERPAPI_URL = f"{base_url}/search"
+    search.GOOGLE_CUSTOM_SEARCH_URL = f"{base_url}/customsearch/v1"
+    search.DUCKDUCKGO_URL = f"{base_url}/duckduckgo/"
+    importlib.import_module(f"{package.__name__}.utils.upload_cache").DASHSCOPE_POLICY_URL = (
+        f"{base_url}/api/v1/uploads")
@@ -0,0 +1,352 @@
+"""
+端到端基准
+
+启动本地模拟服务，逐个驱动全部已注册的节点类，输出每个场景的吞吐、
+p50/p95/p99 延迟与峰值 RSS（JSON）。
+
+默认每个场景在独立子进程中运行，保证峰值 RSS 只反映该节点本身。
+
+用法:
+    python benchmarks/run_e2e.py --iterations 20 --concurrency 4 --latency-ms 20
+    python benchmarks/run_e2e.py --scenarios LLMAPINode,LLMAPINode[stream] --output e2e.json
+
+    # 录制一次，之后离线回放（回放时不访问模拟服务，按原始耗时的一半等待）
+    python benchmarks/run_e2e.py --transport record --cassette-dir cassettes/e2e --port 18765
+    python benchmarks/run_e2e.py --transport replay --cassette-dir cassettes/e2e --port 18765 --replay-timing 0.5
+"""
+
+import argparse
+import functools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from _common import import_submodule, load_package, peak_rss_mb, percentile, write_report
+from mock_servers import SENSITIVE_MARKER, MockConfig, MockProviderServer, configure_nodes
+
+API_KEY = "bench-key"
+
+
+def build_scenarios(package, base_url, image):
+    """
+    构建场景表：名称 -> (调用函数, 结果校验函数)
+
+    校验函数返回 True 表示调用成功；节点内部吞掉异常返回错误字符串时也能被识别为失败。
+    """
+    nodes = {name: cls() for name, cls in package.NODE_CLASS_MAPPINGS.items()}
+    ok_text = lambda out: str(out[0]).startswith("Mock response")
+
+    return {
+        "MaxNode": (lambda: nodes["MaxNode"].get_max(3, 5), lambda out: out == (5,)),
+        "MinNode": (lambda: nodes["MinNode"].get_min(3, 5), lambda out: out == (3,)),
+        "AverageNode": (lambda: nodes["AverageNode"].get_average(3, 5), lambda out: out[0] == 4),
+        "StringIsNotEmptyNode": (lambda: nodes["StringIsNotEmptyNode"].check_not_empty("x"),
+                                 lambda out: out == (True,)),
+        "ConditionalPassNode": (lambda: nodes["ConditionalPassNode"].conditional_pass(True, 1),
+                                lambda out: out[0] == 1),
+        "ImageUrlLoaderNode": (
+            lambda: nodes["ImageUrlLoaderNode"].load_image_from_url(f"{base_url}/files/images/input.png"),
+            lambda out: out[0].shape[0] == 1),
+        "QwenImageEditNode": (
+            lambda: nodes["QwenImageEditNode"].edit_image(image, "把背景换成海边", API_KEY),
+            lambda out: out[0].shape[0] == 1),
+        "WanxImageGenerationNode": (
+            lambda: nodes["WanxImageGenerationNode"].generate_image(
+                "一幅美丽的风景画", "1:1",
+                f"{base_url}/api/v1/services/aigc/text2image/image-synthesis", API_KEY, "wanx-v1"),
+            lambda out: out[0].shape[0] >= 1),
+        # 开启任务日志：每次调用都提交新任务（只接管之前进程遗留的进行中任务），测量记录与更新日志的开销
+        "WanxImageGenerationNode[journal]": (
+            lambda: nodes["WanxImageGenerationNode"].generate_image(
+                "一幅美丽的风景画", "1:1",
+                f"{base_url}/api/v1/services/aigc/text2image/image-synthesis", API_KEY, "wanx-v1"),
+            lambda out: out[0].shape[0] >= 1),
+        # 4 个任务串联提交，由一个收集节点合并
+        "WanxTaskSubmitNode+WanxTaskCollectNode": (
+            lambda: nodes["WanxTaskCollectNode"].collect(
+                API_KEY, functools.reduce(
+                    lambda ids, prompt: nodes["WanxTaskSubmitNode"].submit(
+                        prompt, "1:1", f"{base_url}/api/v1/services/aigc/text2image/image-synthesis",
+                        API_KEY, "wanx-v1", task_ids=ids)[0],
+                    [f"风景画 {i}" for i in range(4)], ""),
+                timeout=30),
+            lambda out: out[0].shape[0] == 4),
+        "SeedreamImageToImageNode": (
+            lambda: nodes["SeedreamImageToImageNode"].generate(
+                image, "水彩风格", API_KEY, "doubao-seedream-4.5", 0.5, "auto", 42, False,
+                api_url=f"{base_url}/api/v3/images/generations"),
+            lambda out: str(out[1]).startswith("✅")),
+        # 组图 4 张：一次性返回 / 流式逐张返回（--image-interval-ms 模拟逐张生成的间隔）
+        "SeedreamImageToImageNode[group]": (
+            lambda: nodes["SeedreamImageToImageNode"].generate(
+                image, "水彩风格", API_KEY, "doubao-seedream-4.5", 0.5, "auto", 42, False,
+                api_url=f"{base_url}/api/v3/images/generations", max_images=4),
+            lambda out: out[0].shape[0] == 4),
+        "SeedreamImageToImageNode[stream]": (
+            lambda: nodes["SeedreamImageToImageNode"].generate(
+                image, "水彩风格", API_KEY, "doubao-seedream-4.5", 0.5, "auto", 42, False,
+                api_url=f"{base_url}/api/v3/images/generations", max_images=4, stream=True),
+            lambda out: out[0].shape[0] == 4),
+        # 流式请求被拒绝（400）：错误信息应包含服务商返回的错误详情
+        "SeedreamImageToImageNode[stream-400]": (
+            lambda: nodes["SeedreamImageToImageNode"].generate(
+                image, f"水彩风格 {SENSITIVE_MARKER}", API_KEY, "doubao-seedream-4.5", 0.5, "auto", 42, False,
+                api_url=f"{base_url}/api/v3/images/generations", max_images=4, stream=True),
+            lambda out: "prompt is sensitive" in str(out[1])),
+        # 开启上传缓存（run_in_process 按场景名后缀开启）：首次调用上传，之后请求只引用地址
+        "QwenImageEditNode[upload]": (
+            lambda: nodes["QwenImageEditNode"].edit_image(image, "把背景换成海边", API_KEY),
+            lambda out: out[0].shape[0] == 1),
+        "SeedreamImageToImageNode[upload]": (
+            lambda: nodes["SeedreamImageToImageNode"].generate(
+                image, "水彩风格", API_KEY, "doubao-seedream-4.5", 0.5, "auto", 42, False,
+                api_url=f"{base_url}/api/v3/images/generations"),
+            lambda out: str(out[1]).startswith("✅")),
+        "LLMAPINode": (
+            lambda: nodes["LLMAPINode"].call_llm_api(f"{base_url}/v1", API_KEY, "mock-model", "你好"),
+            ok_text),
+        "LLMAPINode[stream]": (
+            lambda: nodes["LLMAPINode"].call_llm_api(f"{base_url}/v1", API_KEY, "mock-model", "你好",
+                                                     stream="true"),
+            ok_text),
+        "LLMAPINode[batch]": (
+            lambda: nodes["LLMAPINode"].call_llm_api(f"{base_url}/v1", API_KEY, "mock-model",
+                                                     "\n".join(f"提示词 {i}" for i in range(16)),
+                                                     batch_mode="lines", max_concurrency=4),
+            lambda out: len(out[3]) == 16 and all(r.startswith("Mock response") for r in out[3])),
+        "LLMBatchSubmitNode+LLMBatchCollectNode": (
+            lambda: nodes["LLMBatchCollectNode"].collect_batch(
+                f"{base_url}/v1", API_KEY,
+                nodes["LLMBatchSubmitNode"].submit_batch(
+                    f"{base_url}/v1", API_KEY, "mock-model",
+                    "\n".join(f"提示词 {i}" for i in range(16)), poll_interval=1)[0],
+                timeout=30),
+            lambda out: len(out[4]) == 16 and all(r.startswith("Mock response") for r in out[4])),
+        # 多轮会话：每次迭代追加一轮，预算较小，历史超出时压缩为摘要 / 直接丢弃
+        "LLMSessionNode": (
+            lambda: nodes["LLMSessionNode"].chat(f"{base_url}/v1", API_KEY, "mock-model", "bench-summarize",
+                                                 "继续修改上一版方案", context_budget=1024),
+            ok_text),
+        "LLMSessionNode[truncate]": (
+            lambda: nodes["LLMSessionNode"].chat(f"{base_url}/v1", API_KEY, "mock-model", "bench-truncate",
+                                                 "继续修改上一版方案", context_budget=1024,
+                                                 compaction="truncate"),
+            ok_text),
+        "LLMVisionNode": (
+            lambda: nodes["LLMVisionNode"].call_llm_vision_api(
+                f"{base_url}/v1", API_KEY, "mock-vision", "描述图片", image=image),
+            ok_text),
+        "LLMVisionNode[sample]": (
+            lambda: nodes["LLMVisionNode"].call_llm_vision_api(
+                f"{base_url}/v1", API_KEY, "mock-vision", "对比这些帧",
+                image=image.expand(8, -1, -1, -1), image_mode="sample", max_images=4),
+            ok_text),
+        "LLMVisionNode[upload]": (
+            lambda: nodes["LLMVisionNode"].call_llm_vision_api(
+                f"{base_url}/v1", API_KEY, "mock-vision", "描述图片", image=image),
+            ok_text),
+        "LLMWebSearchNode": (
+            lambda: nodes["LLMWebSearchNode"].call_llm_with_search(
+                f"{base_url}/v1", API_KEY, "mock-model", "最新的AI进展", True, "serpapi",
+                search_api_key=API_KEY),
+            ok_text),
+        # 搜索上下文：不限制预算（仍去重排序）/ 预算 256 tokens（配合 --search-results、--snippet-chars 观察效果）
+        "LLMWebSearchNode[unbounded]": (
+            lambda: nodes["LLMWebSearchNode"].call_llm_with_search(
+                f"{base_url}/v1", API_KEY, "mock-model", "最新的AI进展", True, "serpapi",
+                search_api_key=API_KEY, num_results=10, search_token_budget=0),
+            ok_text),
+        "LLMWebSearchNode[budget]": (
+            lambda: nodes["LLMWebSearchNode"].call_llm_with_search(
+                f"{base_url}/v1", API_KEY, "mock-model", "最新的AI进展", True, "serpapi",
+                search_api_key=API_KEY, num_results=10, search_token_budget=256),
+            ok_text),
+        "DoubaoVisionWebSearchNode": (
+            lambda: nodes["DoubaoVisionWebSearchNode"].process(
+                "描述图片并搜索", API_KEY, "doubao-vision-pro", True, input_image=image,
+                api_url=f"{base_url}/api/v3/chat/completions"),
+            ok_text),
+        # 开启上下文缓存：首次调用创建，之后只发送问题文本
+        "DoubaoVisionWebSearchNode[context]": (
+            lambda: nodes["DoubaoVisionWebSearchNode"].process(
+                "描述图片并搜索", API_KEY, "doubao-vision-pro", True, input_image=image,
+                api_url=f"{base_url}/api/v3/chat/completions", context_cache=True),
+            ok_text),
+        "DoubaoVisionWebSearchNode[stream]": (
+            lambda: nodes["DoubaoVisionWebSearchNode"].process(
+                "描述图片并搜索", API_KEY, "doubao-vision-pro", True, input_image=image,
+                api_url=f"{base_url}/api/v3/chat/completions", stream=True),
+            lambda out: ok_text(out) and "mock" in out[1]),
+        "DoubaoVisionWebSearchNode[stream-400]": (
+            lambda: nodes["DoubaoVisionWebSearchNode"].process(
+                f"描述图片并搜索 {SENSITIVE_MARKER}", API_KEY, "doubao-vision-pro", True, input_image=image,
+                api_url=f"{base_url}/api/v3/chat/completions", stream=True),
+            lambda out: "prompt is sensitive" in str(out[0])),
+    }
+
+
+def run_scenario(call, check, iterations, concurrency, warmup):
+    """运行单个场景，返回统计结果"""
+    for _ in range(warmup):
+        call()
+
+    def timed():
+        start = time.perf_counter()
+        try:
+            ok = bool(check(call()))
+        except Exception:
+            ok = False
+        return time.perf_counter() - start, ok
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda _: timed(), range(iterations)))
+    wall = time.perf_counter() - wall_start
+
+    latencies = [r[0] * 1000 for r in results]
+    failures = sum(1 for r in results if not r[1])
+    return {
+        "iterations": iterations,
+        "concurrency": concurrency,
+        "failures": failures,
+        "throughput_per_s": round(iterations / wall, 3) if wall > 0 else None,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 3),
+            "p95": round(percentile(latencies, 95), 3),
+            "p99": round(percentile(latencies, 99), 3),
+            "max": round(max(latencies), 3) if latencies else 0.0,
+        },
+    }
+
+
+def mock_config_from_args(args):
+    return MockConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        image_size=args.image_size,
+        image_interval_ms=args.image_interval_ms,
+        completion_chars=args.completion_chars,
+        sse_chunks=args.sse_chunks,
+        search_results=args.search_results,
+        snippet_chars=args.snippet_chars,
+    )
+
+
+def run_in_process(args, names):
+    """在当前进程中启动模拟服务并运行给定场景"""
+    import torch
+
+    package = load_package()
+    import_submodule("utils.logger").set_quiet(True)
+    import_submodule("utils.transport").configure(
+        mode=args.transport, cassette_dir=args.cassette_dir, timing_scale=args.replay_timing)
+    # 固定随机种子，保证录制与回放时的请求体一致
+    torch.manual_seed(args.seed)
+    results = {}
+    upload_cache = import_submodule("utils.upload_cache")
+    job_journal = import_submodule("utils.job_journal")
+    context_cache = import_submodule("utils.context_cache")
+    with MockProviderServer(mock_config_from_args(args), port=args.port) as server, \
+            tempfile.TemporaryDirectory(prefix="xj-upload-index-") as index_dir:
+        configure_nodes(package, server.base_url)
+        image = torch.rand(1, args.input_size, args.input_size, 3)
+        scenarios = build_scenarios(package, server.base_url, image)
+        for name in names:
+            call, check = scenarios[name]
+            context_cache.configure(index_path=os.path.join(index_dir, f"contexts-{len(results)}.json"))
+            job_journal.configure(enabled=name.endswith("[journal]"),
+                                  path=os.path.join(index_dir, f"jobs-{len(results)}.json"))
+            upload_cache.configure(enabled=name.endswith("[upload]"), store_url=f"{server.base_url}/store",
+                                   index_path=os.path.join(index_dir, f"{len(results)}.json"))
+            rss_before = peak_rss_mb()
+            stats = run_scenario(call, check, args.iterations, args.concurrency, args.warmup)
+            stats["peak_rss_mb"] = round(peak_rss_mb(), 1)
+            stats["rss_before_mb"] = round(rss_before, 1)
+            results[name] = stats
+        results["_server_requests"] = dict(server.stats)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="XJ Nodes 端到端基准（本地模拟服务）")
+    parser.add_argument("--scenarios", default="", help="逗号分隔的场景名，默认全部")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="模拟服务基础延迟")
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--image-size", type=int, default=1024, help="模拟服务返回图片边长")
+    parser.add_argument("--image-interval-ms", type=float, default=0.0, help="流式组图每张图片的生成间隔")
+    parser.add_argument("--input-size", type=int, default=1024, help="输入图片边长")
+    parser.add_argument("--completion-chars", type=int, default=400)
+    parser.add_argument("--sse-chunks", type=int, default=20)
+    parser.add_argument("--search-results", type=int, default=5)
+    parser.add_argument("--snippet-chars", type=int, default=200)
+    parser.add_argument("--transport", choices=["live", "record", "replay"], default="live",
+                        help="HTTP 传输模式，见 utils/transport.py")
+    parser.add_argument("--cassette-dir", default="xj_nodes_cassettes", help="录制/回放目录")
+    parser.add_argument("--replay-timing", type=float, default=0.0,
+                        help="回放耗时缩放系数：1 为原始耗时，0 为不等待")
+    parser.add_argument("--port", type=int, default=0,
+                        help="模拟服务端口；录制/回放需要固定端口以保证 URL 一致")
+    parser.add_argument("--seed", type=int, default=0, help="输入图片随机种子")
+    parser.add_argument("--no-isolate", action="store_true", help="所有场景在同一进程中运行")
+    parser.add_argument("--output", default=None, help="JSON 报告输出路径")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker or args.no_isolate:
+        package = load_package()
+        all_names = list(build_scenarios(package, "http://unused", None).keys())
+        names = [n for n in args.scenarios.split(",") if n] or all_names
+        results = run_in_process(args, names)
+        if args.worker:
+            print(json.dumps(results))
+            return
+        report = {"config": vars(args), "scenarios": results}
+        write_report(report, args.output)
+        return
+
+    package = load_package()
+    all_names = list(build_scenarios(package, "http://unused", None).keys())
+    names = [n for n in args.scenarios.split(",") if n] or all_names
+    report = {"config": vars(args), "scenarios": {}}
+    passthrough = _strip_option_values(sys.argv[1:], {"--output", "--scenarios"})
+    for name in names:
+        cmd = [sys.executable, os.path.abspath(__file__), "--worker", "--scenarios", name] + passthrough
+        proc = subprocess.run(cmd, capture_output=True, text=True)
+        if proc.returncode != 0:
+            report["scenarios"][name] = {"error": proc.stderr.strip().splitlines()[-1:]}
+            continue
+        data = json.loads(proc.stdout.strip().splitlines()[-1])
+        report["scenarios"][name] = data[name]
+        stats = data[name]
+        print(f"{name:28s} {stats['throughput_per_s']:>9} req/s  p50={stats['latency_ms']['p50']:>9}ms "
+              f"p99={stats['latency_ms']['p99']:>9}ms  rss={stats['peak_rss_mb']}MB  "
+              f"failures={stats['failures']}", file=sys.stderr)
+    write_report(report, args.output)
+
+
+def _strip_option_values(argv, options):
+    """从参数列表中去掉指定选项（同时支持 --opt value 与 --opt=value）"""
+    result = []
+    skip = False
+    for arg in argv:
+        if skip:
+            skip = False
+            continue
+        if arg in options:
+            skip = True
+            continue
+        if any(arg.startswith(opt + "=") for opt in options):
+            continue
+        result.append(arg)
+    return result
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""
+并发浸泡测试（soak test）
+
+模拟 N 个并发的 ComfyUI prompt 执行，在本地模拟服务上长时间循环驱动全部节点，
+并按比例注入故障（429、超时、截断响应体）。定期采样被测进程的 RSS、打开的 socket /
+文件描述符、线程数与 Python 对象数，结束时对采样序列做线性回归，
+报告增长斜率并标记疑似泄漏（未关闭的响应、不断增长的缓存等）。
+
+模拟服务运行在独立进程中，采样只反映节点本身。
+
+用法:
+    # 4 小时、8 并发、1% 429 / 0.5% 超时 / 0.5% 截断
+    python benchmarks/soak.py --duration 14400 --concurrency 8 \\
+        --fault-429 0.01 --fault-timeout 0.005 --fault-truncate 0.005 \\
+        --timeline soak_timeline.jsonl --output soak.json
+
+    # 冒烟：1 分钟
+    python benchmarks/soak.py --duration 60 --concurrency 4 --sample-interval 2
+"""
+
+import argparse
+import gc
+import json
+import multiprocessing
+import random
+import socket
+import sys
+import threading
+import time
+
+from _common import (current_rss_mb, import_submodule, load_package, open_fd_counts,
+                     os_thread_count, write_report)
+from mock_servers import MockConfig, configure_nodes, serve_in_process
+from run_e2e import build_scenarios
+
+# 不访问网络的节点对泄漏检测没有意义，默认排除
+OFFLINE_SCENARIOS = {"MaxNode", "MinNode", "AverageNode", "StringIsNotEmptyNode", "ConditionalPassNode"}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_mock_process(config):
+    """在子进程中启动模拟服务，返回 (进程, stop 事件, base_url)"""
+    ctx = multiprocessing.get_context("spawn")
+    ready, stop = ctx.Event(), ctx.Event()
+    port = free_port()
+    process = ctx.Process(target=serve_in_process, args=(config, port, ready, stop),
+                          name="mock-provider", daemon=True)
+    process.start()
+    if not ready.wait(timeout=30):
+        process.terminate()
+        raise RuntimeError("模拟服务启动超时")
+    return process, stop, f"http://127.0.0.1:{port}"
+
+
+def take_sample(start, counters, lock, workers):
+    fds, sockets = open_fd_counts()
+    with lock:
+        snapshot = dict(counters)
+    return {
+        "t": round(time.monotonic() - start, 2),
+        "rss_mb": round(current_rss_mb(), 2),
+        "open_fds": fds,
+        "open_sockets": sockets,
+        "os_threads": os_thread_count(),
+        "py_threads": threading.active_count(),
+        "py_objects": len(gc.get_objects()),
+        "active_workers": sum(1 for w in workers if w.is_alive()),
+        **snapshot,
+    }
+
+
+def linear_slope(xs, ys):
+    """最小二乘斜率；样本不足时返回 0"""
+    points = [(x, y) for x, y in zip(xs, ys) if y is not None]
+    if len(points) < 2:
+        return 0.0
+    n = len(points)
+    mean_x = sum(p[0] for p in points) / n
+    mean_y = sum(p[1] for p in points) / n
+    denom = sum((p[0] - mean_x) ** 2 for p in points)
+    if denom == 0:
+        return 0.0
+    return sum((p[0] - mean_x) * (p[1] - mean_y) for p in points) / denom
+
+
+def analyse(samples, warmup_fraction, thresholds):
+    """
+    对预热之后的采样做增长分析
+
+    Returns:
+        dict: 每个指标的首末值、最大值与每小时增长斜率，以及疑似泄漏列表
+
+    thresholds 为 {指标: (每小时斜率阈值, 稳态窗口内绝对增长阈值)}
+    """
+    if not samples:
+        return {"suspected_leaks": []}
+    cutoff = samples[-1]["t"] * warmup_fraction
+    # 只分析负载运行期间的采样（全部执行槽退出后线程数等会自然下降）
+    steady = [s for s in samples if s["t"] >= cutoff and s["active_workers"]] or samples
+    xs = [s["t"] / 3600.0 for s in steady]
+    span_hours = xs[-1] - xs[0]
+    result = {"steady_state_from_s": round(cutoff, 1), "metrics": {}, "suspected_leaks": []}
+    for metric in ("rss_mb", "open_fds", "open_sockets", "os_threads", "py_threads", "py_objects"):
+        values = [s[metric] for s in steady]
+        present = [v for v in values if v is not None]
+        if not present:
+            continue
+        slope = linear_slope(xs, values)
+        result["metrics"][metric] = {
+            "first": present[0],
+            "last": present[-1],
+            "max": max(present),
+            "slope_per_hour": round(slope, 3),
+        }
+        # 同时超过斜率阈值与窗口内绝对增长阈值才标记，避免短时运行的抖动误报
+        threshold = thresholds.get(metric)
+        if threshold is not None:
+            max_slope, max_growth = threshold
+            if slope > max_slope and slope * span_hours > max_growth:
+                result["suspected_leaks"].append(metric)
+    return result
+
+
+def worker_loop(scenarios, names, deadline, counters, lock, stop, seed):
+    """单个并发执行槽：在截止时间前随机挑选节点反复执行"""
+    rng = random.Random(seed)
+    while not stop.is_set() and time.monotonic() < deadline:
+        name = rng.choice(names)
+        call, check = scenarios[name]
+        try:
+            outcome = "ok" if check(call()) else "failed"
+        except Exception as e:
+            outcome = f"exception_{type(e).__name__}"
+        with lock:
+            counters["executions"] += 1
+            counters[outcome] = counters.get(outcome, 0) + 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="XJ Nodes 并发浸泡测试")
+    parser.add_argument("--duration", type=float, default=600, help="运行时长（秒）")
+    parser.add_argument("--concurrency", type=int, default=8, help="并发执行数")
+    parser.add_argument("--scenarios", default="", help="逗号分隔的场景名，默认全部联网节点")
+    parser.add_argument("--sample-interval", type=float, default=10.0, help="采样间隔（秒）")
+    parser.add_argument("--warmup-fraction", type=float, default=0.1,
+                        help="增长分析忽略的开头比例（预热、连接池建立）")
+    parser.add_argument("--fault-429", type=float, default=0.0, help="429 比例")
+    parser.add_argument("--fault-timeout", type=float, default=0.0, help="挂起不响应比例")
+    parser.add_argument("--fault-truncate", type=float, default=0.0, help="截断响应体比例")
+    parser.add_argument("--timeout-cap", type=float, default=2.0,
+                        help="节点请求超时上限（秒），使超时故障尽快暴露")
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--jitter-ms", type=float, default=20.0)
+    parser.add_argument("--image-size", type=int, default=512)
+    parser.add_argument("--input-size", type=int, default=512)
+    parser.add_argument("--rss-slope-mb-per-hour", type=float, default=50.0,
+                        help="RSS 每小时增长超过该值视为疑似泄漏")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeline", default=None, help="采样逐行写入的 JSONL 文件（运行中可查看）")
+    parser.add_argument("--output", default=None, help="JSON 报告输出路径")
+    args = parser.parse_args()
+
+    import torch
+
+    package = load_package()
+    # 注入的故障会让节点持续输出错误日志，结果已按类型计数，这里只保留致命错误
+    import_submodule("utils.logger").set_level("CRITICAL")
+    import_submodule("utils.transport").configure(timeout_cap=args.timeout_cap)
+
+    config = MockConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        image_size=args.image_size,
+        fault_429_rate=args.fault_429,
+        fault_timeout_rate=args.fault_timeout,
+        fault_truncate_rate=args.fault_truncate,
+        fault_timeout_s=args.timeout_cap * 2,
+        seed=args.seed,
+    )
+    process, stop_server, base_url = start_mock_process(config)
+    configure_nodes(package, base_url)
+
+    torch.manual_seed(args.seed)
+    image = torch.rand(1, args.input_size, args.input_size, 3)
+    scenarios = build_scenarios(package, base_url, image)
+    names = [n for n in args.scenarios.split(",") if n] or [
+        n for n in scenarios if n not in OFFLINE_SCENARIOS]
+
+    counters = {"executions": 0}
+    lock = threading.Lock()
+    stop = threading.Event()
+    start = time.monotonic()
+    deadline = start + args.duration
+    samples = []
+    timeline = open(args.timeline, "w", encoding="utf-8") if args.timeline else None
+
+    workers = [threading.Thread(target=worker_loop, name=f"soak-{i}",
+                                args=(scenarios, names, deadline, counters, lock, stop, args.seed + i),
+                                daemon=True)
+               for i in range(args.concurrency)]
+    try:
+        samples.append(take_sample(start, counters, lock, workers))
+        for worker in workers:
+            worker.start()
+        while any(w.is_alive() for w in workers):
+            time.sleep(min(args.sample_interval, max(0.0, deadline - time.monotonic()) + 0.1))
+            sample = take_sample(start, counters, lock, workers)
+            samples.append(sample)
+            if timeline:
+                timeline.write(json.dumps(sample) + "\n")
+                timeline.flush()
+            print(f"[{sample['t']:>8.0f}s] exec={sample['executions']:<7d} rss={sample['rss_mb']:>8.1f}MB "
+                  f"sockets={sample['open_sockets']} threads={sample['os_threads']} "
+                  f"objects={sample['py_objects']}", file=sys.stderr)
+    except KeyboardInterrupt:
+        stop.set()
+    finally:
+        stop.set()
+        for worker in workers:
+            worker.join(timeout=args.timeout_cap * 4)
+        stop_server.set()
+        process.join(timeout=10)
+        if timeline:
+            timeline.close()
+
+    # 连接池稳定后 socket / 线程数不应持续增长，允许与并发数同量级的波动
+    thresholds = {
+        "rss_mb": (args.rss_slope_mb_per_hour, 20.0),
+        "open_sockets": (0.0, 2 * args.concurrency),
+        "open_fds": (0.0, 2 * args.concurrency),
+        "os_threads": (0.0, args.concurrency),
+        "py_threads": (0.0, args.concurrency),
+    }
+    report = {
+        "config": vars(args),
+        "scenarios": names,
+        "totals": dict(counters),
+        "analysis": analyse(samples, args.warmup_fraction, thresholds),
+        "samples": samples,
+    }
+    leaks = report["analysis"]["suspected_leaks"]
+    print(f"完成 {counters['executions']} 次执行，疑似泄漏: {', '.join(leaks) if leaks else '无'}",
+          file=sys.stderr)
+    write_report(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,13 @@
-import requests
-from PIL import Image
-import torch
-import numpy as np
 from io import BytesIO
 
+from ..utils.lazy_import import lazy_import
+from ..utils import transport
+
+requests = lazy_import("requests")
+Image = lazy_import("PIL.Image")
+torch = lazy_import("torch")
+np = lazy_import("numpy")
+
 class ImageUrlLoaderNode:
     """
     ComfyUI节点：从URL加载图片
@@ -34,6 +38,29 @@ class ImageUrlLoaderNode:
     FUNCTION = "load_image_from_url"
     CATEGORY = "XJ Nodes/Image"
     
+    def decode_image_bytes(self, image_data):
+        """
+        将图片字节解码为ComfyUI格式的张量
+        
+        Args:
+            image_data (bytes): 图片文件内容（PNG/JPEG/WEBP等）
+        
+        Returns:
+            torch.Tensor: 形状为[1,H,W,3]的张量
+        """
+        # 使用PIL打开图片
+        image = Image.open(BytesIO(image_data))
+        
+        # 转换为RGB格式（如果不是的话）
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        
+        # 转换为numpy数组
+        image_np = np.array(image).astype(np.float32) / 255.0
+        
+        # 转换为torch张量并调整维度 (H, W, C) -> (1, H, W, C)
+        return torch.from_numpy(image_np).unsqueeze(0)
+    
     def load_image_from_url(self, image_url):
         """
         从URL加载图片并转换为ComfyUI格式
@@ -46,23 +73,10 @@ class ImageUrlLoaderNode:
         """
         try:
             # 发送HTTP请求获取图片数据
-            response = requests.get(image_url, timeout=30)
+            response = transport.get(image_url, timeout=30)
             response.raise_for_status()
             
-            # 使用PIL打开图片
-            image = Image.open(BytesIO(response.content))
-            
-            # 转换为RGB格式（如果不是的话）
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-            
-            # 转换为numpy数组
-            image_np = np.array(image).astype(np.float32) / 255.0
-            
-            # 转换为torch张量并调整维度 (H, W, C) -> (1, H, W, C)
-            image_tensor = torch.from_numpy(image_np).unsqueeze(0)
-            
-            return (image_tensor,)
+            return (self.decode_image_bytes(response.content),)
             
         except requests.exceptions.RequestException as e:
             raise Exception(f"无法从URL加载图片: {str(e)}")
@@ -1,10 +1,18 @@
-import requests
 import base64
 import io
-from PIL import Image
-import numpy as np
-import torch
-import json
+
+from ..utils.lazy_import import lazy_import
+from ..utils import encode_pool, json_codec, transport, upload_cache
+from ..utils.logger import get_logger
+from ..utils.fingerprint import fingerprint_inputs
+from ..utils.streaming_body import data_uri
+
+requests = lazy_import("requests")
+Image = lazy_import("PIL.Image")
+np = lazy_import("numpy")
+torch = lazy_import("torch")
+
+logger = get_logger("qwen_image_edit")
 
 class QwenImageEditNode:
     """
@@ -67,20 +75,31 @@ class QwenImageEditNode:
             }
         }
     
+    @classmethod
+    def IS_CHANGED(cls, **kwargs):
+        """
+        输入指纹：控件参数不变时复用 ComfyUI 缓存，seed 为 -1 时每次重新生成
+        （连接的输入图像在这里为 None，是否变化由 ComfyUI 按上游节点判断）
+        """
+        return fingerprint_inputs(kwargs)
+    
     RETURN_TYPES = ("IMAGE",)
     RETURN_NAMES = ("edited_image",)
     FUNCTION = "edit_image"
     CATEGORY = "XJ_Nodes/Image"
     
-    def tensor_to_base64(self, tensor_image):
+    # multimodal-generation 端点（基准测试可替换为本地模拟服务）
+    API_URL = "https://dashscope.aliyuncs.com/api/v1/services/aigc/multimodal-generation/generation"
+    
+    def tensor_to_image_bytes(self, tensor_image):
         """
-        将tensor图像转换为base64编码
+        将tensor图像编码为JPEG字节
         
         Args:
             tensor_image: 输入的tensor图像，形状为[B,H,W,C]或[H,W,C]
             
         Returns:
-            str: base64编码的图像字符串
+            bytes: 编码后的图像数据
             
         Raises:
             Exception: 当图像转换失败时抛出异常
@@ -122,16 +141,25 @@ class QwenImageEditNode:
                 
                 pil_image = pil_image.resize((new_width, new_height), Image.Resampling.LANCZOS)
             
-            # 转换为base64
             buffer = io.BytesIO()
             pil_image.save(buffer, format='JPEG', quality=95, optimize=True)
-            img_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
-            
-            return img_base64
+            return buffer.getvalue()
             
         except Exception as e:
             raise Exception(f"图像转换为base64失败: {str(e)}")
     
+    def tensor_to_base64(self, tensor_image):
+        """
+        将tensor图像转换为base64编码
+        
+        Args:
+            tensor_image: 输入的tensor图像，形状为[B,H,W,C]或[H,W,C]
+            
+        Returns:
+            str: base64编码的图像字符串
+        """
+        return base64.b64encode(self.tensor_to_image_bytes(tensor_image)).decode('utf-8')
+    
     def base64_to_tensor(self, base64_string):
         """
         将base64编码转换为tensor图像
@@ -182,7 +210,7 @@ class QwenImageEditNode:
             base64编码的图像字符串
         """
         try:
-            response = requests.get(image_url, timeout=30)
+            response = transport.get(image_url, timeout=30)
             response.raise_for_status()
             
             # 将图片数据转换为base64
@@ -197,7 +225,8 @@ class QwenImageEditNode:
         调用阿里云百炼平台的Qwen图像编辑API
         
         Args:
-            image_base64 (str): base64编码的输入图像
+            image_base64 (str | bytes): base64编码的输入图像，或编码后的图像字节（发送时按块 base64 编码；
+                开启上传缓存时上传到百炼临时存储，以 oss:// 地址引用）
             instruction (str): 编辑指令，最多800字符
             api_key (str): API密钥
             model_name (str): 模型名称
@@ -220,12 +249,18 @@ class QwenImageEditNode:
             raise Exception("负面提示词不能超过500字符")
         
         # 修正API端点URL - 使用正确的multimodal-generation端点
-        url = "https://dashscope.aliyuncs.com/api/v1/services/aigc/multimodal-generation/generation"
+        url = self.API_URL
+        
+        # 图像字节优先使用上传缓存中的 oss:// 地址，否则内联
+        if isinstance(image_base64, (bytes, bytearray)):
+            image_value = upload_cache.image_value(image_base64, "image/jpeg", "dashscope", api_key, model_name)
+        else:
+            image_value = data_uri(image_base64, "image/jpeg")
         
-        headers = {
+        headers = upload_cache.add_oss_header({
             "Authorization": f"Bearer {api_key}",
             "Content-Type": "application/json"
-        }
+        }, image_value)
         
         # 构建请求数据，严格按照官方API文档格式
         data = {
@@ -236,7 +271,7 @@ class QwenImageEditNode:
                         "role": "user",
                         "content": [
                             {
-                                "image": f"data:image/jpeg;base64,{image_base64}"
+                                "image": image_value
                             },
                             {
                                 "text": edit_instruction
@@ -259,12 +294,12 @@ class QwenImageEditNode:
             data["parameters"]["seed"] = seed
         
         try:
-            print(f"正在调用API: {model_name}")
-            response = requests.post(url, json=data, headers=headers, timeout=120)
+            logger.debug("正在调用API: %s", model_name)
+            response = transport.post(url, json=data, headers=headers, timeout=120)
             response.raise_for_status()
             
-            result = response.json()
-            print(f"API响应状态: {result.get('status_code', 'unknown')}")
+            result = json_codec.response_json(response)
+            logger.debug("API响应状态: %s", result.get('status_code', 'unknown'))
             
             # 根据官方文档解析响应格式
             if "output" in result and "choices" in result["output"]:
@@ -277,7 +312,7 @@ class QwenImageEditNode:
                     for item in content:
                         if "image" in item:
                             image_data = item["image"]
-                            print(f"获取到图像数据: {str(image_data)[:50]}...")
+                            logger.debug("获取到图像数据: %.50s...", image_data)
                             
                             # 如果是URL，下载并转换为base64
                             if isinstance(image_data, str) and image_data.startswith(('http://', 'https://')):
@@ -296,13 +331,13 @@ class QwenImageEditNode:
                 error_msg = result.get("message", "未知错误")
                 raise Exception(f"API返回错误 {result['code']}: {error_msg}")
             
-            raise Exception(f"API响应格式异常: {json.dumps(result, ensure_ascii=False)[:200]}")
+            raise Exception(f"API响应格式异常: {json_codec.dumps_elided(result)[:200]}")
             
         except requests.exceptions.Timeout:
             raise Exception("API请求超时，请稍后重试")
         except requests.exceptions.RequestException as e:
             raise Exception(f"网络请求失败: {str(e)}")
-        except json.JSONDecodeError:
+        except json_codec.JSONDecodeError:
             raise Exception("API响应不是有效的JSON格式")
         except Exception as e:
             if "API" in str(e):
@@ -331,8 +366,7 @@ class QwenImageEditNode:
             Exception: 当图像编辑失败时抛出异常
         """
         try:
-            print(f"开始图像编辑任务...")
-            print(f"编辑指令: {edit_instruction[:50]}{'...' if len(edit_instruction) > 50 else ''}")
+            logger.debug("开始图像编辑任务，编辑指令: %.50s", edit_instruction)
             
             # 验证输入参数
             if not api_key or api_key == "your-api-key-here":
@@ -354,14 +388,14 @@ class QwenImageEditNode:
             if len(image.shape) not in [3, 4]:
                 raise Exception(f"不支持的图像tensor维度: {image.shape}")
             
-            print(f"输入图像尺寸: {image.shape}")
+            logger.debug("输入图像尺寸: %s", tuple(image.shape))
             
             # 将输入图像转换为base64
-            print("正在转换图像格式...")
-            input_base64 = self.tensor_to_base64(image)
+            logger.debug("正在转换图像格式...")
+            input_base64 = encode_pool.encode(self.tensor_to_image_bytes, image)
             
             # 调用API进行图像编辑
-            print("正在调用千问图像编辑API...")
+            logger.debug("正在调用千问图像编辑API...")
             result_base64 = self.call_qwen_api(
                 image_base64=input_base64,
                 edit_instruction=edit_instruction.strip(),
@@ -373,15 +407,15 @@ class QwenImageEditNode:
             )
             
             # 将结果转换回tensor
-            print("正在转换结果图像...")
+            logger.debug("正在转换结果图像...")
             result_tensor = self.base64_to_tensor(result_base64)
             
-            print(f"图像编辑完成，输出尺寸: {result_tensor.shape}")
+            logger.info("图像编辑完成，输出尺寸: %s", tuple(result_tensor.shape))
             return (result_tensor,)
             
         except Exception as e:
             error_msg = f"图像编辑失败: {str(e)}"
-            print(error_msg)
+            logger.error("%s", error_msg)
             # 抛出异常而不是返回原图，让用户知道具体错误
             raise Exception(error_msg)
     
@@ -408,7 +442,7 @@ class QwenImageEditNode:
             }
             
             # 发送一个简单的测试请求
-            response = requests.get(url.replace('/generation', ''), headers=headers, timeout=10)
+            response = transport.get(url.replace('/generation', ''), headers=headers, timeout=10)
             
             if response.status_code == 401:
                 return False, "API密钥无效"
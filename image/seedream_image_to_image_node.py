@@ -4,16 +4,26 @@ Seedream 4.5 图生图节点
 API 文档: https://www.volcengine.com/docs/82379/1541523
 """
 
-import torch
-import numpy as np
-from PIL import Image
-import requests
-import json
-import base64
 import time
 import os
 import io
 
+from ..utils.lazy_import import lazy_import
+from ..utils import encode_pool, json_codec, transport, upload_cache
+from ..utils.logger import get_logger
+from ..utils.comfy_compat import progress_bar
+from ..utils.fingerprint import fingerprint_inputs
+from ..utils.image_codec import IncrementalBatchDecoder, decode_base64_views, decode_images_to_batch
+from ..utils.sse import iter_sse_events
+from ..utils.streaming_body import data_uri
+
+torch = lazy_import("torch")
+np = lazy_import("numpy")
+Image = lazy_import("PIL.Image")
+requests = lazy_import("requests")
+
+logger = get_logger("seedream")
+
 
 class SeedreamImageToImageNode:
     """
@@ -82,67 +92,81 @@ class SeedreamImageToImageNode:
                 ], {
                     "default": "disabled"
                 }),
+                # 组图：大于 1 时开启连续生成，最多生成该数量的图片（参考图 + 生成图不超过 15 张）
+                "max_images": ("INT", {
+                    "default": 1,
+                    "min": 1,
+                    "max": 14
+                }),
+                # 流式返回：每生成一张图片就返回并解码，缩短首张图片的等待时间
+                "stream": ("BOOLEAN", {
+                    "default": False
+                }),
             }
         }
     
+    @classmethod
+    def IS_CHANGED(cls, **kwargs):
+        """
+        输入指纹：控件参数不变时复用 ComfyUI 缓存，seed 为 -1 时每次重新生成
+        （连接的输入图像在这里为 None，是否变化由 ComfyUI 按上游节点判断）
+        """
+        return fingerprint_inputs(kwargs)
+    
     RETURN_TYPES = ("IMAGE", "STRING")
     RETURN_NAMES = ("image", "info")
     FUNCTION = "generate"
     CATEGORY = "xj_nodes/image"
     
-    def encode_image_to_base64(self, image_tensor):
-        """将 ComfyUI 的 Tensor 格式图片编码为 Base64 字符串"""
+    def encode_image_bytes(self, image_tensor):
+        """将 ComfyUI 的 Tensor 格式图片编码为 PNG 字节"""
         try:
             # 转换为 PIL Image
             i = 255. * image_tensor.cpu().numpy()
             img = Image.fromarray(np.clip(i, 0, 255).astype(np.uint8))
             
-            # 编码为 Base64
             byte_arr = io.BytesIO()
             img.save(byte_arr, format='PNG')
-            byte_arr = byte_arr.getvalue()
-            base64_bytes = base64.b64encode(byte_arr)
-            base64_string = base64_bytes.decode('utf-8')
-            
-            return f"data:image/png;base64,{base64_string}"
+            return byte_arr.getvalue()
         except Exception as e:
-            print(f"❌ 图像编码失败: {e}")
+            logger.error("图像编码失败: %s", e)
             return None
     
+    def encode_image_to_base64(self, image_tensor):
+        """将 ComfyUI 的 Tensor 格式图片编码为 Base64 data URI 字符串"""
+        image_bytes = self.encode_image_bytes(image_tensor)
+        if image_bytes is None:
+            return None
+        return str(data_uri(image_bytes, "image/png"))
+    
     def decode_base64_to_tensor(self, base64_string):
-        """将 Base64 字符串解码为 ComfyUI 的 Tensor 格式"""
+        """将 Base64 字符串（可带 data URI 前缀，或为响应字节的 memoryview 切片）解码为 ComfyUI 的 Tensor 格式"""
         try:
-            # 移除 data URI 前缀
-            if ',' in base64_string:
-                base64_string = base64_string.split(',', 1)[1]
-            
-            # 解码 Base64
-            img_data = base64.b64decode(base64_string)
-            img = Image.open(io.BytesIO(img_data)).convert("RGB")
-            
-            # 转换为 Tensor
-            np_image = np.array(img).astype(np.float32) / 255.0
-            tensor = torch.from_numpy(np_image)[None,]
-            
-            return tensor
+            return decode_images_to_batch(decode_base64_views([base64_string]))
+        except Exception as e:
+            logger.error("图像解码失败: %s", e)
+            return None
+    
+    def download_image_bytes(self, url):
+        """从 URL 下载图片字节，失败时返回 None"""
+        try:
+            logger.debug("正在下载图片: %.80s...", url)
+            response = transport.get(url, timeout=60)
+            response.raise_for_status()
+            return response.content
         except Exception as e:
-            print(f"❌ 图像解码失败: {e}")
+            logger.error("图片下载失败: %s", e)
             return None
     
     def download_image_from_url(self, url):
         """从 URL 下载图片并转换为 Tensor"""
+        image_bytes = self.download_image_bytes(url)
+        if image_bytes is None:
+            return None
         try:
-            print(f"📥 正在下载图片: {url[:80]}...")
-            response = requests.get(url, timeout=60)
-            response.raise_for_status()
-            
-            img = Image.open(io.BytesIO(response.content)).convert("RGB")
-            np_image = np.array(img).astype(np.float32) / 255.0
-            tensor = torch.from_numpy(np_image)[None,]
-            
-            return tensor
+            return decode_images_to_batch([image_bytes])
         except Exception as e:
-            print(f"❌ 图片下载失败: {e}")
+            logger.error("图片解码失败: %s", e)
             return None
     
     def convert_aspect_ratio_to_size(self, aspect_ratio):
@@ -165,16 +189,76 @@ class SeedreamImageToImageNode:
         
         return aspect_ratio_map.get(aspect_ratio, aspect_ratio)
     
+    def generate_streaming(self, api_url, headers, payload, max_images):
+        """
+        流式生成：每收到一张图片的事件就立即解码进输出批次并更新进度条，
+        解码与服务端继续生成后续图片重叠
+        
+        Returns:
+            tuple: (图像批次或 None, 首张图片耗时秒数或 None, 失败信息列表)
+        """
+        start_time = time.time()
+        response = transport.post(
+            api_url,
+            headers=headers,
+            json=dict(payload, stream=True),
+            timeout=180,
+            stream=True
+        )
+        
+        decoder = IncrementalBatchDecoder(max_images)
+        progress = progress_bar(max_images)
+        first_image_time = None
+        failures = []
+        finished = 0
+        with response:
+            transport.raise_for_status(response)
+            for event in iter_sse_events(response, blob_keys=("b64_json",)):
+                event_type = event.get("type", "")
+                label = f"第 {event.get('image_index', finished) + 1} 张"
+                if event_type == "image_generation.partial_succeeded":
+                    try:
+                        if event.get("b64_json"):
+                            # 解码进复用的缓冲区后立即写入批次
+                            image_bytes = decode_base64_views([event["b64_json"]])[0]
+                        else:
+                            image_bytes = self.download_image_bytes(event.get("url"))
+                            if image_bytes is None:
+                                raise ValueError("图片下载失败")
+                        decoder.add(image_bytes)
+                    except Exception as e:
+                        failures.append(f"{label}: {e}")
+                        logger.error("%s图片处理失败: %s", label, e)
+                    else:
+                        if first_image_time is None:
+                            first_image_time = time.time() - start_time
+                        logger.debug("%s图片已解码，耗时 %.2f秒", label, time.time() - start_time)
+                elif event_type == "image_generation.partial_failed":
+                    error = event.get("error") or {}
+                    failures.append(f"{label}: {error.get('message') or json_codec.dumps(error)}")
+                    logger.error("%s图片生成失败: %s", label, json_codec.dumps(error))
+                elif event_type == "image_generation.completed":
+                    logger.debug("流式生成完成: usage=%s", json_codec.dumps(event.get("usage")))
+                    continue
+                elif event.get("error"):
+                    raise Exception(f"API 返回错误: {json_codec.dumps_elided(event['error'])}")
+                else:
+                    continue
+                finished += 1
+                progress.update_absolute(finished, max(max_images, finished))
+        
+        return decoder.result(), first_image_time, failures
+    
     def generate(self, image, prompt, api_key, model, strength, size, seed, watermark,
                  api_url="https://ark.cn-beijing.volces.com/api/v3/images/generations",
-                 optimize_prompt_mode="disabled"):
+                 optimize_prompt_mode="disabled", max_images=1, stream=False):
         """
         执行图生图生成
         """
         # 验证 API Key
         if not api_key or api_key.strip() == "":
             error_msg = "❌ 错误: API Key 为空，跳过接口调用"
-            print(error_msg)
+            logger.error("%s", error_msg)
             # 返回一个 1x1 的占位符图片（黑色）表示未生成图片
             placeholder = torch.zeros((1, 1, 1, 3), dtype=torch.float32)
             return (placeholder, error_msg)
@@ -182,17 +266,11 @@ class SeedreamImageToImageNode:
         # 验证 API URL
         if not api_url or not (api_url.startswith("http://") or api_url.startswith("https://")):
             error_msg = "❌ 错误: API URL 无效"
-            print(error_msg)
+            logger.error("%s", error_msg)
             return (image, error_msg)
         
-        print(f"\n{'='*60}")
-        print(f"🎨 Seedream 图生图开始")
-        print(f"{'='*60}")
-        print(f"📝 Prompt: {prompt[:100]}...")
-        print(f"🤖 Model: {model}")
-        print(f"💪 Strength: {strength}")
-        print(f"📐 Size: {size}")
-        print(f"🎲 Seed: {seed}")
+        logger.debug("Seedream 图生图开始: prompt=%.100s..., model=%s, strength=%s, size=%s, seed=%s",
+                     prompt, model, strength, size, seed)
         
         # 处理输入图像
         # image 的 shape 是 [batch, height, width, channels]
@@ -202,13 +280,13 @@ class SeedreamImageToImageNode:
         else:
             input_image = image
         
-        # 编码图像为 Base64
-        print(f"🔄 正在编码输入图像...")
-        base64_image = self.encode_image_to_base64(input_image)
+        # 编码图像（发送时按块 base64 编码，不生成完整的 base64 字符串）
+        logger.debug("正在编码输入图像...")
+        image_bytes = encode_pool.encode(self.encode_image_bytes, input_image)
         
-        if not base64_image:
+        if not image_bytes:
             error_msg = "❌ 图像编码失败"
-            print(error_msg)
+            logger.error("%s", error_msg)
             return (image, error_msg)
         
         # 构建请求
@@ -220,7 +298,8 @@ class SeedreamImageToImageNode:
         payload = {
             "model": model,
             "prompt": prompt,
-            "image": base64_image,
+            # 开启上传缓存且配置了对象存储时引用已上传的地址，否则内联
+            "image": upload_cache.image_value(image_bytes, "image/png", "store"),
             "strength": strength,
             "response_format": "b64_json",
             "watermark": watermark
@@ -234,7 +313,7 @@ class SeedreamImageToImageNode:
             # 如果是宽高比格式，转换为像素尺寸
             if ":" in size:
                 actual_size = self.convert_aspect_ratio_to_size(size)
-                print(f"📐 宽高比 {size} 转换为像素尺寸: {actual_size}")
+                logger.debug("宽高比 %s 转换为像素尺寸: %s", size, actual_size)
                 payload["size"] = actual_size
             else:
                 payload["size"] = size
@@ -244,85 +323,110 @@ class SeedreamImageToImageNode:
             payload["optimize_prompt_options"] = {
                 "mode": optimize_prompt_mode
             }
-            print(f"✨ 提示词优化模式: {optimize_prompt_mode}")
+            logger.debug("提示词优化模式: %s", optimize_prompt_mode)
+        
+        # 组图（连续生成）
+        if max_images > 1:
+            payload["sequential_image_generation"] = "auto"
+            payload["sequential_image_generation_options"] = {
+                "max_images": max_images
+            }
         
         # 发送请求
         try:
-            print(f"📤 正在发送请求到 API...")
+            logger.debug("正在发送请求到 API: %s", api_url)
             start_time = time.time()
             
-            response = requests.post(
+            if stream:
+                output_batch, first_image_time, failures = self.generate_streaming(
+                    api_url, headers, payload, max_images)
+                elapsed_time = time.time() - start_time
+                
+                if output_batch is None:
+                    error_msg = "❌ 流式生成未返回可用图片"
+                    if failures:
+                        error_msg += "\n" + "\n".join(failures)
+                    logger.error("%s", error_msg)
+                    return (image, error_msg)
+                
+                info_msg = (f"✅ 成功生成 {output_batch.shape[0]} 张图片，"
+                            f"首张 {first_image_time:.2f}秒，总耗时 {elapsed_time:.2f}秒")
+                if failures:
+                    info_msg += f"\n⚠️ {len(failures)} 张失败: " + "; ".join(failures)
+                logger.info("%s", info_msg)
+                return (output_batch, info_msg)
+            
+            response = transport.post(
                 api_url,
                 headers=headers,
-                data=json.dumps(payload),
+                json=payload,
                 timeout=180
             )
             
             end_time = time.time()
             elapsed_time = end_time - start_time
             
-            print(f"⏱️  API 响应状态码: {response.status_code}, 耗时: {elapsed_time:.2f}秒")
+            logger.debug("API 响应状态码: %s, 耗时: %.2f秒", response.status_code, elapsed_time)
             
             response.raise_for_status()
-            result = response.json()
+            # b64_json 不生成 str，以响应字节的 memoryview 切片返回
+            result = json_codec.response_json(response, blob_keys=("b64_json",))
             
             # 解析结果
             if "data" in result and len(result["data"]) > 0:
-                generated_images = []
+                encoded_images = []
+                # 全部 b64_json 一次解码进复用的缓冲区
+                decoded = iter(decode_base64_views(
+                    [item["b64_json"] for item in result["data"] if item.get("b64_json")], skip_errors=True))
                 
                 for idx, item in enumerate(result["data"]):
-                    print(f"🖼️  处理第 {idx + 1} 张生成的图片...")
+                    logger.debug("处理第 %d 张生成的图片...", idx + 1)
                     
                     # 优先使用 b64_json
-                    if "b64_json" in item and item["b64_json"]:
-                        tensor = self.decode_base64_to_tensor(item["b64_json"])
-                        if tensor is not None:
-                            generated_images.append(tensor)
+                    if item.get("b64_json"):
+                        image_bytes = next(decoded)
+                        if image_bytes is not None:
+                            encoded_images.append(image_bytes)
                     # 其次使用 URL
                     elif "url" in item and item["url"]:
-                        tensor = self.download_image_from_url(item["url"])
-                        if tensor is not None:
-                            generated_images.append(tensor)
+                        image_bytes = self.download_image_bytes(item["url"])
+                        if image_bytes is not None:
+                            encoded_images.append(image_bytes)
                 
-                if generated_images:
-                    # 合并所有生成的图片
-                    output_batch = torch.cat(generated_images, dim=0)
-                    
-                    info_msg = f"✅ 成功生成 {len(generated_images)} 张图片，耗时 {elapsed_time:.2f}秒"
-                    print(f"\n{info_msg}")
-                    print(f"{'='*60}\n")
+                # 所有图片直接解码进同一个预分配的输出批次
+                output_batch = decode_images_to_batch(encoded_images, skip_errors=True)
+                
+                if output_batch is not None:
+                    info_msg = f"✅ 成功生成 {output_batch.shape[0]} 张图片，耗时 {elapsed_time:.2f}秒"
+                    logger.info("%s", info_msg)
                     
                     return (output_batch, info_msg)
                 else:
                     error_msg = "❌ 无法处理 API 返回的图片数据"
-                    print(error_msg)
+                    logger.error("%s", error_msg)
                     return (image, error_msg)
             else:
-                error_msg = f"❌ API 返回数据异常: {json.dumps(result, ensure_ascii=False)}"
-                print(error_msg)
+                error_msg = f"❌ API 返回数据异常: {json_codec.dumps_elided(result)}"
+                logger.error("%s", error_msg)
                 return (image, error_msg)
         
         except requests.exceptions.RequestException as e:
             error_msg = f"❌ API 请求失败: {str(e)}"
-            print(f"\n{error_msg}")
             
             if hasattr(e, 'response') and e.response is not None:
-                print(f"状态码: {e.response.status_code}")
+                logger.debug("状态码: %s", e.response.status_code)
                 try:
-                    error_detail = e.response.json()
-                    print(f"错误详情: {json.dumps(error_detail, indent=2, ensure_ascii=False)}")
-                    error_msg += f"\n{json.dumps(error_detail, ensure_ascii=False)}"
+                    error_detail = json_codec.response_json(e.response)
+                    error_msg += f"\n{json_codec.dumps_elided(error_detail)}"
                 except:
-                    print(f"响应内容: {e.response.text}")
                     error_msg += f"\n{e.response.text}"
             
-            print(f"{'='*60}\n")
+            logger.error("%s", error_msg)
             return (image, error_msg)
         
         except Exception as e:
             error_msg = f"❌ 未知错误: {str(e)}"
-            print(f"\n{error_msg}")
-            print(f"{'='*60}\n")
+            logger.error("%s", error_msg)
             return (image, error_msg)
 
 
@@ -1,11 +1,34 @@
-import requests
+"""
+阿里云万相图像生成节点
+
+- WanxImageGenerationNode: 提交异步任务并等待完成，直接输出图像
+- WanxTaskSubmitNode: 只提交任务，立即输出 task_id；后台线程轮询并下载结果，工作流中的其他节点可同时执行
+- WanxTaskCollectNode: 等待一个或多个 task_id 完成，按顺序合并为一个图像批次
+
+进行中的任务记录在 utils.job_journal 中：ComfyUI 在任务渲染途中重启后，相同的请求接管原任务继续等待，不重复提交。
+"""
+
 import base64
 import io
-from PIL import Image
-import numpy as np
-import torch
-import json
+import re
+import threading
 import time
+from collections import OrderedDict
+
+from ..utils.lazy_import import lazy_import
+from ..utils import encode_pool, job_journal, json_codec, transport, upload_cache
+from ..utils.logger import get_logger
+from ..utils.comfy_compat import execution_blocker
+from ..utils.fingerprint import fingerprint_inputs
+from ..utils.image_codec import decode_images_to_batch
+from ..utils.streaming_body import data_uri
+
+requests = lazy_import("requests")
+Image = lazy_import("PIL.Image")
+np = lazy_import("numpy")
+torch = lazy_import("torch")
+
+logger = get_logger("wanx")
 
 class WanxImageGenerationNode:
     """
@@ -58,11 +81,25 @@ class WanxImageGenerationNode:
             }
         }
     
+    @classmethod
+    def IS_CHANGED(cls, **kwargs):
+        """
+        输入指纹：提示词与参数不变时复用 ComfyUI 缓存，不重复调用 API
+        """
+        return fingerprint_inputs(kwargs)
+    
     RETURN_TYPES = ("IMAGE",)
     RETURN_NAMES = ("image",)
     FUNCTION = "generate_image"
     CATEGORY = "XJ_Nodes/Image"
     
+    # 任务查询端点（基准测试可替换为本地模拟服务）
+    TASK_URL = "https://dashscope.aliyuncs.com/api/v1/tasks/{task_id}"
+    
+    # 任务轮询参数（秒）
+    MAX_WAIT_TIME = 300
+    POLL_INTERVAL = 2
+    
     # 尺寸比例映射表（符合API要求：768*768到1440*1440之间）
     SIZE_MAP = {
         "1:1": "1280*1280",
@@ -75,15 +112,15 @@ class WanxImageGenerationNode:
         "21:9": "1344*576",
     }
     
-    def tensor_to_base64(self, tensor_image):
+    def tensor_to_image_bytes(self, tensor_image):
         """
-        将tensor图像转换为base64编码
+        将tensor图像编码为PNG字节
         
         Args:
             tensor_image: 输入的tensor图像，形状为[B,H,W,C]或[H,W,C]
             
         Returns:
-            str: base64编码的图像字符串
+            bytes: 编码后的图像数据
         """
         try:
             # 处理tensor维度
@@ -105,16 +142,58 @@ class WanxImageGenerationNode:
             # 创建PIL图像
             pil_image = Image.fromarray(numpy_image)
             
-            # 转换为base64
             buffer = io.BytesIO()
             pil_image.save(buffer, format='PNG', quality=95, optimize=True)
-            img_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
-            
-            return img_base64
+            return buffer.getvalue()
             
         except Exception as e:
             raise Exception(f"图像转换为base64失败: {str(e)}")
     
+    def tensor_to_base64(self, tensor_image):
+        """
+        将tensor图像转换为base64编码
+        
+        Args:
+            tensor_image: 输入的tensor图像，形状为[B,H,W,C]或[H,W,C]
+            
+        Returns:
+            str: base64编码的图像字符串
+        """
+        return base64.b64encode(self.tensor_to_image_bytes(tensor_image)).decode('utf-8')
+    
+    def base64_to_bytes(self, base64_string):
+        """
+        将base64编码（可带data URL前缀）解码为图像字节
+        
+        Args:
+            base64_string (str): base64编码的图像字符串
+            
+        Returns:
+            bytes: 图像数据
+        """
+        # 移除可能的data URL前缀
+        if base64_string.startswith('data:image/'):
+            base64_string = base64_string.split(',')[1]
+        return base64.b64decode(base64_string)
+    
+    def base64_list_to_tensor(self, base64_list):
+        """
+        将多张base64编码的图像直接解码为一个预分配的批次张量
+        
+        Args:
+            base64_list (list[str]): base64编码的图像字符串列表（尺寸需一致）
+            
+        Returns:
+            torch.Tensor: tensor格式的图像，形状为[N,H,W,3]
+        """
+        try:
+            batch = decode_images_to_batch([self.base64_to_bytes(s) for s in base64_list])
+        except Exception as e:
+            raise Exception(f"base64转换为tensor失败: {str(e)}")
+        if batch is None:
+            raise Exception("base64转换为tensor失败: 没有可用的图像")
+        return batch
+    
     def base64_to_tensor(self, base64_string):
         """
         将base64编码转换为tensor图像
@@ -125,31 +204,25 @@ class WanxImageGenerationNode:
         Returns:
             torch.Tensor: tensor格式的图像，形状为[1,H,W,3]
         """
-        try:
-            # 移除可能的data URL前缀
-            if base64_string.startswith('data:image/'):
-                base64_string = base64_string.split(',')[1]
-            
-            # 解码base64
-            img_data = base64.b64decode(base64_string)
-            
-            # 转换为PIL图像
-            pil_image = Image.open(io.BytesIO(img_data))
-            
-            # 确保是RGB模式
-            if pil_image.mode != 'RGB':
-                pil_image = pil_image.convert('RGB')
-            
-            # 转换为numpy数组
-            numpy_image = np.array(pil_image).astype(np.float32) / 255.0
-            
-            # 转换为tensor，添加batch维度
-            tensor_image = torch.from_numpy(numpy_image).unsqueeze(0)
+        return self.base64_list_to_tensor([base64_string])
+    
+    def download_image_bytes(self, image_url):
+        """
+        从URL下载图片
+        
+        Args:
+            image_url: 图片URL
             
-            return tensor_image
+        Returns:
+            bytes: 图像数据
+        """
+        try:
+            response = transport.get(image_url, timeout=60)
+            response.raise_for_status()
+            return response.content
             
         except Exception as e:
-            raise Exception(f"base64转换为tensor失败: {str(e)}")
+            raise Exception(f"下载图片失败: {str(e)}")
     
     def download_image_from_url(self, image_url):
         """
@@ -161,21 +234,12 @@ class WanxImageGenerationNode:
         Returns:
             base64编码的图像字符串
         """
-        try:
-            response = requests.get(image_url, timeout=60)
-            response.raise_for_status()
-            
-            # 将图片数据转换为base64
-            image_base64 = base64.b64encode(response.content).decode('utf-8')
-            return image_base64
-            
-        except Exception as e:
-            raise Exception(f"下载图片失败: {str(e)}")
+        return base64.b64encode(self.download_image_bytes(image_url)).decode('utf-8')
     
     def call_wanx_api(self, prompt, api_key, api_baseurl, model="wanx-v1", size="1024*1024", 
                       reference_image_base64=None):
         """
-        调用阿里云万相API生成图像
+        调用阿里云万相API生成图像（提交任务并等待完成）
         
         Args:
             prompt (str): 图像描述
@@ -183,11 +247,32 @@ class WanxImageGenerationNode:
             api_baseurl (str): API基础URL
             model (str): 模型名称
             size (str): 图像尺寸
-            reference_image_base64 (str): 参考图片的base64编码
+            reference_image_base64 (str | bytes): 参考图片，见 submit_task
             
         Returns:
             list: 生成的图像base64字符串列表
         """
+        task_id = self.submit_task(prompt, api_key, api_baseurl, model, size, reference_image_base64)
+        # 轮询任务状态
+        return self.wait_for_task_completion(task_id, api_key)
+    
+    def submit_task(self, prompt, api_key, api_baseurl, model="wanx-v1", size="1024*1024",
+                    reference_image_base64=None):
+        """
+        提交万相异步任务
+        
+        Args:
+            prompt (str): 图像描述
+            api_key (str): API密钥
+            api_baseurl (str): API基础URL
+            model (str): 模型名称
+            size (str): 图像尺寸
+            reference_image_base64 (str | bytes): 参考图片的base64编码，或编码后的图像字节（发送时按块 base64 编码；
+                开启上传缓存时上传到百炼临时存储，以 oss:// 地址引用）
+            
+        Returns:
+            str: 任务ID
+        """
         # 验证输入参数
         if not api_key or api_key == "your-api-key-here":
             raise Exception("请设置有效的API密钥")
@@ -216,42 +301,51 @@ class WanxImageGenerationNode:
             }
         }
         
+        # ComfyUI 重启前提交、仍在进行中的相同请求直接接管，不重复提交
+        journal_key = job_journal.request_key(url, api_key, dict(data, ref_img=reference_image_base64))
+        entry = job_journal.lookup(journal_key)
+        if entry is not None:
+            logger.info("接管已提交的任务 %s（状态: %s）", entry["task_id"], entry["status"])
+            return entry["task_id"]
+        
         # 添加参考图片
         if reference_image_base64:
-            data["input"]["ref_img"] = f"data:image/png;base64,{reference_image_base64}"
+            if isinstance(reference_image_base64, (bytes, bytearray)):
+                ref_img = upload_cache.image_value(reference_image_base64, "image/png", "dashscope", api_key, model)
+            else:
+                ref_img = data_uri(reference_image_base64, "image/png")
+            data["input"]["ref_img"] = ref_img
+            upload_cache.add_oss_header(headers, ref_img)
         
         try:
-            print(f"正在调用万相API: {model}")
-            print(f"提示词: {prompt[:100]}{'...' if len(prompt) > 100 else ''}")
-            if reference_image_base64:
-                print(f"使用参考图片进行图生图")
+            logger.debug("正在调用万相API: %s, 提示词: %.100s, 参考图片: %s",
+                         model, prompt, "是" if reference_image_base64 else "否")
             
             # 提交任务
-            response = requests.post(url, json=data, headers=headers, timeout=30)
+            response = transport.post(url, json=data, headers=headers, timeout=30)
             response.raise_for_status()
             
-            result = response.json()
+            result = json_codec.response_json(response)
             
             # 检查是否成功提交任务
             if "output" in result and "task_id" in result["output"]:
                 task_id = result["output"]["task_id"]
-                print(f"任务已提交，任务ID: {task_id}")
-                
-                # 轮询任务状态
-                return self.wait_for_task_completion(task_id, api_key)
+                logger.info("任务已提交，任务ID: %s", task_id)
+                job_journal.record_submit(journal_key, task_id, kind="wanx")
+                return task_id
             else:
                 # 检查错误信息
                 if "code" in result:
                     error_msg = result.get("message", "未知错误")
                     raise Exception(f"API返回错误 {result['code']}: {error_msg}")
                 
-                raise Exception(f"API响应格式异常: {json.dumps(result, ensure_ascii=False)[:200]}")
+                raise Exception(f"API响应格式异常: {json_codec.dumps_elided(result)[:200]}")
             
         except requests.exceptions.Timeout:
             raise Exception("API请求超时，请稍后重试")
         except requests.exceptions.RequestException as e:
             raise Exception(f"网络请求失败: {str(e)}")
-        except json.JSONDecodeError:
+        except json_codec.JSONDecodeError:
             raise Exception("API响应不是有效的JSON格式")
         except Exception as e:
             if "API" in str(e):
@@ -259,79 +353,120 @@ class WanxImageGenerationNode:
             else:
                 raise Exception(f"处理API响应时出错: {str(e)}")
     
-    def wait_for_task_completion(self, task_id, api_key, max_wait_time=300, poll_interval=2):
+    def query_task(self, task_id, api_key):
         """
-        等待任务完成
+        查询一次任务状态
         
         Args:
             task_id (str): 任务ID
             api_key (str): API密钥
-            max_wait_time (int): 最大等待时间（秒）
-            poll_interval (int): 轮询间隔（秒）
             
         Returns:
-            list: 生成的图像base64字符串列表
+            dict: 响应中的 output（含 task_status，成功时含 results）
         """
-        url = f"https://dashscope.aliyuncs.com/api/v1/tasks/{task_id}"
+        url = self.TASK_URL.format(task_id=task_id)
         headers = {
             "Authorization": f"Bearer {api_key}"
         }
         
+        try:
+            response = transport.get(url, headers=headers, timeout=30)
+            response.raise_for_status()
+            result = json_codec.response_json(response)
+        except requests.exceptions.RequestException as e:
+            if getattr(e.response, "status_code", None) == 404:
+                # 任务已过期或不存在，下次相同请求重新提交
+                job_journal.discard(task_id)
+            raise Exception(f"查询任务状态失败: {str(e)}")
+        
+        if "output" in result:
+            return result["output"]
+        
+        # 检查错误信息
+        if "code" in result:
+            error_msg = result.get("message", "未知错误")
+            raise Exception(f"API返回错误 {result['code']}: {error_msg}")
+        
+        raise Exception(f"API响应格式异常: {json_codec.dumps_elided(result)[:200]}")
+    
+    def task_status(self, task_id, api_key):
+        """
+        查询任务状态并写入任务日志（任务结束时删除记录）
+        
+        Args:
+            task_id (str): 任务ID
+            api_key (str): API密钥
+            
+        Returns:
+            dict: 与 query_task 相同结构的 output
+        """
+        output = self.query_task(task_id, api_key)
+        job_journal.update(task_id, output.get("task_status", ""))
+        return output
+    
+    def result_urls(self, output):
+        """
+        取出成功任务的图像URL
+        
+        Args:
+            output (dict): query_task 返回的 output
+            
+        Returns:
+            list: 图像URL列表
+        """
+        urls = [item.get("url") for item in output.get("results", []) if item.get("url")]
+        if not urls:
+            raise Exception("未找到生成的图像")
+        return urls
+    
+    def wait_for_task_completion(self, task_id, api_key, max_wait_time=None, poll_interval=None):
+        """
+        等待任务完成
+        
+        Args:
+            task_id (str): 任务ID
+            api_key (str): API密钥
+            max_wait_time (int): 最大等待时间（秒），默认使用 MAX_WAIT_TIME
+            poll_interval (int): 轮询间隔（秒），默认使用 POLL_INTERVAL
+            
+        Returns:
+            list: 生成的图像base64字符串列表
+        """
+        if max_wait_time is None:
+            max_wait_time = self.MAX_WAIT_TIME
+        if poll_interval is None:
+            poll_interval = self.POLL_INTERVAL
+        
         start_time = time.time()
         
         while True:
             if time.time() - start_time > max_wait_time:
                 raise Exception(f"任务超时，等待时间超过 {max_wait_time} 秒")
             
-            try:
-                response = requests.get(url, headers=headers, timeout=30)
-                response.raise_for_status()
-                
-                result = response.json()
-                
-                # 检查任务状态
-                if "output" in result:
-                    task_status = result["output"].get("task_status", "")
-                    
-                    if task_status == "SUCCEEDED":
-                        print("任务完成！")
-                        # 获取生成的图像
-                        results = result["output"].get("results", [])
-                        if not results:
-                            raise Exception("未找到生成的图像")
-                        
-                        # 下载所有图像
-                        image_base64_list = []
-                        for i, item in enumerate(results):
-                            image_url = item.get("url")
-                            if image_url:
-                                print(f"正在下载第 {i+1}/{len(results)} 张图片...")
-                                img_base64 = self.download_image_from_url(image_url)
-                                image_base64_list.append(img_base64)
-                        
-                        return image_base64_list
-                    
-                    elif task_status == "FAILED":
-                        error_msg = result["output"].get("message", "任务失败")
-                        raise Exception(f"任务失败: {error_msg}")
-                    
-                    elif task_status in ["PENDING", "RUNNING"]:
-                        print(f"任务进行中... (状态: {task_status})")
-                        time.sleep(poll_interval)
-                    
-                    else:
-                        raise Exception(f"未知任务状态: {task_status}")
+            output = self.task_status(task_id, api_key)
+            task_status = output.get("task_status", "")
+            
+            if task_status == "SUCCEEDED":
+                logger.debug("任务完成: %s", task_id)
+                # 下载所有图像
+                urls = self.result_urls(output)
+                image_base64_list = []
+                for i, image_url in enumerate(urls):
+                    logger.debug("正在下载第 %d/%d 张图片...", i + 1, len(urls))
+                    image_base64_list.append(self.download_image_from_url(image_url))
                 
-                else:
-                    # 检查错误信息
-                    if "code" in result:
-                        error_msg = result.get("message", "未知错误")
-                        raise Exception(f"API返回错误 {result['code']}: {error_msg}")
-                    
-                    raise Exception(f"API响应格式异常: {json.dumps(result, ensure_ascii=False)[:200]}")
+                return image_base64_list
             
-            except requests.exceptions.RequestException as e:
-                raise Exception(f"查询任务状态失败: {str(e)}")
+            elif task_status == "FAILED":
+                error_msg = output.get("message", "任务失败")
+                raise Exception(f"任务失败: {error_msg}")
+            
+            elif task_status in ["PENDING", "RUNNING"]:
+                logger.debug("任务进行中... (状态: %s)", task_status)
+                time.sleep(poll_interval)
+            
+            else:
+                raise Exception(f"未知任务状态: {task_status}")
     
     def generate_image(self, prompt, size, api_baseurl, api_key, model, image=None):
         """
@@ -349,8 +484,7 @@ class WanxImageGenerationNode:
             tuple: 包含生成图像tensor的元组
         """
         try:
-            print(f"开始图像生成任务...")
-            print(f"提示词: {prompt[:100]}{'...' if len(prompt) > 100 else ''}")
+            logger.debug("开始图像生成任务，提示词: %.100s", prompt)
             
             # 验证API密钥
             if not api_key or api_key == "your-api-key-here":
@@ -362,16 +496,16 @@ class WanxImageGenerationNode:
             
             # 转换尺寸比例为实际像素尺寸
             actual_size = self.SIZE_MAP.get(size, "1280*1280")
-            print(f"图像尺寸: {size} -> {actual_size}")
+            logger.debug("图像尺寸: %s -> %s", size, actual_size)
             
             # 处理参考图片
             reference_image_base64 = None
             if image is not None:
-                print("正在处理参考图片...")
-                reference_image_base64 = self.tensor_to_base64(image)
+                logger.debug("正在处理参考图片...")
+                reference_image_base64 = encode_pool.encode(self.tensor_to_image_bytes, image)
             
             # 调用API生成图像
-            print(f"正在调用万相API生成图像...")
+            logger.debug("正在调用万相API生成图像...")
             result_base64_list = self.call_wanx_api(
                 prompt=prompt.strip(),
                 api_key=api_key,
@@ -381,35 +515,294 @@ class WanxImageGenerationNode:
                 reference_image_base64=reference_image_base64
             )
             
-            # 将所有结果转换为tensor
-            print(f"正在转换结果图像... (共 {len(result_base64_list)} 张)")
-            result_tensors = []
-            for i, base64_str in enumerate(result_base64_list):
-                tensor = self.base64_to_tensor(base64_str)
-                result_tensors.append(tensor)
-                print(f"  图片 {i+1}/{len(result_base64_list)}: {tensor.shape}")
-            
-            # 合并所有tensor
-            if len(result_tensors) == 1:
-                final_tensor = result_tensors[0]
-            else:
-                final_tensor = torch.cat(result_tensors, dim=0)
+            # 将所有结果直接解码进同一个预分配的输出批次
+            logger.debug("正在转换结果图像... (共 %d 张)", len(result_base64_list))
+            final_tensor = self.base64_list_to_tensor(result_base64_list)
             
-            print(f"图像生成完成！最终输出尺寸: {final_tensor.shape}")
+            logger.info("图像生成完成，最终输出尺寸: %s", tuple(final_tensor.shape))
             return (final_tensor,)
             
         except Exception as e:
             error_msg = f"图像生成失败: {str(e)}"
-            print(error_msg)
+            logger.error("%s", error_msg)
             raise Exception(error_msg)
 
 
+# 后台轮询任务的最长时间（秒），超过后停止轮询，收集节点会重新开始跟踪
+TASK_POLL_LIMIT = 3600
+# 进程内保留的已结束任务数量（含下载好的图像），超出时丢弃最早的
+MAX_FINISHED_TASKS = 64
+
+
+def parse_task_ids(task_ids):
+    """
+    解析 task_id 列表（换行、逗号或空白分隔），去重并保持顺序
+    
+    Args:
+        task_ids (str): 提交节点输出的 task_ids
+        
+    Returns:
+        list: task_id 列表
+    """
+    return list(dict.fromkeys(t for t in re.split(r"[\s,]+", task_ids or "") if t))
+
+
+class WanxTaskJob:
+    """
+    单个万相异步任务的本地状态，由后台线程轮询更新，成功后立即下载结果图像
+    
+    Attributes:
+        status (str): 最近一次查询到的任务状态
+        images (list): 成功后下载的图像字节
+        error (str): 任务失败或轮询出错时的错误信息
+        done (threading.Event): 任务结束（成功并已下载、失败或轮询出错）
+    """
+    
+    def __init__(self, task_id, api_key):
+        self.task_id = task_id
+        self.api_key = api_key
+        self.status = "PENDING"
+        self.images = None
+        self.error = None
+        self.done = threading.Event()
+        self._thread = None
+    
+    def start(self, poll_interval):
+        self._thread = threading.Thread(target=self._poll, args=(poll_interval,),
+                                        name=f"xj-wanx-{self.task_id}", daemon=True)
+        self._thread.start()
+    
+    def _poll(self, poll_interval):
+        client = WanxImageGenerationNode()
+        deadline = time.time() + TASK_POLL_LIMIT
+        try:
+            while True:
+                output = client.task_status(self.task_id, self.api_key)
+                self.status = output.get("task_status", "")
+                if self.status == "SUCCEEDED":
+                    self.images = [client.download_image_bytes(url) for url in client.result_urls(output)]
+                    logger.info("任务 %s 完成，已下载 %d 张图片", self.task_id, len(self.images))
+                    break
+                if self.status == "FAILED":
+                    self.error = f"任务失败: {output.get('message', '任务失败')}"
+                    break
+                if self.status not in ("PENDING", "RUNNING"):
+                    self.error = f"未知任务状态: {self.status}"
+                    break
+                if time.time() > deadline:
+                    self.error = f"任务超时，轮询时间超过 {TASK_POLL_LIMIT} 秒"
+                    break
+                time.sleep(poll_interval)
+        except Exception as e:
+            self.error = str(e)
+        finally:
+            if self.error:
+                logger.error("任务 %s: %s", self.task_id, self.error)
+            self.done.set()
+
+
+class _WanxTaskRegistry:
+    """进程内的任务表：提交节点登记，收集节点查找；重启后收集节点会按 task_id 重新开始轮询"""
+    
+    def __init__(self):
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def track(self, task_id, api_key):
+        with self._lock:
+            job = self._jobs.get(task_id)
+            # 轮询出错的任务允许重新跟踪（服务端已失败的任务除外）
+            if job is None or (job.done.is_set() and job.error and job.status != "FAILED"):
+                job = WanxTaskJob(task_id, api_key)
+                self._jobs[task_id] = job
+                job.start(WanxImageGenerationNode.POLL_INTERVAL)
+            self._prune()
+            return job
+    
+    def finished(self, task_ids):
+        """task_ids 是否全部已结束（收集节点据此决定是否复用缓存）"""
+        with self._lock:
+            jobs = [self._jobs.get(task_id) for task_id in task_ids]
+        return bool(jobs) and all(job is not None and job.done.is_set() for job in jobs)
+    
+    def _prune(self):
+        finished = [task_id for task_id, job in self._jobs.items() if job.done.is_set()]
+        for task_id in finished[:max(0, len(finished) - MAX_FINISHED_TASKS)]:
+            del self._jobs[task_id]
+
+
+TASK_REGISTRY = _WanxTaskRegistry()
+
+
+class WanxTaskSubmitNode(WanxImageGenerationNode):
+    """
+    万相任务提交节点
+    只提交异步任务并立即输出 task_id，后台线程轮询并下载结果；
+    可串联多个提交节点，由一个收集节点统一等待
+    """
+    
+    @classmethod
+    def INPUT_TYPES(cls):
+        """
+        定义节点的输入类型（在万相图像生成节点的基础上增加上游 task_ids）
+        """
+        types = super().INPUT_TYPES()
+        types["optional"]["task_ids"] = ("STRING", {
+            "forceInput": True,
+            "tooltip": "上游提交节点输出的 task_ids，新任务追加在其后"
+        })
+        return types
+    
+    RETURN_TYPES = ("STRING", "STRING")
+    RETURN_NAMES = ("task_ids", "status_info")
+    FUNCTION = "submit"
+    CATEGORY = "XJ_Nodes/Image"
+    
+    def submit(self, prompt, size, api_baseurl, api_key, model, image=None, task_ids=""):
+        """
+        提交图像生成任务
+        
+        Returns:
+            tuple: (换行分隔的 task_id 列表, 状态信息)
+        """
+        try:
+            actual_size = self.SIZE_MAP.get(size, "1280*1280")
+            
+            reference_image_base64 = None
+            if image is not None:
+                logger.debug("正在处理参考图片...")
+                reference_image_base64 = encode_pool.encode(self.tensor_to_image_bytes, image)
+            
+            task_id = self.submit_task(
+                prompt=prompt.strip(),
+                api_key=api_key,
+                api_baseurl=api_baseurl,
+                model=model,
+                size=actual_size,
+                reference_image_base64=reference_image_base64
+            )
+        except Exception as e:
+            error_msg = f"任务提交失败: {str(e)}"
+            logger.error("%s", error_msg)
+            raise Exception(error_msg)
+        
+        # 立即开始后台轮询，结果在收集节点执行前就可能已下载完成
+        TASK_REGISTRY.track(task_id, api_key)
+        all_ids = parse_task_ids(task_ids)
+        if task_id not in all_ids:
+            all_ids.append(task_id)
+        status_info = f"已提交任务 {task_id}（共 {len(all_ids)} 个）"
+        return ("\n".join(all_ids), status_info)
+
+
+class WanxTaskCollectNode:
+    """
+    万相任务收集节点
+    等待所有任务结束，把成功任务的图像按 task_id 顺序合并为一个批次；部分任务失败时在 status_info 中说明
+    """
+    
+    @classmethod
+    def INPUT_TYPES(cls):
+        """
+        定义节点的输入类型
+        """
+        return {
+            "required": {
+                "api_key": ("STRING", {
+                    "default": "your-api-key-here",
+                    "tooltip": "阿里云DashScope API密钥（与提交节点一致）"
+                }),
+                "task_ids": ("STRING", {
+                    "multiline": True,
+                    "default": "",
+                    "tooltip": "提交节点输出的 task_ids（换行或逗号分隔）"
+                }),
+            },
+            "optional": {
+                "wait": ("BOOLEAN", {
+                    "default": True,
+                    "tooltip": "是否阻塞等待任务完成；关闭时任务未完成则阻止下游执行并输出当前状态"
+                }),
+                "timeout": ("INT", {
+                    "default": 300,
+                    "min": 1,
+                    "max": 86400,
+                    "step": 1,
+                    "tooltip": "等待的最长时间（秒）"
+                }),
+            }
+        }
+    
+    @classmethod
+    def IS_CHANGED(cls, **kwargs):
+        """
+        task_ids 填写在控件上且任务全部结束后结果不再变化，按输入指纹复用缓存；否则每次重新检查
+
+        task_ids 连接自提交节点时这里收到 None，无法判断任务是否结束，总是重新执行
+        （已结束的任务由 TASK_REGISTRY 直接返回结果，不重复等待）
+        """
+        task_ids = kwargs.get("task_ids")
+        if task_ids and TASK_REGISTRY.finished(parse_task_ids(task_ids)):
+            return fingerprint_inputs(kwargs)
+        return float("nan")
+    
+    RETURN_TYPES = ("IMAGE", "STRING")
+    RETURN_NAMES = ("image", "status_info")
+    FUNCTION = "collect"
+    CATEGORY = "XJ_Nodes/Image"
+    
+    def collect(self, api_key, task_ids, wait=True, timeout=300):
+        """
+        收集任务结果
+        
+        Returns:
+            tuple: (图像批次, 状态信息)
+        """
+        ids = parse_task_ids(task_ids)
+        if not ids:
+            raise Exception("task_ids 不能为空")
+        
+        jobs = [TASK_REGISTRY.track(task_id, api_key) for task_id in ids]
+        if wait:
+            deadline = time.time() + timeout
+            for job in jobs:
+                job.done.wait(max(0.0, deadline - time.time()))
+        
+        pending = [job for job in jobs if not job.done.is_set()]
+        failed = [job for job in jobs if job.done.is_set() and job.error]
+        status_info = (f"任务 {len(jobs)} 个：成功 {len(jobs) - len(pending) - len(failed)}，"
+                       f"失败 {len(failed)}，进行中 {len(pending)}")
+        for job in failed:
+            status_info += f"\n{job.task_id}: {job.error}"
+        
+        if pending:
+            if wait:
+                raise Exception(f"等待任务超时（{timeout} 秒）: {status_info}")
+            logger.info("%s", status_info)
+            # 未完成时阻止下游执行，只输出状态
+            return (execution_blocker(None), status_info)
+        
+        images = [data for job in jobs if not job.error for data in job.images]
+        if not images:
+            raise Exception(f"没有成功的任务: {status_info}")
+        try:
+            batch = decode_images_to_batch(images)
+        except Exception as e:
+            raise Exception(f"图像解码失败: {str(e)}")
+        
+        logger.info("%s，输出尺寸: %s", status_info, tuple(batch.shape))
+        return (batch, status_info)
+
+
 # 节点映射
 NODE_CLASS_MAPPINGS = {
-    "WanxImageGenerationNode": WanxImageGenerationNode
+    "WanxImageGenerationNode": WanxImageGenerationNode,
+    "WanxTaskSubmitNode": WanxTaskSubmitNode,
+    "WanxTaskCollectNode": WanxTaskCollectNode
 }
 
 NODE_DISPLAY_NAME_MAPPINGS = {
-    "WanxImageGenerationNode": "万相图像生成"
+    "WanxImageGenerationNode": "万相图像生成",
+    "WanxTaskSubmitNode": "万相任务提交",
+    "WanxTaskCollectNode": "万相任务结果收集"
 }
-
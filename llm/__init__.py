@@ -3,6 +3,7 @@
 
 from .llm_api_node import NODE_CLASS_MAPPINGS as LLM_API_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS as LLM_API_DISPLAY_MAPPINGS
 from .llm_vision_node import NODE_CLASS_MAPPINGS as LLM_VISION_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS as LLM_VISION_DISPLAY_MAPPINGS
+from .llm_batch_api_node import NODE_CLASS_MAPPINGS as LLM_BATCH_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS as LLM_BATCH_DISPLAY_MAPPINGS
 from .llm_config_node import NODE_CLASS_MAPPINGS as LLM_CONFIG_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS as LLM_CONFIG_DISPLAY_MAPPINGS
 from .llm_web_search_node import NODE_CLASS_MAPPINGS as LLM_WEB_SEARCH_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS as LLM_WEB_SEARCH_DISPLAY_MAPPINGS
 from .doubao_vision_websearch_node import NODE_CLASS_MAPPINGS as DOUBAO_VISION_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS as DOUBAO_VISION_DISPLAY_MAPPINGS
@@ -11,6 +12,7 @@ from .doubao_vision_websearch_node import NODE_CLASS_MAPPINGS as DOUBAO_VISION_M
 NODE_CLASS_MAPPINGS = {}
 NODE_CLASS_MAPPINGS.update(LLM_API_MAPPINGS)
 NODE_CLASS_MAPPINGS.update(LLM_VISION_MAPPINGS)
+NODE_CLASS_MAPPINGS.update(LLM_BATCH_MAPPINGS)
 NODE_CLASS_MAPPINGS.update(LLM_CONFIG_MAPPINGS)
 NODE_CLASS_MAPPINGS.update(LLM_WEB_SEARCH_MAPPINGS)
 NODE_CLASS_MAPPINGS.update(DOUBAO_VISION_MAPPINGS)
@@ -18,6 +20,7 @@ NODE_CLASS_MAPPINGS.update(DOUBAO_VISION_MAPPINGS)
 NODE_DISPLAY_NAME_MAPPINGS = {}
 NODE_DISPLAY_NAME_MAPPINGS.update(LLM_API_DISPLAY_MAPPINGS)
 NODE_DISPLAY_NAME_MAPPINGS.update(LLM_VISION_DISPLAY_MAPPINGS)
+NODE_DISPLAY_NAME_MAPPINGS.update(LLM_BATCH_DISPLAY_MAPPINGS)
 NODE_DISPLAY_NAME_MAPPINGS.update(LLM_CONFIG_DISPLAY_MAPPINGS)
 NODE_DISPLAY_NAME_MAPPINGS.update(LLM_WEB_SEARCH_DISPLAY_MAPPINGS)
 NODE_DISPLAY_NAME_MAPPINGS.update(DOUBAO_VISION_DISPLAY_MAPPINGS)
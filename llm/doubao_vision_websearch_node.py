@@ -9,14 +9,30 @@ API 文档:
 - 豆包助手参考: https://www.volcengine.com/docs/82379/1978533
 """
 
-import torch
-import numpy as np
-from PIL import Image
-import requests
-import json
-import base64
 import os
 import io
+import logging
+import time
+
+from ..utils.lazy_import import lazy_import
+from ..utils import encode_pool, json_codec, transport, upload_cache
+from ..utils import context_cache as ark_context
+from ..utils.logger import get_logger
+from ..utils.fingerprint import fingerprint_inputs
+from ..utils.image_codec import downscale_for_vision, estimate_image_tokens
+from ..utils.streaming_body import data_uri
+from ..utils.comfy_compat import output_is_linked, progress_text
+from ..utils.sse import ChatStreamMerger, iter_sse_events
+
+torch = lazy_import("torch")
+np = lazy_import("numpy")
+Image = lazy_import("PIL.Image")
+requests = lazy_import("requests")
+
+logger = get_logger("doubao_vision")
+
+# 流式输出时刷新节点上显示内容的最短间隔（秒）
+STREAM_DISPLAY_INTERVAL = 0.2
 
 
 class DoubaoVisionWebSearchNode:
@@ -81,16 +97,44 @@ class DoubaoVisionWebSearchNode:
                     "multiline": True,
                     "default": "你是一个专业的图像分析助手，擅长识别和理解图片内容。请用清晰、准确的语言描述图片中的内容。"
                 }),
+                "detail_level": (["low", "high", "auto"], {
+                    "default": "auto",
+                    "tooltip": "图像理解精细度：low 最多约 100 万像素，high / auto 最多约 400 万像素；上传前按此缩小图像"
+                }),
+                "stream": ("BOOLEAN", {
+                    "default": False,
+                    "tooltip": "流式输出：内容与联网搜索事件到达即显示在节点上，并记录首 token 耗时"
+                }),
+                "context_cache": ("BOOLEAN", {
+                    "default": False,
+                    "tooltip": "上下文缓存：系统提示词与图像创建为方舟上下文缓存，有效期内只发送问题文本（需模型支持 Context API）"
+                }),
+            },
+            "hidden": {
+                "graph_prompt": "PROMPT",
+                "unique_id": "UNIQUE_ID",
             }
         }
     
+    @classmethod
+    def IS_CHANGED(cls, **kwargs):
+        """
+        输入指纹：提示词与参数不变时复用 ComfyUI 缓存，不重复调用 API
+        （连接的输入图像在这里为 None，是否变化由 ComfyUI 按上游节点判断）
+        """
+        return fingerprint_inputs(kwargs)
+    
     RETURN_TYPES = ("STRING", "STRING", "STRING")
     RETURN_NAMES = ("response", "search_results", "full_response")
     FUNCTION = "process"
     CATEGORY = "xj_nodes/llm"
     
-    def encode_image_to_base64(self, image_tensor):
-        """将 ComfyUI 的 Tensor 格式图片编码为 Base64 字符串"""
+    def encode_image_bytes(self, image_tensor, detail_level="auto"):
+        """
+        将 ComfyUI 的 Tensor 格式图片编码为 JPEG 字节
+        
+        先缩小到豆包视觉模型在 detail_level 下实际使用的像素上限，再以 JPEG 编码
+        """
         try:
             # 处理批次维度
             if len(image_tensor.shape) == 4:
@@ -99,46 +143,86 @@ class DoubaoVisionWebSearchNode:
             # 转换为 PIL Image
             i = 255. * image_tensor.cpu().numpy()
             img = Image.fromarray(np.clip(i, 0, 255).astype(np.uint8))
+            img = downscale_for_vision(img, detail_level=detail_level, profile="doubao")
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("图像尺寸: %dx%d，预估图像tokens: %d", img.width, img.height,
+                            estimate_image_tokens(img.width, img.height, detail_level=detail_level,
+                                                  profile="doubao"))
             
-            # 编码为 Base64
             byte_arr = io.BytesIO()
-            img.save(byte_arr, format='PNG')
-            byte_arr = byte_arr.getvalue()
-            base64_bytes = base64.b64encode(byte_arr)
-            base64_string = base64_bytes.decode('utf-8')
-            
-            return f"data:image/png;base64,{base64_string}"
+            img.save(byte_arr, format='JPEG', quality=95)
+            return byte_arr.getvalue()
         except Exception as e:
-            print(f"❌ 图像编码失败: {e}")
+            logger.error("图像编码失败: %s", e)
+            return None
+    
+    def encode_image_to_base64(self, image_tensor, detail_level="auto"):
+        """将 ComfyUI 的 Tensor 格式图片编码为 Base64 data URI 字符串"""
+        image_bytes = self.encode_image_bytes(image_tensor, detail_level)
+        if image_bytes is None:
             return None
+        return str(data_uri(image_bytes, "image/jpeg"))
+    
+    def read_stream(self, response, start_time, unique_id=None):
+        """
+        读取 SSE 流式响应：内容增量与联网搜索事件到达即显示在节点上，并记录首 token 耗时
+        
+        Returns:
+            tuple: (与非流式相同结构的响应, 首 token 耗时秒数或 None)
+        """
+        merger = ChatStreamMerger()
+        first_token_time = None
+        last_display = 0.0
+        with response:
+            for event in iter_sse_events(response):
+                if event.get("error"):
+                    raise Exception(f"API 返回错误: {json_codec.dumps_elided(event['error'])}")
+                content, tool_calls = merger.add(event)
+                elapsed = time.time() - start_time
+                for tool_call in tool_calls:
+                    logger.info("🔍 %.1f秒 调用工具: %s", elapsed, tool_call.get("type"))
+                    progress_text(f"🔍 联网搜索中...（{elapsed:.1f}秒）", unique_id)
+                if event.get("references"):
+                    logger.info("🔍 %.1f秒 联网搜索返回 %d 条结果", elapsed, len(event["references"]))
+                if content:
+                    if first_token_time is None:
+                        first_token_time = elapsed
+                        logger.info("首 token 耗时 %.2f秒", first_token_time)
+                    logger.debug("内容增量: %s", content)
+                    if elapsed - last_display >= STREAM_DISPLAY_INTERVAL:
+                        progress_text(merger.content, unique_id)
+                        last_display = elapsed
+        progress_text(merger.content, unique_id)
+        return merger.result(), first_token_time
     
     def process(self, input_text, api_key, model, enable_websearch,
                 input_image=None, api_url="https://ark.cn-beijing.volces.com/api/v3/chat/completions",
-                temperature=0.7, max_tokens=2048, system_prompt=""):
+                temperature=0.7, max_tokens=2048, system_prompt="", detail_level="auto", stream=False,
+                context_cache=False, graph_prompt=None, unique_id=None):
         """
         执行图片理解和联网搜索
         """
         # 验证 API Key
         if not api_key or api_key.strip() == "":
             error_msg = "❌ 错误: 请设置 API Key（环境变量 ARK_API_KEY 或在节点中输入）"
-            print(error_msg)
+            logger.error("%s", error_msg)
             return (error_msg, "", "")
         
         # 验证和修复 API URL
         if not api_url or not (api_url.startswith("http://") or api_url.startswith("https://")):
             error_msg = "❌ 错误: API URL 无效"
-            print(error_msg)
+            logger.error("%s", error_msg)
             return (error_msg, "", "")
         
         # 自动补全 URL（如果用户只输入了基础 URL）
         if api_url.endswith("/api/v3") or api_url.endswith("/api/v3/"):
             api_url = api_url.rstrip("/") + "/chat/completions"
-            print(f"💡 已自动补全 API URL: {api_url}")
+            logger.debug("已自动补全 API URL: %s", api_url)
         elif not api_url.endswith("/chat/completions"):
             # 如果 URL 不完整，尝试补全
             if "/api/v3" in api_url:
                 api_url = api_url.rstrip("/") + "/chat/completions"
-                print(f"💡 已自动补全 API URL: {api_url}")
+                logger.debug("已自动补全 API URL: %s", api_url)
             else:
                 error_msg = f"""❌ 错误: API URL 格式不正确
 
@@ -151,7 +235,7 @@ https://ark.cn-beijing.volces.com/api/v3/chat/completions
 - 如果只输入了基础 URL（如 https://ark.cn-beijing.volces.com/api/v3），
   节点会自动补全为完整路径
 - 或者直接使用默认值（推荐）"""
-                print(error_msg)
+                logger.error("%s", error_msg)
                 return (error_msg, "", "")
         
         # 验证 Model/Endpoint ID
@@ -171,7 +255,7 @@ https://ark.cn-beijing.volces.com/api/v3/chat/completions
 ⚠️ 注意：
 - 不同账户的可用模型列表可能不同
 - 如果模型名称不可用，请从控制台获取你的 Endpoint ID"""
-            print(error_msg)
+            logger.error("%s", error_msg)
             return (error_msg, "", "")
         
         # 提前检测：如果连接了图片但使用的是已知不支持视觉的模型
@@ -205,17 +289,12 @@ https://ark.cn-beijing.volces.com/api/v3/chat/completions
 - 断开 input_image 连接
 - 只使用文本输入 + 联网搜索
 - 当前模型 {model} 支持文本理解和联网搜索"""
-            print(f"\n{error_msg}\n")
+            logger.error("%s", error_msg)
             return (error_msg, "", "")
         
-        print(f"\n{'='*60}")
-        print(f"🤖 火山引擎多模态理解 + 联网搜索")
-        print(f"{'='*60}")
-        print(f"📝 输入文本: {input_text[:100]}...")
-        print(f"🔍 模型: {model}")
-        print(f"🌐 联网搜索: {'启用' if enable_websearch else '禁用'}")
-        if input_image is not None:
-            print(f"🖼️  图片输入: 已提供")
+        logger.debug("输入文本: %.100s..., 模型: %s, 联网搜索: %s, 图片输入: %s",
+                     input_text, model, "启用" if enable_websearch else "禁用",
+                     "已提供" if input_image is not None else "无")
         
         # 构建消息内容
         messages = []
@@ -243,19 +322,22 @@ https://ark.cn-beijing.volces.com/api/v3/chat/completions
             })
             
             # 添加图片内容
-            print(f"🔄 正在编码输入图像...")
-            base64_image = self.encode_image_to_base64(input_image)
+            logger.debug("正在编码输入图像...")
+            image_bytes = encode_pool.encode(self.encode_image_bytes, input_image, detail_level)
             
-            if not base64_image:
+            if not image_bytes:
                 error_msg = "❌ 图像编码失败"
-                print(error_msg)
+                logger.error("%s", error_msg)
                 return (error_msg, "", "")
             
+            # 开启上传缓存且配置了对象存储时引用已上传的地址，否则内联
+            image_url = {"url": upload_cache.image_value(image_bytes, "image/jpeg", "store")}
+            # auto 时沿用服务端默认行为，不显式传 detail
+            if detail_level != "auto":
+                image_url["detail"] = detail_level
             user_message["content"].append({
                 "type": "image_url",
-                "image_url": {
-                    "url": base64_image
-                }
+                "image_url": image_url
             })
         else:
             # 纯文本时，使用字符串格式
@@ -296,28 +378,69 @@ https://ark.cn-beijing.volces.com/api/v3/chat/completions
                 }
             ]
             payload["tool_choice"] = "auto"  # 模型自动判断是否需要联网
-            print(f"✨ 已启用联网搜索工具")
+            logger.debug("已启用联网搜索工具")
+        
+        # 流式输出（最后一个事件携带用量）
+        if stream:
+            payload["stream"] = True
+            payload["stream_options"] = {"include_usage": True}
+        
+        # 上下文缓存：系统提示词与图像作为前缀缓存，有效期内只发送问题文本
+        request_url = api_url
+        request_payload = payload
+        context_id = None
+        if context_cache:
+            prefix = messages[:-1]
+            if input_image is not None:
+                prefix = prefix + [{"role": "user", "content": user_message["content"][1:]}]
+            if prefix:
+                context_id = ark_context.get_or_create(api_url, headers, model, prefix)
+            if context_id:
+                request_url = ark_context.api_urls(api_url)[1]
+                request_payload = dict(payload, context_id=context_id,
+                                       messages=[{"role": "user", "content": input_text}])
         
         # 发送请求
         try:
-            print(f"📤 正在发送请求到 API...")
-            import time
+            logger.debug("正在发送请求到 API: %s", api_url)
             start_time = time.time()
             
-            response = requests.post(
-                api_url,
+            response = transport.post(
+                request_url,
                 headers=headers,
-                data=json.dumps(payload),
-                timeout=180
+                json=request_payload,
+                timeout=180,
+                stream=stream
             )
             
-            end_time = time.time()
-            elapsed_time = end_time - start_time
+            if context_id and response.status_code in (400, 404):
+                # 上下文已过期、不存在或不支持本次请求：改为发送完整请求
+                error_text = response.text
+                response.close()
+                logger.warning("上下文缓存请求失败 (%s)，改为发送完整请求: %.200s", response.status_code, error_text)
+                # 上下文过期或不存在时下次重新创建；其他原因被拒绝时该前缀暂停使用缓存，避免每次都多发一次请求
+                expired = response.status_code == 404 or "context" in error_text.lower()
+                ark_context.invalidate(context_id, backoff=not expired)
+                context_id = None
+                response = transport.post(
+                    api_url,
+                    headers=headers,
+                    json=payload,
+                    timeout=180,
+                    stream=stream
+                )
+            
+            logger.debug("API 响应状态码: %s, 耗时: %.2f秒", response.status_code, time.time() - start_time)
             
-            print(f"⏱️  API 响应状态码: {response.status_code}, 耗时: {elapsed_time:.2f}秒")
+            first_token_time = None
+            with response:
+                transport.raise_for_status(response)
+                if stream and "text/event-stream" in response.headers.get("Content-Type", ""):
+                    result, first_token_time = self.read_stream(response, start_time, unique_id)
+                else:
+                    result = json_codec.response_json(response)
             
-            response.raise_for_status()
-            result = response.json()
+            elapsed_time = time.time() - start_time
             
             # 解析结果
             if "choices" in result and len(result["choices"]) > 0:
@@ -335,55 +458,51 @@ https://ark.cn-beijing.volces.com/api/v3/chat/completions
                             function = tool_call.get("function", {})
                             arguments = function.get("arguments", "{}")
                             try:
-                                args_dict = json.loads(arguments)
-                                search_info.append(json.dumps(args_dict, indent=2, ensure_ascii=False))
+                                args_dict = json_codec.loads(arguments)
+                                search_info.append(json_codec.dumps_elided(args_dict, indent=2))
                             except:
                                 search_info.append(arguments)
                     
                     if search_info:
                         search_results = "\n\n".join(search_info)
-                        print(f"🔍 搜索结果已提取")
+                        logger.debug("搜索结果已提取")
+                
+                # 联网搜索返回的参考资料（火山方舟在响应中附带 references 时）
+                if result.get("references"):
+                    references = json_codec.dumps_elided(result["references"], indent=2)
+                    search_results = f"{search_results}\n\n{references}" if search_results else references
                 
                 # 使用信息
                 usage = result.get("usage", {})
                 usage_info = f"输入tokens: {usage.get('prompt_tokens', 0)}, 输出tokens: {usage.get('completion_tokens', 0)}, 总计: {usage.get('total_tokens', 0)}"
                 
-                info_msg = f"✅ 处理成功，耗时 {elapsed_time:.2f}秒\n{usage_info}"
-                print(f"\n{info_msg}")
-                print(f"{'='*60}\n")
+                if first_token_time is not None:
+                    usage_info += f", 首 token 耗时: {first_token_time:.2f}秒"
+                if context_id:
+                    cached_tokens = ark_context.record_usage(usage)
+                    usage_info += (f", 上下文缓存: {context_id}（缓存 tokens: {cached_tokens}，"
+                                   f"命中率 {ark_context.stats()['hit_rate']:.0%}）")
+                logger.info("处理成功，耗时 %.2f秒，%s", elapsed_time, usage_info)
                 
-                # 返回结果
-                full_response = json.dumps(result, indent=2, ensure_ascii=False)
+                # 返回结果（仅在输出被连接时序列化完整响应）
+                full_response = ""
+                if output_is_linked(graph_prompt, unique_id, 2):
+                    full_response = json_codec.dumps_elided(result, indent=2)
                 return (content, search_results, full_response)
             else:
-                error_msg = f"❌ API 返回数据异常: {json.dumps(result, ensure_ascii=False)}"
-                print(error_msg)
-                return (error_msg, "", json.dumps(result, indent=2, ensure_ascii=False))
+                error_msg = f"❌ API 返回数据异常: {json_codec.dumps_elided(result)}"
+                logger.error("%s", error_msg)
+                return (error_msg, "", json_codec.dumps_elided(result, indent=2))
         
         except requests.exceptions.RequestException as e:
             error_msg = f"❌ API 请求失败: {str(e)}"
-            print(f"\n{error_msg}")
             
             if hasattr(e, 'response') and e.response is not None:
                 status_code = e.response.status_code
-                print(f"状态码: {status_code}")
+                logger.debug("状态码: %s", status_code)
                 
                 # 特殊处理 404 错误（URL 不正确）
                 if status_code == 404:
-                    print(f"\n{'='*60}")
-                    print(f"⚠️  API 地址未找到 (404)")
-                    print(f"{'='*60}")
-                    print(f"❌ 请求的 URL: {api_url}")
-                    print(f"\n💡 可能的原因：")
-                    print(f"1. API URL 不完整（缺少 /chat/completions 路径）")
-                    print(f"2. API URL 格式错误")
-                    print(f"\n💡 解决方法：")
-                    print(f"1. 使用默认的 API URL（推荐）：")
-                    print(f"   https://ark.cn-beijing.volces.com/api/v3/chat/completions")
-                    print(f"\n2. 或者确保 URL 以 /chat/completions 结尾")
-                    print(f"\n3. 检查节点中的 'api_url' 参数是否正确")
-                    print(f"{'='*60}\n")
-                    
                     error_msg = f"""❌ API 地址未找到 (404)
 
 请求的 URL: {api_url}
@@ -396,36 +515,16 @@ https://ark.cn-beijing.volces.com/api/v3/chat/completions
 
 3. 如果只输入了基础 URL，节点会自动补全"""
                     
-                    print(f"{'='*60}\n")
+                    logger.error("%s", error_msg)
                     return (error_msg, "", "")
                 
                 try:
-                    error_detail = e.response.json()
+                    error_detail = json_codec.response_json(e.response)
                     error_code = error_detail.get("error", {}).get("code", "")
                     error_message = error_detail.get("error", {}).get("message", "")
                     
                     # 特殊处理多模态错误
                     if "multi-modal" in error_message.lower() or "multimodal" in error_message.lower():
-                        print(f"\n{'='*60}")
-                        print(f"⚠️  多模态输入错误")
-                        print(f"{'='*60}")
-                        print(f"❌ 错误信息: {error_message}")
-                        print(f"📝 当前使用的模型: {model}")
-                        print(f"\n💡 原因：")
-                        print(f"  当前模型不支持图片输入（多模态），只支持纯文本")
-                        print(f"\n💡 解决方法：")
-                        print(f"1. 使用支持图片理解的模型（推荐）：")
-                        print(f"   - doubao-seed-1.6-thinking（支持视觉理解）")
-                        print(f"   - doubao-vision-pro（视觉专业版）")
-                        print(f"   - doubao-seed-1.8（可能支持，需验证）")
-                        print(f"\n2. 或者不连接图片输入（纯文本模式）")
-                        print(f"\n3. 实现图片理解+联网搜索：")
-                        print(f"   - 使用支持视觉的模型")
-                        print(f"   - 连接图片到 input_image")
-                        print(f"   - 启用 enable_websearch")
-                        print(f"   - 在提示词中要求搜索相关信息")
-                        print(f"{'='*60}\n")
-                        
                         error_msg = f"❌ 多模态输入错误: {error_message}\n\n"
                         error_msg += f"📝 当前使用的模型: {model}\n\n"
                         error_msg += "💡 原因：当前模型不支持图片输入\n\n"
@@ -437,12 +536,6 @@ https://ark.cn-beijing.volces.com/api/v3/chat/completions
                     
                     # 特殊处理模型不存在错误
                     elif "InvalidEndpointOrModel.NotFound" in error_code or "NotFound" in error_code:
-                        print(f"\n{'='*60}")
-                        print(f"⚠️  模型或 Endpoint 不存在错误")
-                        print(f"{'='*60}")
-                        print(f"❌ 错误信息: {error_message}")
-                        print(f"📝 当前使用的模型: {model}")
-                        
                         # 检查模型名称格式，提供修正建议
                         format_suggestions = []
                         if "1-8" in model or "1_8" in model:
@@ -453,25 +546,6 @@ https://ark.cn-beijing.volces.com/api/v3/chat/completions
                             format_suggestions.append("• 模型名称格式可能不正确")
                             format_suggestions.append("• 正确格式：doubao-seed-1.8 或 ep-xxxxxxxxxxxxx")
                         
-                        print(f"\n💡 解决方法:")
-                        if format_suggestions:
-                            print(f"\n📌 模型名称格式建议:")
-                            for suggestion in format_suggestions:
-                                print(f"  {suggestion}")
-                            print(f"\n")
-                        
-                        print(f"1. 尝试使用正确的模型名称格式:")
-                        print(f"   - doubao-seed-1.8（豆包1.8通用版，推荐）")
-                        print(f"   - doubao-vision-pro（视觉专业版）")
-                        print(f"   - doubao-seed-1.6-thinking（1.6思考版）")
-                        print(f"\n2. 如果模型名称都不可用，使用 Endpoint ID:")
-                        print(f"   - 访问控制台: https://console.volcengine.com/ark/region:ark+cn-beijing/endpoint")
-                        print(f"   - 查看'推理接入点'列表")
-                        print(f"   - 复制你的 endpoint ID（格式: ep-xxxxxxxxxxxxx）")
-                        print(f"   - 在节点的 'model' 参数中输入该 endpoint ID")
-                        print(f"\n3. 注意：不同账户的可用模型列表可能不同")
-                        print(f"{'='*60}\n")
-                        
                         # 构建错误消息
                         error_msg = f"❌ 模型不存在: {error_message}\n\n📝 当前使用的模型: {model}\n\n"
                         if format_suggestions:
@@ -487,19 +561,17 @@ https://ark.cn-beijing.volces.com/api/v3/chat/completions
                         error_msg += "2. 如果都不可用，从控制台获取 Endpoint ID:\n"
                         error_msg += "   https://console.volcengine.com/ark/region:ark+cn-beijing/endpoint"
                     else:
-                        print(f"错误详情: {json.dumps(error_detail, indent=2, ensure_ascii=False)}")
-                        error_msg += f"\n{json.dumps(error_detail, ensure_ascii=False)}"
+                        logger.debug("错误详情: %s", error_detail)
+                        error_msg += f"\n{json_codec.dumps_elided(error_detail)}"
                 except:
-                    print(f"响应内容: {e.response.text}")
                     error_msg += f"\n{e.response.text}"
             
-            print(f"{'='*60}\n")
+            logger.error("%s", error_msg)
             return (error_msg, "", "")
         
         except Exception as e:
             error_msg = f"❌ 未知错误: {str(e)}"
-            print(f"\n{error_msg}")
-            print(f"{'='*60}\n")
+            logger.error("%s", error_msg)
             return (error_msg, "", "")
 
 
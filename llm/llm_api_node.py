@@ -1,7 +1,161 @@
-import requests
-import json
 import base64
-from typing import Dict, Any, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
+
+from ..utils.lazy_import import lazy_import
+from ..utils import json_codec, transport
+from ..utils.logger import get_logger
+from ..utils.fingerprint import fingerprint_inputs
+from ..utils.comfy_compat import output_is_linked
+from ..utils.sse import iter_sse_events, merge_chat_stream
+
+requests = lazy_import("requests")
+
+logger = get_logger("llm_api")
+
+# 批量模式
+BATCH_MODES = ["off", "lines", "jsonl", "json_list"]
+
+
+def normalize_base_url(base_url: str) -> str:
+    """确保base_url以 /v1 结尾"""
+    if not base_url.endswith('/v1'):
+        if not base_url.endswith('/'):
+            base_url += '/'
+        if not base_url.endswith('v1/'):
+            base_url += 'v1'
+    return base_url
+
+
+def build_chat_body(model: str, prompt: Any, system_prompt: str = "", temperature: float = 0.7,
+                    max_tokens: int = 1000, top_p: float = 1.0, stream: bool = False,
+                    messages: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """
+    构建 /chat/completions 请求体
+
+    Args:
+        prompt: 用户消息内容（字符串，或视觉节点的多段 content 列表）
+        messages: 直接指定完整消息列表时忽略 prompt 与 system_prompt
+
+    Returns:
+        dict: 请求体
+    """
+    if messages is None:
+        messages = []
+        if system_prompt and system_prompt.strip():
+            messages.append({
+                "role": "system",
+                "content": system_prompt.strip()
+            })
+        messages.append({
+            "role": "user",
+            "content": prompt
+        })
+    return {
+        "model": model,
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "top_p": top_p,
+        "stream": stream
+    }
+
+
+def extract_content(response_data: Dict[str, Any]) -> str:
+    """从 chat.completion 响应中提取回复文本"""
+    if "choices" in response_data and len(response_data["choices"]) > 0:
+        choice = response_data["choices"][0]
+        if "message" in choice and "content" in choice["message"]:
+            return choice["message"]["content"]
+        if "text" in choice:
+            return choice["text"]
+        return str(choice)
+    return "未找到有效的响应内容"
+
+
+def format_usage(usage: Dict[str, Any]) -> str:
+    """格式化 token 用量"""
+    return f"输入tokens: {usage.get('prompt_tokens', 'N/A')}, 输出tokens: {usage.get('completion_tokens', 'N/A')}, 总计: {usage.get('total_tokens', 'N/A')}"
+
+
+def parse_prompt_batch(prompt: Any, batch_mode: str) -> List[Dict[str, Any]]:
+    """
+    把批量输入拆分为请求列表
+
+    Args:
+        prompt: 字符串（在 ComfyUI 之外直接调用时也可以传入列表）
+        batch_mode: lines（每行一个提示词）/ jsonl（每行一个JSON）/ json_list（JSON数组）
+
+    JSON 条目可以是字符串，或包含 prompt / system_prompt / messages 字段的对象。
+
+    Returns:
+        list[dict]: 每项包含 prompt，可选 system_prompt、messages
+    """
+    if isinstance(prompt, (list, tuple)):
+        raw_items = list(prompt)
+    elif batch_mode == "lines":
+        raw_items = [line for line in prompt.splitlines() if line.strip()]
+    elif batch_mode == "jsonl":
+        raw_items = []
+        for line_no, line in enumerate(prompt.splitlines(), 1):
+            if not line.strip():
+                continue
+            try:
+                raw_items.append(json_codec.loads(line))
+            except json_codec.JSONDecodeError as e:
+                raise ValueError(f"第 {line_no} 行不是有效的JSON: {e}")
+    elif batch_mode == "json_list":
+        raw_items = json_codec.loads(prompt)
+        if not isinstance(raw_items, list):
+            raise ValueError("json_list 模式需要JSON数组")
+    else:
+        raise ValueError(f"未知的批量模式: {batch_mode}")
+
+    items = []
+    for raw in raw_items:
+        if isinstance(raw, dict):
+            if "prompt" not in raw and "messages" not in raw:
+                raise ValueError(f"批量条目缺少 prompt 或 messages 字段: {raw}")
+            items.append(raw)
+        else:
+            items.append({"prompt": str(raw)})
+    return items
+
+
+def summarize_batch_results(results: List[Dict[str, Any]], build_full_response: bool = True):
+    """
+    汇总批量结果
+
+    Args:
+        results: 每项为 {"status": "ok", "content", "usage", "response"} 或 {"status": "error", "error"}
+        build_full_response: 是否序列化每项详情
+
+    Returns:
+        Tuple[str, str, str, List[str]]: (JSON数组形式的响应, 每项详情JSON, 汇总用量, 按顺序的响应列表)
+    """
+    responses = []
+    totals = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    failed = []
+    for index, result in enumerate(results):
+        if result["status"] == "ok":
+            responses.append(result["content"])
+            for key in totals:
+                totals[key] += result["usage"].get(key) or 0
+        else:
+            responses.append(result["error"])
+            failed.append(index)
+    
+    usage_info = f"批量: {len(results)} 项，成功 {len(results) - len(failed)}，失败 {len(failed)}；{format_usage(totals)}"
+    if failed:
+        usage_info += f"；失败项序号: {', '.join(str(i) for i in failed)}"
+    
+    full_response = ""
+    if build_full_response:
+        full_response = json_codec.dumps_elided(
+            [dict(result, index=index) for index, result in enumerate(results)], indent=2)
+    
+    return (json_codec.dumps(responses), full_response, usage_info, responses)
+
 
 class LLMAPINode:
     """
@@ -72,11 +226,34 @@ class LLMAPINode:
                     "default": "false",
                     "tooltip": "是否启用流式输出"
                 }),
+                "batch_mode": (BATCH_MODES, {
+                    "default": "off",
+                    "tooltip": "批量模式：lines 每行一个提示词，jsonl 每行一个JSON，json_list 为JSON数组"
+                }),
+                "max_concurrency": ("INT", {
+                    "default": 4,
+                    "min": 1,
+                    "max": 64,
+                    "step": 1,
+                    "tooltip": "批量模式下的最大并发请求数"
+                }),
+            },
+            "hidden": {
+                "graph_prompt": "PROMPT",
+                "unique_id": "UNIQUE_ID",
             }
         }
     
-    RETURN_TYPES = ("STRING", "STRING", "STRING")
-    RETURN_NAMES = ("response", "full_response", "usage_info")
+    @classmethod
+    def IS_CHANGED(cls, **kwargs):
+        """
+        输入指纹：提示词与参数不变时复用 ComfyUI 缓存，不重复调用 API
+        """
+        return fingerprint_inputs(kwargs)
+    
+    RETURN_TYPES = ("STRING", "STRING", "STRING", "STRING")
+    RETURN_NAMES = ("response", "full_response", "usage_info", "responses")
+    OUTPUT_IS_LIST = (False, False, False, True)
     FUNCTION = "call_llm_api"
     CATEGORY = "XJ Nodes/LLM"
     
@@ -90,8 +267,12 @@ class LLMAPINode:
         temperature: float = 0.7,
         max_tokens: int = 1000,
         top_p: float = 1.0,
-        stream: str = "false"
-    ) -> Tuple[str, str, str]:
+        stream: str = "false",
+        batch_mode: str = "off",
+        max_concurrency: int = 4,
+        graph_prompt: Optional[dict] = None,
+        unique_id: Optional[str] = None
+    ) -> Tuple[str, str, str, List[str]]:
         """
         调用LLM API获取响应
         
@@ -99,127 +280,158 @@ class LLMAPINode:
             base_url: API基础URL
             api_key: API密钥
             model: 模型名称
-            prompt: 用户提示词
+            prompt: 用户提示词（批量模式下为提示词列表/多行文本/JSONL）
             system_prompt: 系统提示词
             temperature: 温度参数
             max_tokens: 最大token数
             top_p: top_p参数
             stream: 是否流式输出
+            batch_mode: 批量模式，off 为单次调用
+            max_concurrency: 批量模式下的最大并发数
+            graph_prompt: ComfyUI工作流（隐藏输入），用于判断full_response是否被连接
+            unique_id: 当前节点ID（隐藏输入）
             
         Returns:
-            Tuple[str, str, str]: (响应内容, 完整响应JSON, 使用信息)
+            Tuple[str, str, str, List[str]]: (响应内容, 完整响应JSON, 使用信息, 按顺序的响应列表)
         """
+        if batch_mode != "off" or isinstance(prompt, (list, tuple)):
+            return self.call_llm_batch(
+                base_url, api_key, model, prompt, system_prompt, temperature, max_tokens, top_p,
+                stream, batch_mode, max_concurrency, graph_prompt, unique_id)
+        
         try:
             # 验证输入参数
             if not base_url or not api_key or not model:
                 raise ValueError("base_url、api_key和model参数不能为空")
             
-            # 确保base_url以正确格式结尾
-            if not base_url.endswith('/v1'):
-                if not base_url.endswith('/'):
-                    base_url += '/'
-                if not base_url.endswith('v1/'):
-                    base_url += 'v1'
+            url = f"{normalize_base_url(base_url)}/chat/completions"
+            data = build_chat_body(model, prompt, system_prompt, temperature, max_tokens, top_p,
+                                   stream.lower() == "true")
             
-            # 构建请求URL
-            url = f"{base_url}/chat/completions"
+            logger.debug("发送请求到: %s, 模型: %s, temperature=%s, max_tokens=%s, top_p=%s",
+                         url, model, temperature, max_tokens, top_p)
             
-            # 构建请求头
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {api_key}"
-            }
+            response_data = self.send_chat_request(url, api_key, data)
+            logger.debug("响应数据结构: %s", list(response_data.keys()))
             
-            # 构建消息列表
-            messages = []
-            if system_prompt and system_prompt.strip():
-                messages.append({
-                    "role": "system",
-                    "content": system_prompt.strip()
-                })
+            # 提取响应内容
+            content = extract_content(response_data)
             
-            messages.append({
-                "role": "user",
-                "content": prompt
-            })
+            # 提取使用信息
+            usage_info = ""
+            if "usage" in response_data:
+                usage_info = format_usage(response_data["usage"])
             
-            # 构建请求数据
-            data = {
-                "model": model,
-                "messages": messages,
-                "temperature": temperature,
-                "max_tokens": max_tokens,
-                "top_p": top_p,
-                "stream": stream.lower() == "true"
-            }
+            # 格式化完整响应（仅在输出被连接时序列化）
+            full_response = ""
+            if output_is_linked(graph_prompt, unique_id, 1):
+                full_response = json_codec.dumps_elided(response_data, indent=2)
             
-            print(f"[LLM API] 发送请求到: {url}")
-            print(f"[LLM API] 使用模型: {model}")
-            print(f"[LLM API] 请求参数: temperature={temperature}, max_tokens={max_tokens}, top_p={top_p}")
+            logger.info("成功获取响应，模型: %s，内容长度: %d", model, len(content))
             
-            # 发送请求
-            response = requests.post(
-                url,
-                headers=headers,
-                json=data,
-                timeout=60
-            )
+            return (content, full_response, usage_info, [content])
             
-            print(f"[LLM API] 响应状态码: {response.status_code}")
+        except Exception as e:
+            error_msg = self.describe_error(e)
+            logger.error("%s", error_msg)
+            return (error_msg, "", "", [error_msg])
+    
+    def send_chat_request(self, url: str, api_key: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        发送 /chat/completions 请求，返回完整响应结构（流式响应合并为非流式结构）
+        
+        Raises:
+            Exception: 状态码非200时抛出，包含错误详情
+        """
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_key}"
+        }
+        is_stream = bool(data.get("stream"))
+        response = transport.post(
+            url,
+            headers=headers,
+            json=data,
+            timeout=60,
+            stream=is_stream
+        )
+        
+        with response:
+            logger.debug("响应状态码: %s", response.status_code)
             
             # 检查响应状态
             if response.status_code != 200:
                 error_msg = f"API请求失败，状态码: {response.status_code}"
                 try:
-                    error_detail = response.json()
-                    error_msg += f"\n错误详情: {json.dumps(error_detail, ensure_ascii=False, indent=2)}"
+                    error_detail = json_codec.response_json(response)
+                    error_msg += f"\n错误详情: {json_codec.dumps_elided(error_detail, indent=2)}"
                 except:
                     error_msg += f"\n响应内容: {response.text}"
                 raise Exception(error_msg)
             
-            # 解析响应
-            response_data = response.json()
-            print(f"[LLM API] 响应数据结构: {list(response_data.keys())}")
-            
-            # 提取响应内容
-            if "choices" in response_data and len(response_data["choices"]) > 0:
-                choice = response_data["choices"][0]
-                if "message" in choice and "content" in choice["message"]:
-                    content = choice["message"]["content"]
-                elif "text" in choice:
-                    content = choice["text"]
-                else:
-                    content = str(choice)
-            else:
-                content = "未找到有效的响应内容"
-            
-            # 提取使用信息
-            usage_info = ""
-            if "usage" in response_data:
-                usage = response_data["usage"]
-                usage_info = f"输入tokens: {usage.get('prompt_tokens', 'N/A')}, 输出tokens: {usage.get('completion_tokens', 'N/A')}, 总计: {usage.get('total_tokens', 'N/A')}"
-            
-            # 格式化完整响应
-            full_response = json.dumps(response_data, ensure_ascii=False, indent=2)
-            
-            print(f"[LLM API] 成功获取响应，内容长度: {len(content)}")
-            
-            return (content, full_response, usage_info)
-            
-        except requests.exceptions.Timeout:
-            error_msg = "请求超时，请检查网络连接或增加超时时间"
-            print(f"[LLM API] 错误: {error_msg}")
-            return (error_msg, "", "")
-            
-        except requests.exceptions.ConnectionError:
-            error_msg = "连接错误，请检查base_url是否正确以及网络连接"
-            print(f"[LLM API] 错误: {error_msg}")
-            return (error_msg, "", "")
-            
+            # 解析响应（流式响应合并为完整结构）
+            if is_stream and "text/event-stream" in response.headers.get("Content-Type", ""):
+                return merge_chat_stream(iter_sse_events(response))
+            return json_codec.response_json(response)
+    
+    def describe_error(self, error: Exception) -> str:
+        """把异常转换为节点输出的错误信息"""
+        if isinstance(error, requests.exceptions.Timeout):
+            return "请求超时，请检查网络连接或增加超时时间"
+        if isinstance(error, requests.exceptions.ConnectionError):
+            return "连接错误，请检查base_url是否正确以及网络连接"
+        return f"调用LLM API时发生错误: {str(error)}"
+    
+    def call_llm_batch(self, base_url, api_key, model, prompt, system_prompt, temperature,
+                       max_tokens, top_p, stream, batch_mode, max_concurrency,
+                       graph_prompt=None, unique_id=None):
+        """
+        批量调用：所有请求共用 transport 的连接池，以有限并发执行
+        
+        单项失败不会中断整个批次，失败项在 responses 中为错误信息，
+        在 full_response 中标记为 "status": "error"。
+        
+        Returns:
+            Tuple[str, str, str, List[str]]: (JSON数组形式的响应, 每项详情JSON, 汇总用量, 按顺序的响应列表)
+        """
+        try:
+            if not base_url or not api_key or not model:
+                raise ValueError("base_url、api_key和model参数不能为空")
+            items = parse_prompt_batch(prompt, batch_mode if batch_mode != "off" else "lines")
         except Exception as e:
             error_msg = f"调用LLM API时发生错误: {str(e)}"
-            print(f"[LLM API] 错误: {error_msg}")
-            return (error_msg, "", "")
+            logger.error("%s", error_msg)
+            return (error_msg, "", "", [error_msg])
+        
+        url = f"{normalize_base_url(base_url)}/chat/completions"
+        is_stream = stream.lower() == "true"
+        
+        def run(item):
+            data = build_chat_body(
+                item.get("model", model), item.get("prompt", ""),
+                item.get("system_prompt", system_prompt),
+                item.get("temperature", temperature), item.get("max_tokens", max_tokens),
+                item.get("top_p", top_p), is_stream, messages=item.get("messages"))
+            try:
+                response_data = self.send_chat_request(url, api_key, data)
+            except Exception as e:
+                return {"status": "error", "error": self.describe_error(e)}
+            return {"status": "ok", "content": extract_content(response_data),
+                    "usage": response_data.get("usage", {}), "response": response_data}
+        
+        workers = max(1, min(int(max_concurrency), len(items)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="xj-llm-batch") as pool:
+            results = list(pool.map(run, items))
+        
+        response_json, full_response, usage_info, responses = summarize_batch_results(
+            results, output_is_linked(graph_prompt, unique_id, 1))
+        failed = [index for index, result in enumerate(results) if result["status"] != "ok"]
+        
+        logger.info("批量调用完成，模型: %s，%d 项，失败 %d 项", model, len(items), len(failed))
+        if failed:
+            logger.warning("失败项: %s", "; ".join(f"#{i}: {results[i]['error']}" for i in failed[:5]))
+        
+        return (response_json, full_response, usage_info, responses)
 
 # 节点映射
 NODE_CLASS_MAPPINGS = {
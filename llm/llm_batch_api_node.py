@@ -0,0 +1,468 @@
+"""
+OpenAI 兼容 Batch API 节点
+
+适合夜间批量任务：把请求写成 JSONL 上传到 /files，创建 /batches，
+后台线程轮询批次状态，完成后下载结果文件。价格更低，也不占用实时接口的限流额度。
+
+- LLMBatchSubmitNode: 构建与 LLMAPINode / LLMVisionNode 相同的请求体，上传并创建批次，立即返回 batch_id
+- LLMBatchCollectNode: 等待后台轮询完成（或查询一次当前状态），按输入顺序输出结果
+"""
+
+import io
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from ..utils import json_codec, transport
+from ..utils.logger import get_logger
+from ..utils.fingerprint import fingerprint_inputs
+from ..utils.comfy_compat import output_is_linked
+from ..utils.streaming_body import materialize
+from .llm_api_node import (BATCH_MODES, build_chat_body, extract_content, normalize_base_url,
+                           parse_prompt_batch, summarize_batch_results)
+from .llm_vision_node import LLMVisionNode
+
+logger = get_logger("llm_batch")
+
+# 批次的终止状态
+FINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+# 进程内保留的已结束批次数量（含全部结果），超出时丢弃最早的；收集节点之后会按 batch_id 重新下载
+MAX_FINISHED_BATCHES = 16
+
+
+class BatchJob:
+    """
+    单个批次的本地状态，由后台线程轮询更新
+
+    Attributes:
+        batch (dict): 最近一次查询到的批次对象
+        results (list): 完成后按 custom_id 顺序排列的结果
+        done (threading.Event): 批次到达终止状态且结果已下载
+    """
+
+    def __init__(self, base_url, api_key, batch_id, total=None):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.batch_id = batch_id
+        self.total = total
+        self.batch = {"id": batch_id, "status": "validating"}
+        self.results = None
+        self.error = None
+        self.done = threading.Event()
+        self._thread = None
+
+    @property
+    def headers(self):
+        return {"Authorization": f"Bearer {self.api_key}"}
+
+    def start(self, poll_interval):
+        self._thread = threading.Thread(target=self._poll, args=(poll_interval,),
+                                        name=f"xj-batch-{self.batch_id}", daemon=True)
+        self._thread.start()
+
+    def _poll(self, poll_interval):
+        try:
+            while True:
+                response = transport.get(f"{self.base_url}/batches/{self.batch_id}",
+                                         headers=self.headers, timeout=30)
+                with response:
+                    response.raise_for_status()
+                    self.batch = json_codec.response_json(response)
+                status = self.batch.get("status")
+                logger.debug("批次 %s 状态: %s %s", self.batch_id, status,
+                             self.batch.get("request_counts", {}))
+                if status in FINAL_STATUSES:
+                    break
+                time.sleep(poll_interval)
+            self.results = self._download_results()
+            logger.info("批次 %s 结束，状态: %s", self.batch_id, self.batch.get("status"))
+        except Exception as e:
+            self.error = f"轮询批次失败: {str(e)}"
+            logger.error("%s", self.error)
+        finally:
+            self.done.set()
+
+    def _download_file(self, file_id):
+        response = transport.get(f"{self.base_url}/files/{file_id}/content",
+                                 headers=self.headers, timeout=300)
+        with response:
+            response.raise_for_status()
+            return response.text
+
+    def _download_results(self):
+        """下载输出文件与错误文件，按 custom_id 中的序号排序"""
+        lines = []
+        for key in ("output_file_id", "error_file_id"):
+            file_id = self.batch.get(key)
+            if file_id:
+                lines.extend(line for line in self._download_file(file_id).splitlines() if line.strip())
+
+        by_index = {}
+        for line in lines:
+            item = json_codec.loads(line)
+            custom_id = str(item.get("custom_id", ""))
+            index = int(custom_id.rsplit("-", 1)[-1]) if custom_id.rsplit("-", 1)[-1].isdigit() else len(by_index)
+            response = item.get("response") or {}
+            body = response.get("body") or {}
+            if item.get("error") or response.get("status_code", 200) != 200:
+                error = item.get("error") or body.get("error") or body
+                by_index[index] = {"status": "error", "error": f"请求失败: {json_codec.dumps_elided(error)}"}
+            else:
+                by_index[index] = {"status": "ok", "content": extract_content(body),
+                                   "usage": body.get("usage", {}), "response": body}
+
+        total = self.total or self.batch.get("request_counts", {}).get("total") or len(by_index)
+        total = max(total, max(by_index) + 1 if by_index else 0)
+        return [by_index.get(i, {"status": "error", "error": "批次结果中缺少该项"}) for i in range(total)]
+
+
+class _BatchRegistry:
+    """
+    进程内的批次表：提交节点登记，收集节点查找；重启后收集节点会按 batch_id 重新开始轮询
+
+    按 (base_url, api_key, batch_id) 区分，不同服务商或账号返回相同的 batch_id 时互不覆盖
+    """
+
+    def __init__(self):
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def track(self, base_url, api_key, batch_id, poll_interval, total=None):
+        key = (base_url, api_key, batch_id)
+        with self._lock:
+            job = self._jobs.get(key)
+            # 轮询出错的批次允许重新跟踪
+            if job is None or (job.done.is_set() and job.error):
+                job = BatchJob(base_url, api_key, batch_id, total)
+                self._jobs[key] = job
+                job.start(poll_interval)
+            self._prune()
+            return job
+
+    def _prune(self):
+        finished = [key for key, job in self._jobs.items() if job.done.is_set()]
+        for key in finished[:max(0, len(finished) - MAX_FINISHED_BATCHES)]:
+            del self._jobs[key]
+
+
+BATCH_REGISTRY = _BatchRegistry()
+
+
+class LLMBatchSubmitNode:
+    """
+    Batch API 提交节点
+    每个提示词生成一行 {"custom_id", "method", "url", "body"}，body 与 LLMAPINode/LLMVisionNode 的请求体一致；
+    连接图像时使用视觉消息格式（图像批大小与提示词数量相同时逐项对应，否则所有请求共用第一张）
+    """
+
+    def __init__(self):
+        self.vision = LLMVisionNode()
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        """
+        定义节点的输入类型
+        """
+        return {
+            "required": {
+                "base_url": ("STRING", {
+                    "default": "https://api.openai.com/v1",
+                    "multiline": False,
+                    "tooltip": "API基础URL，需支持 /files 与 /batches 接口"
+                }),
+                "api_key": ("STRING", {
+                    "default": "",
+                    "multiline": False,
+                    "tooltip": "API密钥"
+                }),
+                "model": ("STRING", {
+                    "default": "gpt-4o-mini",
+                    "multiline": False,
+                    "tooltip": "模型名称"
+                }),
+                "prompts": ("STRING", {
+                    "default": "",
+                    "multiline": True,
+                    "tooltip": "批量提示词，格式由 batch_mode 决定"
+                }),
+            },
+            "optional": {
+                "batch_mode": (BATCH_MODES[1:], {
+                    "default": "lines",
+                    "tooltip": "lines 每行一个提示词，jsonl 每行一个JSON，json_list 为JSON数组"
+                }),
+                "image": ("IMAGE", {
+                    "tooltip": "输入图像（可选），使用视觉请求格式"
+                }),
+                "system_prompt": ("STRING", {
+                    "default": "你是一个有用的AI助手。",
+                    "multiline": True,
+                    "tooltip": "系统提示词"
+                }),
+                "temperature": ("FLOAT", {
+                    "default": 0.7,
+                    "min": 0.0,
+                    "max": 2.0,
+                    "step": 0.1,
+                    "tooltip": "控制输出的随机性"
+                }),
+                "max_tokens": ("INT", {
+                    "default": 1000,
+                    "min": 1,
+                    "max": 8192,
+                    "step": 1,
+                    "tooltip": "最大输出token数量"
+                }),
+                "top_p": ("FLOAT", {
+                    "default": 1.0,
+                    "min": 0.0,
+                    "max": 1.0,
+                    "step": 0.1,
+                    "tooltip": "核采样参数"
+                }),
+                "detail_level": (["low", "high", "auto"], {
+                    "default": "auto",
+                    "tooltip": "图像分析详细程度（连接图像时有效）"
+                }),
+                "completion_window": ("STRING", {
+                    "default": "24h",
+                    "multiline": False,
+                    "tooltip": "批次完成时限"
+                }),
+                "poll_interval": ("INT", {
+                    "default": 30,
+                    "min": 1,
+                    "max": 3600,
+                    "step": 1,
+                    "tooltip": "后台轮询间隔（秒）"
+                }),
+            }
+        }
+
+    @classmethod
+    def IS_CHANGED(cls, **kwargs):
+        """
+        输入指纹：提示词与参数不变时复用已提交的批次，不重复提交
+        """
+        return fingerprint_inputs(kwargs)
+
+    RETURN_TYPES = ("STRING", "STRING")
+    RETURN_NAMES = ("batch_id", "status_info")
+    FUNCTION = "submit_batch"
+    CATEGORY = "XJ Nodes/LLM"
+
+    def build_batch_lines(self, model, prompts, batch_mode, image=None, system_prompt="",
+                          temperature=0.7, max_tokens=1000, top_p=1.0, detail_level="auto"):
+        """
+        构建批次 JSONL 的每一行
+
+        Returns:
+            list[dict]: 批次请求
+        """
+        items = parse_prompt_batch(prompts, batch_mode)
+        if not items:
+            raise ValueError("没有可提交的提示词")
+        lines = []
+        for index, item in enumerate(items):
+            messages = item.get("messages")
+            if messages is None and image is not None:
+                item_image = image[index] if image.shape[0] == len(items) else image[0]
+                messages = self.vision.build_messages(
+                    item.get("prompt", ""), item_image,
+                    item.get("system_prompt", system_prompt), detail_level,
+                    model=item.get("model", model),
+                    # 批量任务的请求行无法携带 oss:// 所需的请求头，只使用对象存储
+                    upload_backend="store")
+            body = build_chat_body(
+                item.get("model", model), item.get("prompt", ""),
+                item.get("system_prompt", system_prompt),
+                item.get("temperature", temperature), item.get("max_tokens", max_tokens),
+                item.get("top_p", top_p), False, messages=messages)
+            body.pop("stream")
+            lines.append({
+                "custom_id": f"request-{index}",
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": body,
+            })
+        return lines
+
+    def submit_batch(self, base_url, api_key, model, prompts, batch_mode="lines", image=None,
+                     system_prompt="你是一个有用的AI助手。", temperature=0.7, max_tokens=1000,
+                     top_p=1.0, detail_level="auto", completion_window="24h", poll_interval=30):
+        """
+        上传 JSONL 并创建批次，后台开始轮询
+
+        Returns:
+            Tuple[str, str]: (batch_id, 状态信息)；失败时 batch_id 为空
+        """
+        try:
+            if not base_url or not api_key or not model:
+                raise ValueError("base_url、api_key和model参数不能为空")
+            base_url = normalize_base_url(base_url)
+            headers = {"Authorization": f"Bearer {api_key}"}
+
+            lines = self.build_batch_lines(model, prompts, batch_mode, image, system_prompt,
+                                           temperature, max_tokens, top_p, detail_level)
+            payload = "".join(json_codec.dumps(materialize(line)) + "\n" for line in lines).encode("utf-8")
+
+            # 1. 上传输入文件
+            response = transport.post(
+                f"{base_url}/files",
+                headers=headers,
+                data={"purpose": "batch"},
+                files={"file": ("batch_input.jsonl", io.BytesIO(payload), "application/jsonl")},
+                timeout=300
+            )
+            with response:
+                if response.status_code != 200:
+                    raise Exception(f"上传文件失败，状态码: {response.status_code}\n响应内容: {response.text}")
+                input_file_id = json_codec.response_json(response)["id"]
+
+            # 2. 创建批次
+            response = transport.post(
+                f"{base_url}/batches",
+                headers=dict(headers, **{"Content-Type": "application/json"}),
+                json={
+                    "input_file_id": input_file_id,
+                    "endpoint": "/v1/chat/completions",
+                    "completion_window": completion_window,
+                },
+                timeout=60
+            )
+            with response:
+                if response.status_code != 200:
+                    raise Exception(f"创建批次失败，状态码: {response.status_code}\n响应内容: {response.text}")
+                batch = json_codec.response_json(response)
+
+            batch_id = batch["id"]
+            BATCH_REGISTRY.track(base_url, api_key, batch_id, poll_interval, total=len(lines))
+            info = f"已提交批次 {batch_id}：{len(lines)} 项，输入文件 {input_file_id}（{len(payload)} 字节）"
+            logger.info("%s", info)
+            return (batch_id, info)
+
+        except Exception as e:
+            error_msg = f"提交批次失败: {str(e)}"
+            logger.error("%s", error_msg)
+            return ("", error_msg)
+
+
+class LLMBatchCollectNode:
+    """
+    Batch API 结果收集节点
+    等待后台轮询完成后按输入顺序输出每项结果；未等待到完成时输出当前状态
+    """
+
+    def __init__(self):
+        pass
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        """
+        定义节点的输入类型
+        """
+        return {
+            "required": {
+                "base_url": ("STRING", {
+                    "default": "https://api.openai.com/v1",
+                    "multiline": False,
+                    "tooltip": "API基础URL（与提交节点一致）"
+                }),
+                "api_key": ("STRING", {
+                    "default": "",
+                    "multiline": False,
+                    "tooltip": "API密钥"
+                }),
+                "batch_id": ("STRING", {
+                    "default": "",
+                    "multiline": False,
+                    "tooltip": "提交节点输出的 batch_id"
+                }),
+            },
+            "optional": {
+                "wait": ("BOOLEAN", {
+                    "default": True,
+                    "tooltip": "是否阻塞等待批次完成；关闭时只返回当前状态"
+                }),
+                "timeout": ("INT", {
+                    "default": 3600,
+                    "min": 1,
+                    "max": 86400,
+                    "step": 1,
+                    "tooltip": "等待的最长时间（秒）"
+                }),
+                "poll_interval": ("INT", {
+                    "default": 30,
+                    "min": 1,
+                    "max": 3600,
+                    "step": 1,
+                    "tooltip": "未被本进程跟踪的批次（如重启后）开始轮询时使用的间隔（秒）"
+                }),
+            },
+            "hidden": {
+                "graph_prompt": "PROMPT",
+                "unique_id": "UNIQUE_ID",
+            }
+        }
+
+    @classmethod
+    def IS_CHANGED(cls, **kwargs):
+        """
+        批次状态在服务端变化，每次都重新检查（已完成的批次直接读取本地结果）
+        """
+        return float("nan")
+
+    RETURN_TYPES = ("STRING", "STRING", "STRING", "STRING", "STRING")
+    RETURN_NAMES = ("response", "full_response", "usage_info", "status_info", "responses")
+    OUTPUT_IS_LIST = (False, False, False, False, True)
+    FUNCTION = "collect_batch"
+    CATEGORY = "XJ Nodes/LLM"
+
+    def collect_batch(self, base_url, api_key, batch_id, wait=True, timeout=3600, poll_interval=30,
+                      graph_prompt: Optional[dict] = None, unique_id: Optional[str] = None):
+        """
+        收集批次结果
+
+        Returns:
+            Tuple: (JSON数组形式的响应, 每项详情JSON, 汇总用量, 状态信息, 按顺序的响应列表)
+        """
+        if not base_url or not api_key or not batch_id:
+            error_msg = "base_url、api_key和batch_id参数不能为空"
+            logger.error("%s", error_msg)
+            return ("", "", "", error_msg, [])
+
+        job = BATCH_REGISTRY.track(normalize_base_url(base_url), api_key, batch_id, poll_interval)
+        if wait:
+            job.done.wait(timeout)
+
+        batch = job.batch
+        counts = batch.get("request_counts", {})
+        status_info = f"批次 {batch_id} 状态: {batch.get('status')}"
+        if counts:
+            status_info += f"（完成 {counts.get('completed', 0)}/{counts.get('total', 0)}，失败 {counts.get('failed', 0)}）"
+
+        if job.error:
+            return ("", "", "", f"{status_info}；{job.error}", [])
+        if not job.done.is_set():
+            logger.info("%s，尚未完成", status_info)
+            return ("", "", "", status_info, [])
+
+        results = job.results or []
+        response_json, full_response, usage_info, responses = summarize_batch_results(
+            results, output_is_linked(graph_prompt, unique_id, 1))
+
+        logger.info("%s，%d 项", status_info, len(results))
+        return (response_json, full_response, usage_info, status_info, responses)
+
+
+# 节点映射
+NODE_CLASS_MAPPINGS = {
+    "LLMBatchSubmitNode": LLMBatchSubmitNode,
+    "LLMBatchCollectNode": LLMBatchCollectNode
+}
+
+NODE_DISPLAY_NAME_MAPPINGS = {
+    "LLMBatchSubmitNode": "LLM Batch 提交",
+    "LLMBatchCollectNode": "LLM Batch 结果收集"
+}
@@ -1,7 +1,11 @@
-import json
 import os
 from typing import Dict, Any, Tuple
 
+from ..utils import json_codec
+from ..utils.logger import get_logger
+
+logger = get_logger("llm_config")
+
 class LLMConfigNode:
     """
     LLM配置节点
@@ -20,7 +24,7 @@ class LLMConfigNode:
         try:
             if os.path.exists(self.config_file):
                 with open(self.config_file, 'r', encoding='utf-8') as f:
-                    self.configs = json.load(f)
+                    self.configs = json_codec.loads(f.read())
             else:
                 # 默认配置
                 self.configs = {
@@ -52,7 +56,7 @@ class LLMConfigNode:
                 }
                 self.save_configs()
         except Exception as e:
-            print(f"[LLM Config] 加载配置失败: {str(e)}")
+            logger.error("加载配置失败: %s", e)
             self.configs = {}
     
     def save_configs(self):
@@ -61,9 +65,9 @@ class LLMConfigNode:
         """
         try:
             with open(self.config_file, 'w', encoding='utf-8') as f:
-                json.dump(self.configs, f, ensure_ascii=False, indent=2)
+                f.write(json_codec.dumps(self.configs, indent=2))
         except Exception as e:
-            print(f"[LLM Config] 保存配置失败: {str(e)}")
+            logger.error("保存配置失败: %s", e)
     
     @classmethod
     def INPUT_TYPES(cls):
@@ -166,20 +170,18 @@ class LLMConfigNode:
                     "description": f"用户自定义配置 - {new_preset_name}"
                 }
                 self.save_configs()
-                print(f"[LLM Config] 已保存新预设: {new_preset_name}")
+                logger.info("已保存新预设: %s", new_preset_name)
             
             # 构建配置信息
             config_info = f"配置: {config_preset}\n描述: {description}\nURL: {base_url}\n模型: {model}"
             
-            print(f"[LLM Config] 使用配置: {config_preset}")
-            print(f"[LLM Config] Base URL: {base_url}")
-            print(f"[LLM Config] Model: {model}")
+            logger.debug("使用配置: %s, Base URL: %s, Model: %s", config_preset, base_url, model)
             
             return (base_url, api_key, model, config_info)
             
         except Exception as e:
             error_msg = f"获取配置时发生错误: {str(e)}"
-            print(f"[LLM Config] 错误: {error_msg}")
+            logger.error("%s", error_msg)
             return ("", "", "", error_msg)
 
 class LLMConfigManagerNode:
@@ -239,11 +241,11 @@ class LLMConfigManagerNode:
         try:
             if os.path.exists(self.config_file):
                 with open(self.config_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                    return json_codec.loads(f.read())
             else:
                 return {}
         except Exception as e:
-            print(f"[LLM Config Manager] 加载配置失败: {str(e)}")
+            logger.error("加载配置失败: %s", e)
             return {}
     
     def save_configs(self, configs):
@@ -252,10 +254,10 @@ class LLMConfigManagerNode:
         """
         try:
             with open(self.config_file, 'w', encoding='utf-8') as f:
-                json.dump(configs, f, ensure_ascii=False, indent=2)
+                f.write(json_codec.dumps(configs, indent=2))
             return True
         except Exception as e:
-            print(f"[LLM Config Manager] 保存配置失败: {str(e)}")
+            logger.error("保存配置失败: %s", e)
             return False
     
     def manage_config(
@@ -336,7 +338,7 @@ class LLMConfigManagerNode:
             
         except Exception as e:
             error_msg = f"管理配置时发生错误: {str(e)}"
-            print(f"[LLM Config Manager] 错误: {error_msg}")
+            logger.error("%s", error_msg)
             return (error_msg,)
 
 # 节点映射
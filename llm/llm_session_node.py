@@ -0,0 +1,250 @@
+"""
+LLM 多轮会话节点
+
+按 session_id 保存对话历史，每次执行追加一问一答，适合反复修改、逐步细化的工作流。
+历史超出 token 预算时把最早的轮次压缩为摘要（或直接丢弃），见 utils/session_store.py。
+"""
+
+from typing import Tuple
+
+from ..utils import json_codec, session_store
+from ..utils.logger import get_logger
+from ..utils.tokens import estimate_messages_tokens
+from .llm_api_node import LLMAPINode, build_chat_body, extract_content, format_usage, normalize_base_url
+
+logger = get_logger("llm_session")
+
+COMPACTION_MODES = ["summarize", "truncate"]
+
+SUMMARY_PROMPT = (
+    "你负责压缩对话历史。请把给出的已有摘要和新的对话内容合并为一份简洁的摘要，"
+    "保留事实、用户的要求与偏好、已做出的决定和尚未完成的事项，不要添加对话中没有的内容。"
+    "直接输出摘要正文。"
+)
+
+
+def summary_max_tokens(context_budget):
+    """摘要请求的 max_tokens（压缩时按此为新摘要预留预算）"""
+    return max(256, min(2048, context_budget // 8))
+
+
+class LLMSessionNode(LLMAPINode):
+    """
+    LLM 多轮会话节点
+    同一 session_id 的多次执行共享对话历史，支持 OpenAI 兼容接口
+    """
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        """
+        定义节点的输入类型
+        """
+        return {
+            "required": {
+                "base_url": ("STRING", {
+                    "default": "https://api.openai.com/v1",
+                    "multiline": False,
+                    "tooltip": "API基础URL"
+                }),
+                "api_key": ("STRING", {
+                    "default": "",
+                    "multiline": False,
+                    "tooltip": "API密钥"
+                }),
+                "model": ("STRING", {
+                    "default": "gpt-3.5-turbo",
+                    "multiline": False,
+                    "tooltip": "模型名称"
+                }),
+                "session_id": ("STRING", {
+                    "default": "default",
+                    "multiline": False,
+                    "tooltip": "会话ID，相同ID的执行共享对话历史"
+                }),
+                "prompt": ("STRING", {
+                    "default": "你好，请介绍一下你自己。",
+                    "multiline": True,
+                    "tooltip": "本轮的用户消息"
+                }),
+            },
+            "optional": {
+                "system_prompt": ("STRING", {
+                    "default": "你是一个有用的AI助手。",
+                    "multiline": True,
+                    "tooltip": "系统提示词；修改后从下一轮开始生效"
+                }),
+                "temperature": ("FLOAT", {
+                    "default": 0.7,
+                    "min": 0.0,
+                    "max": 2.0,
+                    "step": 0.1,
+                    "tooltip": "控制输出的随机性"
+                }),
+                "max_tokens": ("INT", {
+                    "default": 1000,
+                    "min": 1,
+                    "max": 8192,
+                    "step": 1,
+                    "tooltip": "最大输出token数量"
+                }),
+                "top_p": ("FLOAT", {
+                    "default": 1.0,
+                    "min": 0.0,
+                    "max": 1.0,
+                    "step": 0.1,
+                    "tooltip": "核采样参数"
+                }),
+                "stream": (["false", "true"], {
+                    "default": "false",
+                    "tooltip": "是否启用流式输出"
+                }),
+                "context_budget": ("INT", {
+                    "default": 8000,
+                    "min": 256,
+                    "max": 1000000,
+                    "step": 256,
+                    "tooltip": "发送的消息（系统提示词+摘要+历史+本轮）的token预算，超出时压缩最早的轮次"
+                }),
+                "compaction": (COMPACTION_MODES, {
+                    "default": "summarize",
+                    "tooltip": "summarize 由模型把压缩的轮次合并为摘要；truncate 直接丢弃"
+                }),
+                "reset_session": ("BOOLEAN", {
+                    "default": False,
+                    "tooltip": "本次执行前清空该会话的历史"
+                }),
+            }
+        }
+
+    @classmethod
+    def IS_CHANGED(cls, **kwargs):
+        """
+        会话每次执行都会追加历史，输入相同也需要重新执行
+        """
+        return float("nan")
+
+    RETURN_TYPES = ("STRING", "STRING", "STRING")
+    RETURN_NAMES = ("response", "history", "usage_info")
+    FUNCTION = "chat"
+    CATEGORY = "XJ Nodes/LLM"
+
+    def chat(
+        self,
+        base_url: str,
+        api_key: str,
+        model: str,
+        session_id: str,
+        prompt: str,
+        system_prompt: str = "你是一个有用的AI助手。",
+        temperature: float = 0.7,
+        max_tokens: int = 1000,
+        top_p: float = 1.0,
+        stream: str = "false",
+        context_budget: int = 8000,
+        compaction: str = "summarize",
+        reset_session: bool = False
+    ) -> Tuple[str, str, str]:
+        """
+        在会话中发送一轮消息
+
+        Args:
+            session_id: 会话ID
+            prompt: 本轮用户消息
+            context_budget: 请求消息的token预算
+            compaction: 超出预算时的压缩方式（summarize / truncate）
+            reset_session: 是否先清空会话
+            其余参数同 LLMAPINode
+
+        Returns:
+            Tuple[str, str, str]: (响应内容, 会话消息JSON, 使用信息)
+        """
+        try:
+            if not base_url or not api_key or not model:
+                raise ValueError("base_url、api_key和model参数不能为空")
+            if not session_id or not session_id.strip():
+                raise ValueError("session_id不能为空")
+            session_id = session_id.strip()
+
+            # 同一会话的并发执行依次进行，避免基于同一份历史各自追加后互相覆盖
+            with session_store.session_lock(session_id):
+                if reset_session:
+                    session_store.reset(session_id)
+                session = session_store.load(session_id)
+                session["system_prompt"] = (system_prompt or "").strip()
+
+                url = f"{normalize_base_url(base_url)}/chat/completions"
+                summarize = compaction == "summarize"
+                compacted = session_store.plan_compaction(
+                    session, prompt, context_budget,
+                    summary_tokens=summary_max_tokens(context_budget) if summarize else 0)
+                if compacted:
+                    summary = None
+                    if summarize:
+                        summary = self.summarize(url, api_key, model, session, compacted, context_budget)
+                    session_store.apply_compaction(session, compacted, summary)
+                    logger.info("会话 %s 超出预算 %d tokens，已压缩最早的 %d 条消息", session_id,
+                                context_budget, compacted)
+                    # 摘要比估算的长时仍可能超出预算，再丢弃最早的轮次（保留新摘要）
+                    extra = session_store.plan_compaction(session, prompt, context_budget)
+                    if extra:
+                        session_store.apply_compaction(session, extra, None)
+                        compacted += extra
+                        logger.warning("会话 %s 的摘要超出预算，另外丢弃最早的 %d 条消息", session_id, extra)
+
+                messages = session_store.build_messages(session, prompt)
+                data = build_chat_body(model, prompt, temperature=temperature, max_tokens=max_tokens,
+                                       top_p=top_p, stream=stream.lower() == "true", messages=messages)
+                response_data = self.send_chat_request(url, api_key, data)
+                content = extract_content(response_data)
+
+                session_store.append_turn(session, prompt, content)
+                session_store.save(session)
+
+            usage = response_data.get("usage") or {}
+            cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+            usage_info = format_usage(usage) if usage else ""
+            usage_info += (f"；会话: {len(session['turns']) // 2} 轮，已压缩 {session['compacted_turns']} 条消息，"
+                           f"上下文约 {estimate_messages_tokens(messages)}/{context_budget} tokens")
+            if cached:
+                usage_info += f"，缓存命中 {cached} tokens"
+            if compacted:
+                usage_info += f"；本轮压缩 {compacted} 条（{compaction}）"
+
+            history = session_store.prefix_messages(session) + session["turns"]
+            logger.info("会话 %s 第 %d 轮完成，模型: %s", session_id, len(session["turns"]) // 2, model)
+            return (content, json_codec.dumps(history, indent=2), usage_info)
+
+        except Exception as e:
+            error_msg = self.describe_error(e)
+            logger.error("%s", error_msg)
+            return (error_msg, "", "")
+
+    def summarize(self, url, api_key, model, session, count, context_budget):
+        """
+        把最早的 count 条消息与已有摘要合并为新摘要
+
+        Returns:
+            str | None: 新摘要；调用失败时返回 None（只丢弃这些轮次，保留原摘要）
+        """
+        parts = []
+        if session["summary"]:
+            parts.append(f"已有摘要：\n{session['summary']}")
+        parts.append(f"新的对话内容：\n{session_store.transcript(session['turns'][:count])}")
+        data = build_chat_body(model, "\n\n".join(parts), SUMMARY_PROMPT, temperature=0.3,
+                               max_tokens=summary_max_tokens(context_budget))
+        try:
+            summary = extract_content(self.send_chat_request(url, api_key, data))
+        except Exception as e:
+            logger.warning("会话 %s 摘要失败，直接丢弃最早的 %d 条消息: %s", session["id"], count, e)
+            return None
+        return summary
+
+
+# 节点映射
+NODE_CLASS_MAPPINGS = {
+    "LLMSessionNode": LLMSessionNode
+}
+
+NODE_DISPLAY_NAME_MAPPINGS = {
+    "LLMSessionNode": "LLM 多轮会话"
+}
@@ -1,10 +1,22 @@
-import requests
-import json
 import base64
 import io
-from PIL import Image
+import logging
 from typing import Dict, Any, Optional, Tuple, Union
 
+from ..utils.lazy_import import lazy_import
+from ..utils import json_codec, transport, upload_cache
+from ..utils.logger import get_logger
+from ..utils.fingerprint import fingerprint_inputs
+from ..utils.streaming_body import data_uri
+from ..utils.image_codec import (IMAGE_MODES, downscale_for_vision, encode_frames,
+                                 estimate_frames_tokens, split_frames)
+from ..utils.comfy_compat import output_is_linked
+
+requests = lazy_import("requests")
+Image = lazy_import("PIL.Image")
+
+logger = get_logger("llm_vision")
+
 class LLMVisionNode:
     """
     LLM视觉API调用节点
@@ -70,23 +82,49 @@ class LLMVisionNode:
                     "default": "auto",
                     "tooltip": "图像分析详细程度"
                 }),
+                "image_mode": (IMAGE_MODES, {
+                    "default": "first",
+                    "tooltip": "批量图像的上传方式：first 只发送第一张；all 发送整个批次；sample 在批内等间隔抽样。多张图像作为同一条消息的多个 image_url 发送"
+                }),
+                "max_images": ("INT", {
+                    "default": 4,
+                    "min": 1,
+                    "max": 32,
+                    "step": 1,
+                    "tooltip": "all / sample 模式下最多发送的图像数量"
+                }),
+            },
+            "hidden": {
+                "graph_prompt": "PROMPT",
+                "unique_id": "UNIQUE_ID",
             }
         }
     
+    @classmethod
+    def IS_CHANGED(cls, **kwargs):
+        """
+        输入指纹：提示词与参数不变时复用 ComfyUI 缓存，不重复调用 API
+        （连接的输入图像在这里为 None，是否变化由 ComfyUI 按上游节点判断）
+        """
+        return fingerprint_inputs(kwargs)
+    
     RETURN_TYPES = ("STRING", "STRING", "STRING")
     RETURN_NAMES = ("response", "full_response", "usage_info")
     FUNCTION = "call_llm_vision_api"
     CATEGORY = "XJ Nodes/LLM"
     
-    def image_to_base64(self, image_tensor) -> str:
+    def image_to_bytes(self, image_tensor, model: Optional[str] = None,
+                       detail_level: str = "auto") -> bytes:
         """
-        将图像张量转换为base64编码字符串
+        将图像张量编码为JPEG字节
         
         Args:
             image_tensor: ComfyUI图像张量
+            model: 模型名称；指定时先缩小到该模型在 detail_level 下实际使用的尺寸
+            detail_level: 图像分析详细程度
             
         Returns:
-            str: base64编码的图像字符串
+            bytes: JPEG图像数据
         """
         try:
             # 转换张量为PIL图像
@@ -104,18 +142,87 @@ class LLMVisionNode:
             
             # 转换为PIL图像
             pil_image = Image.fromarray(image_array)
+            if model is not None:
+                pil_image = downscale_for_vision(pil_image, model, detail_level)
             
-            # 转换为base64
             buffer = io.BytesIO()
             pil_image.save(buffer, format='JPEG', quality=95)
-            image_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
-            
-            return image_base64
+            return buffer.getvalue()
             
         except Exception as e:
-            print(f"[LLM Vision] 图像转换错误: {str(e)}")
+            logger.error("图像转换错误: %s", e)
             raise Exception(f"图像转换失败: {str(e)}")
     
+    def image_to_base64(self, image_tensor, model: Optional[str] = None,
+                        detail_level: str = "auto") -> str:
+        """
+        将图像张量转换为base64编码字符串（参数同 image_to_bytes）
+        """
+        return base64.b64encode(self.image_to_bytes(image_tensor, model, detail_level)).decode('utf-8')
+    
+    def build_messages(self, prompt: str, image=None, system_prompt: str = "",
+                       detail_level: str = "auto", image_mode: str = "first",
+                       max_images: int = 4, model: Optional[str] = None,
+                       upload_backend: Optional[str] = None, api_key: Optional[str] = None) -> list:
+        """
+        构建视觉请求的消息列表（文本 + 可选图像）
+        
+        Args:
+            prompt: 用户提示词
+            image: 输入图像（可选）
+            system_prompt: 系统提示词
+            detail_level: 图像分析详细程度
+            image_mode: 批量图像的上传方式（first / all / sample）
+            max_images: 最多发送的图像数量
+            model: 模型名称，用于按模型缩放图像与估算图像 token
+            upload_backend: 上传缓存后端（dashscope / store），开启上传缓存时图像以地址引用，见 utils.upload_cache
+            api_key: API密钥，dashscope 后端上传时使用
+            
+        Returns:
+            list: OpenAI 兼容的 messages；图像 URL 为已上传的地址或 Base64Blob（由 transport 流式发送），
+                需要完整 JSON 文本时先用 streaming_body.materialize 转换
+        """
+        messages = []
+        if system_prompt and system_prompt.strip():
+            messages.append({
+                "role": "system",
+                "content": system_prompt.strip()
+            })
+        
+        # 构建用户消息内容
+        user_content = []
+        
+        # 添加文本内容
+        user_content.append({
+            "type": "text",
+            "text": prompt
+        })
+        
+        # 如果有图像，添加图像内容（多张图像并行编码，按批内顺序排列）
+        if image is not None:
+            frames = split_frames(image, image_mode, max_images)
+            # 图像以字节形式放入消息，发送时由 transport 按块 base64 编码（utils.streaming_body）
+            for image_bytes in encode_frames(frames, self.image_to_bytes, model, detail_level):
+                user_content.append({
+                    "type": "image_url",
+                    "image_url": {
+                        "url": (upload_cache.image_value(image_bytes, "image/jpeg", upload_backend, api_key, model)
+                                if upload_backend else data_uri(image_bytes, "image/jpeg")),
+                        "detail": detail_level
+                    }
+                })
+            # 统计需要遍历全部图像，只在输出 INFO 日志时计算
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("已添加 %d 张图像，base64总长度: %d，预估图像tokens: %s", len(frames),
+                            sum(len(part["image_url"]["url"]) for part in user_content[1:]),
+                            estimate_frames_tokens(frames, model, detail_level) if model else "N/A")
+        
+        messages.append({
+            "role": "user",
+            "content": user_content
+        })
+        return messages
+    
     def call_llm_vision_api(
         self,
         base_url: str,
@@ -126,7 +233,11 @@ class LLMVisionNode:
         system_prompt: str = "你是一个有用的AI视觉助手，能够理解和分析图像内容。",
         temperature: float = 0.7,
         max_tokens: int = 1000,
-        detail_level: str = "auto"
+        detail_level: str = "auto",
+        image_mode: str = "first",
+        max_images: int = 4,
+        graph_prompt: Optional[dict] = None,
+        unique_id: Optional[str] = None
     ) -> Tuple[str, str, str]:
         """
         调用LLM视觉API获取响应
@@ -141,6 +252,10 @@ class LLMVisionNode:
             temperature: 温度参数
             max_tokens: 最大token数
             detail_level: 图像分析详细程度
+            image_mode: 批量图像的上传方式（first / all / sample）
+            max_images: 最多发送的图像数量
+            graph_prompt: ComfyUI工作流（隐藏输入），用于判断full_response是否被连接
+            unique_id: 当前节点ID（隐藏输入）
             
         Returns:
             Tuple[str, str, str]: (响应内容, 完整响应JSON, 使用信息)
@@ -167,42 +282,16 @@ class LLMVisionNode:
             }
             
             # 构建消息列表
-            messages = []
-            if system_prompt and system_prompt.strip():
-                messages.append({
-                    "role": "system",
-                    "content": system_prompt.strip()
-                })
-            
-            # 构建用户消息内容
-            user_content = []
-            
-            # 添加文本内容
-            user_content.append({
-                "type": "text",
-                "text": prompt
-            })
-            
-            # 如果有图像，添加图像内容
-            if image is not None:
-                try:
-                    image_base64 = self.image_to_base64(image)
-                    user_content.append({
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/jpeg;base64,{image_base64}",
-                            "detail": detail_level
-                        }
-                    })
-                    print(f"[LLM Vision] 成功添加图像，base64长度: {len(image_base64)}")
-                except Exception as e:
-                    print(f"[LLM Vision] 图像处理失败: {str(e)}")
-                    return (f"图像处理失败: {str(e)}", "", "")
-            
-            messages.append({
-                "role": "user",
-                "content": user_content
-            })
+            try:
+                messages = self.build_messages(prompt, image, system_prompt, detail_level,
+                                               image_mode, max_images, model,
+                                               upload_backend=upload_cache.backend_for(base_url),
+                                               api_key=api_key)
+                upload_cache.add_oss_header(headers, *(part["image_url"]["url"] for part in messages[-1]["content"]
+                                                       if part.get("type") == "image_url"))
+            except Exception as e:
+                logger.error("图像处理失败: %s", e)
+                return (f"图像处理失败: {str(e)}", "", "")
             
             # 构建请求数据
             data = {
@@ -212,34 +301,32 @@ class LLMVisionNode:
                 "max_tokens": max_tokens
             }
             
-            print(f"[LLM Vision] 发送请求到: {url}")
-            print(f"[LLM Vision] 使用模型: {model}")
-            print(f"[LLM Vision] 包含图像: {'是' if image is not None else '否'}")
-            print(f"[LLM Vision] 请求参数: temperature={temperature}, max_tokens={max_tokens}")
+            logger.debug("发送请求到: %s, 模型: %s, 包含图像: %s, temperature=%s, max_tokens=%s",
+                         url, model, image is not None, temperature, max_tokens)
             
             # 发送请求
-            response = requests.post(
+            response = transport.post(
                 url,
                 headers=headers,
                 json=data,
                 timeout=120  # 视觉模型通常需要更长时间
             )
             
-            print(f"[LLM Vision] 响应状态码: {response.status_code}")
+            logger.debug("响应状态码: %s", response.status_code)
             
             # 检查响应状态
             if response.status_code != 200:
                 error_msg = f"API请求失败，状态码: {response.status_code}"
                 try:
-                    error_detail = response.json()
-                    error_msg += f"\n错误详情: {json.dumps(error_detail, ensure_ascii=False, indent=2)}"
+                    error_detail = json_codec.response_json(response)
+                    error_msg += f"\n错误详情: {json_codec.dumps_elided(error_detail, indent=2)}"
                 except:
                     error_msg += f"\n响应内容: {response.text}"
                 raise Exception(error_msg)
             
             # 解析响应
-            response_data = response.json()
-            print(f"[LLM Vision] 响应数据结构: {list(response_data.keys())}")
+            response_data = json_codec.response_json(response)
+            logger.debug("响应数据结构: %s", list(response_data.keys()))
             
             # 提取响应内容
             if "choices" in response_data and len(response_data["choices"]) > 0:
@@ -259,26 +346,28 @@ class LLMVisionNode:
                 usage = response_data["usage"]
                 usage_info = f"输入tokens: {usage.get('prompt_tokens', 'N/A')}, 输出tokens: {usage.get('completion_tokens', 'N/A')}, 总计: {usage.get('total_tokens', 'N/A')}"
             
-            # 格式化完整响应
-            full_response = json.dumps(response_data, ensure_ascii=False, indent=2)
+            # 格式化完整响应（仅在输出被连接时序列化）
+            full_response = ""
+            if output_is_linked(graph_prompt, unique_id, 1):
+                full_response = json_codec.dumps_elided(response_data, indent=2)
             
-            print(f"[LLM Vision] 成功获取响应，内容长度: {len(content)}")
+            logger.info("成功获取响应，模型: %s，内容长度: %d", model, len(content))
             
             return (content, full_response, usage_info)
             
         except requests.exceptions.Timeout:
             error_msg = "请求超时，视觉模型处理时间较长，请稍后重试"
-            print(f"[LLM Vision] 错误: {error_msg}")
+            logger.error("%s", error_msg)
             return (error_msg, "", "")
             
         except requests.exceptions.ConnectionError:
             error_msg = "连接错误，请检查base_url是否正确以及网络连接"
-            print(f"[LLM Vision] 错误: {error_msg}")
+            logger.error("%s", error_msg)
             return (error_msg, "", "")
             
         except Exception as e:
             error_msg = f"调用LLM视觉API时发生错误: {str(e)}"
-            print(f"[LLM Vision] 错误: {error_msg}")
+            logger.error("%s", error_msg)
             return (error_msg, "", "")
 
 # 节点映射
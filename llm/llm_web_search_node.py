@@ -1,11 +1,23 @@
-import requests
-import json
+import logging
 import base64
 import io
-from PIL import Image
-from typing import Dict, Any, Optional, Tuple
+from typing import Dict, Any, List, Optional, Tuple
 import urllib.parse
 
+from ..utils.lazy_import import lazy_import
+from ..utils import json_codec, transport, upload_cache
+from ..utils.logger import get_logger
+from ..utils.fingerprint import fingerprint_inputs
+from ..utils.image_codec import (IMAGE_MODES, downscale_for_vision, encode_frames,
+                                 estimate_frames_tokens, split_frames)
+from ..utils.comfy_compat import output_is_linked
+from ..utils.search_context import build_search_context, format_results
+
+requests = lazy_import("requests")
+Image = lazy_import("PIL.Image")
+
+logger = get_logger("llm_web_search")
+
 class LLMWebSearchNode:
     """
     LLM API调用节点（支持网络搜索）
@@ -76,6 +88,13 @@ class LLMWebSearchNode:
                     "max": 10,
                     "tooltip": "搜索结果数量"
                 }),
+                "search_token_budget": ("INT", {
+                    "default": 1500,
+                    "min": 0,
+                    "max": 32000,
+                    "step": 64,
+                    "tooltip": "搜索结果部分的token预算：结果去重并按与问题的相关度排序后截断到该预算；0 表示不限制"
+                }),
                 "temperature": ("FLOAT", {
                     "default": 0.7,
                     "min": 0.0,
@@ -101,23 +120,54 @@ class LLMWebSearchNode:
                     "default": "auto",
                     "tooltip": "图像分析详细程度（仅在有图像输入时有效）"
                 }),
+                "image_mode": (IMAGE_MODES, {
+                    "default": "first",
+                    "tooltip": "批量图像的上传方式：first 只发送第一张；all 发送整个批次；sample 在批内等间隔抽样。多张图像作为同一条消息的多个 image_url 发送"
+                }),
+                "max_images": ("INT", {
+                    "default": 4,
+                    "min": 1,
+                    "max": 32,
+                    "step": 1,
+                    "tooltip": "all / sample 模式下最多发送的图像数量"
+                }),
+            },
+            "hidden": {
+                "graph_prompt": "PROMPT",
+                "unique_id": "UNIQUE_ID",
             }
         }
     
+    @classmethod
+    def IS_CHANGED(cls, **kwargs):
+        """
+        输入指纹：提示词与参数不变时复用 ComfyUI 缓存，不重复调用 API
+        （连接的输入图像在这里为 None，是否变化由 ComfyUI 按上游节点判断）
+        """
+        return fingerprint_inputs(kwargs)
+    
     RETURN_TYPES = ("STRING", "STRING", "STRING", "STRING")
     RETURN_NAMES = ("response", "search_results", "full_response", "usage_info")
     FUNCTION = "call_llm_with_search"
     CATEGORY = "XJ Nodes/LLM"
     
-    def image_to_base64(self, image_tensor) -> str:
+    # 搜索引擎端点（基准测试可替换为本地模拟服务）
+    SERPAPI_URL = "https://serpapi.com/search"
+    GOOGLE_CUSTOM_SEARCH_URL = "https://www.googleapis.com/customsearch/v1"
+    DUCKDUCKGO_URL = "https://api.duckduckgo.com/"
+    
+    def image_to_bytes(self, image_tensor, model: Optional[str] = None,
+                       detail_level: str = "auto") -> bytes:
         """
-        将图像张量转换为base64编码字符串
+        将图像张量编码为JPEG字节
         
         Args:
             image_tensor: ComfyUI图像张量
+            model: 模型名称；指定时先缩小到该模型在 detail_level 下实际使用的尺寸
+            detail_level: 图像分析详细程度
             
         Returns:
-            str: base64编码的图像字符串
+            bytes: JPEG图像数据
         """
         try:
             # 转换张量为PIL图像
@@ -135,134 +185,132 @@ class LLMWebSearchNode:
             
             # 转换为PIL图像
             pil_image = Image.fromarray(image_array)
+            if model is not None:
+                pil_image = downscale_for_vision(pil_image, model, detail_level)
             
-            # 转换为base64
             buffer = io.BytesIO()
             pil_image.save(buffer, format='JPEG', quality=95)
-            image_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
-            
-            return image_base64
+            return buffer.getvalue()
             
         except Exception as e:
-            print(f"[LLM Web Search] 图像转换错误: {str(e)}")
+            logger.error("图像转换错误: %s", e)
             raise Exception(f"图像转换失败: {str(e)}")
     
-    def google_search_serpapi(self, query: str, api_key: str, num_results: int = 5) -> str:
+    def image_to_base64(self, image_tensor, model: Optional[str] = None,
+                        detail_level: str = "auto") -> str:
+        """
+        将图像张量转换为base64编码字符串（参数同 image_to_bytes）
+        """
+        return base64.b64encode(self.image_to_bytes(image_tensor, model, detail_level)).decode('utf-8')
+    
+    def google_search_serpapi(self, query: str, api_key: str, num_results: int = 5) -> List[Dict[str, str]]:
         """
         使用SerpAPI进行Google搜索
         需要注册SerpAPI账号：https://serpapi.com/
+        
+        Returns:
+            list[dict]: 搜索结果（title / snippet / link）
         """
-        try:
-            url = "https://serpapi.com/search"
-            params = {
-                "q": query,
-                "api_key": api_key,
-                "engine": "google",
-                "num": num_results
-            }
-            
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            
-            # 提取搜索结果
-            results = []
-            if "organic_results" in data:
-                for item in data["organic_results"][:num_results]:
-                    title = item.get("title", "")
-                    snippet = item.get("snippet", "")
-                    link = item.get("link", "")
-                    results.append(f"标题: {title}\n摘要: {snippet}\n链接: {link}\n")
-            
-            return "\n".join(results) if results else "未找到相关搜索结果。"
-        except Exception as e:
-            return f"搜索出错: {str(e)}"
+        url = self.SERPAPI_URL
+        params = {
+            "q": query,
+            "api_key": api_key,
+            "engine": "google",
+            "num": num_results
+        }
+        
+        response = transport.get(url, params=params, timeout=10)
+        response.raise_for_status()
+        data = json_codec.response_json(response)
+        
+        # 提取搜索结果
+        return [{"title": item.get("title", ""), "snippet": item.get("snippet", ""), "link": item.get("link", "")}
+                for item in data.get("organic_results", [])[:num_results]]
     
-    def google_search_custom(self, query: str, api_key: str, cx: str, num_results: int = 5) -> str:
+    def google_search_custom(self, query: str, api_key: str, cx: str, num_results: int = 5) -> List[Dict[str, str]]:
         """
         使用Google Custom Search API进行搜索
         需要：
         1. 在Google Cloud Console创建项目并启用Custom Search API
         2. 创建自定义搜索引擎：https://programmablesearchengine.google.com/
+        
+        Returns:
+            list[dict]: 搜索结果（title / snippet / link）
         """
-        try:
-            url = "https://www.googleapis.com/customsearch/v1"
-            params = {
-                "key": api_key,
-                "cx": cx,
-                "q": query,
-                "num": min(num_results, 10)  # Google API最多返回10个结果
-            }
-            
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            
-            # 提取搜索结果
-            results = []
-            if "items" in data:
-                for item in data["items"][:num_results]:
-                    title = item.get("title", "")
-                    snippet = item.get("snippet", "")
-                    link = item.get("link", "")
-                    results.append(f"标题: {title}\n摘要: {snippet}\n链接: {link}\n")
-            
-            return "\n".join(results) if results else "未找到相关搜索结果。"
-        except Exception as e:
-            return f"搜索出错: {str(e)}"
+        url = self.GOOGLE_CUSTOM_SEARCH_URL
+        params = {
+            "key": api_key,
+            "cx": cx,
+            "q": query,
+            "num": min(num_results, 10)  # Google API最多返回10个结果
+        }
+        
+        response = transport.get(url, params=params, timeout=10)
+        response.raise_for_status()
+        data = json_codec.response_json(response)
+        
+        # 提取搜索结果
+        return [{"title": item.get("title", ""), "snippet": item.get("snippet", ""), "link": item.get("link", "")}
+                for item in data.get("items", [])[:num_results]]
     
-    def duckduckgo_search(self, query: str, num_results: int = 5) -> str:
+    def duckduckgo_search(self, query: str, num_results: int = 5) -> List[Dict[str, str]]:
         """
         使用DuckDuckGo进行搜索（免费，无需API密钥）
         注意：DuckDuckGo可能在某些地区被限制
+        
+        Returns:
+            list[dict]: 搜索结果（title / snippet / link）
         """
-        try:
-            # 使用DuckDuckGo Instant Answer API
-            url = "https://api.duckduckgo.com/"
-            params = {
-                "q": query,
-                "format": "json",
-                "no_html": "1",
-                "skip_disambig": "1"
-            }
-            
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            
-            results = []
-            
-            # 提取Abstract（摘要）
-            if data.get("Abstract"):
-                results.append(f"摘要: {data.get('Abstract')}\n来源: {data.get('AbstractURL', '')}\n")
-            
-            # 提取RelatedTopics（相关主题）
-            if data.get("RelatedTopics"):
-                for topic in data["RelatedTopics"][:num_results-1]:
-                    if isinstance(topic, dict) and "Text" in topic:
-                        results.append(f"相关: {topic.get('Text', '')}\n")
-            
-            return "\n".join(results) if results else "未找到相关搜索结果。"
-        except Exception as e:
-            return f"搜索出错: {str(e)}"
+        # 使用DuckDuckGo Instant Answer API
+        url = self.DUCKDUCKGO_URL
+        params = {
+            "q": query,
+            "format": "json",
+            "no_html": "1",
+            "skip_disambig": "1"
+        }
+        
+        response = transport.get(url, params=params, timeout=10)
+        response.raise_for_status()
+        data = json_codec.response_json(response)
+        
+        results = []
+        
+        # 提取Abstract（摘要）
+        if data.get("Abstract"):
+            results.append({"title": data.get("Heading", ""), "snippet": data["Abstract"],
+                            "link": data.get("AbstractURL", "")})
+        
+        # 提取RelatedTopics（相关主题）
+        for topic in (data.get("RelatedTopics") or [])[:num_results - 1]:
+            if isinstance(topic, dict) and "Text" in topic:
+                results.append({"title": "", "snippet": topic.get("Text", ""), "link": topic.get("FirstURL", "")})
+        
+        return results
     
     def perform_search(self, query: str, search_api: str, search_api_key: str, 
-                      google_cx: str, num_results: int) -> str:
+                      google_cx: str, num_results: int) -> Tuple[List[Dict[str, str]], str]:
         """
         执行网络搜索
+        
+        Returns:
+            Tuple[list, str]: (搜索结果列表, 错误信息)；出错时结果为空列表
         """
-        if search_api == "serpapi":
-            if not search_api_key:
-                return "错误: 使用SerpAPI需要提供API密钥。请访问 https://serpapi.com/ 注册获取。"
-            return self.google_search_serpapi(query, search_api_key, num_results)
-        elif search_api == "google_custom":
-            if not search_api_key or not google_cx:
-                return "错误: 使用Google Custom Search需要提供API密钥和搜索引擎ID。"
-            return self.google_search_custom(query, search_api_key, google_cx, num_results)
-        elif search_api == "duckduckgo":
-            return self.duckduckgo_search(query, num_results)
-        else:
-            return "错误: 未知的搜索引擎API。"
+        try:
+            if search_api == "serpapi":
+                if not search_api_key:
+                    return [], "错误: 使用SerpAPI需要提供API密钥。请访问 https://serpapi.com/ 注册获取。"
+                return self.google_search_serpapi(query, search_api_key, num_results), ""
+            elif search_api == "google_custom":
+                if not search_api_key or not google_cx:
+                    return [], "错误: 使用Google Custom Search需要提供API密钥和搜索引擎ID。"
+                return self.google_search_custom(query, search_api_key, google_cx, num_results), ""
+            elif search_api == "duckduckgo":
+                return self.duckduckgo_search(query, num_results), ""
+            else:
+                return [], "错误: 未知的搜索引擎API。"
+        except Exception as e:
+            return [], f"搜索出错: {str(e)}"
     
     def call_llm_api(
         self,
@@ -275,10 +323,15 @@ class LLMWebSearchNode:
         max_tokens: int = 2000,
         top_p: float = 1.0,
         image=None,
-        detail_level: str = "auto"
+        detail_level: str = "auto",
+        image_mode: str = "first",
+        max_images: int = 4,
+        build_full_response: bool = True
     ) -> Tuple[str, str, str]:
         """
         调用LLM API获取响应
+        
+        build_full_response为False时跳过完整响应JSON的序列化，返回空字符串
         """
         try:
             # 验证输入参数
@@ -318,21 +371,29 @@ class LLMWebSearchNode:
                     "text": prompt
                 })
                 try:
-                    image_base64 = self.image_to_base64(image)
-                    user_content.append({
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/jpeg;base64,{image_base64}",
-                            "detail": detail_level
-                        }
-                    })
-                    print(f"[LLM Web Search] 成功添加图像，base64长度: {len(image_base64)}")
+                    # 多张图像并行编码，按批内顺序排列
+                    frames = split_frames(image, image_mode, max_images)
+                    backend = upload_cache.backend_for(base_url)
+                    for image_bytes in encode_frames(frames, self.image_to_bytes, model, detail_level):
+                        # 开启上传缓存时以地址引用已上传的图像，否则内联
+                        image_url = upload_cache.image_value(image_bytes, "image/jpeg", backend, api_key, model)
+                        upload_cache.add_oss_header(headers, image_url)
+                        user_content.append({
+                            "type": "image_url",
+                            "image_url": {
+                                "url": image_url,
+                                "detail": detail_level
+                            }
+                        })
+                    if logger.isEnabledFor(logging.INFO):
+                        logger.info("已添加 %d 张图像，预估图像tokens: %s", len(frames),
+                                    estimate_frames_tokens(frames, model, detail_level))
                     messages.append({
                         "role": "user",
                         "content": user_content
                     })
                 except Exception as e:
-                    print(f"[LLM Web Search] 图像处理失败: {str(e)}")
+                    logger.warning("图像处理失败，回退到纯文本: %s", e)
                     # 如果图像处理失败，回退到纯文本
                     messages.append({
                         "role": "user",
@@ -354,32 +415,31 @@ class LLMWebSearchNode:
                 "top_p": top_p
             }
             
-            print(f"[LLM Web Search] 发送请求到: {url}")
-            print(f"[LLM Web Search] 使用模型: {model}")
+            logger.debug("发送请求到: %s, 模型: %s", url, model)
             
             # 发送请求
-            response = requests.post(
+            response = transport.post(
                 url,
                 headers=headers,
                 json=data,
                 timeout=60
             )
             
-            print(f"[LLM Web Search] 响应状态码: {response.status_code}")
+            logger.debug("响应状态码: %s", response.status_code)
             
             # 检查响应状态
             if response.status_code != 200:
                 error_msg = f"API请求失败，状态码: {response.status_code}"
                 try:
-                    error_detail = response.json()
-                    error_msg += f"\n错误详情: {json.dumps(error_detail, ensure_ascii=False, indent=2)}"
+                    error_detail = json_codec.response_json(response)
+                    error_msg += f"\n错误详情: {json_codec.dumps_elided(error_detail, indent=2)}"
                 except:
                     error_msg += f"\n响应内容: {response.text}"
                 raise Exception(error_msg)
             
             # 解析响应
-            result = response.json()
-            full_response = json.dumps(result, ensure_ascii=False, indent=2)
+            result = json_codec.response_json(response)
+            full_response = json_codec.dumps_elided(result, indent=2) if build_full_response else ""
             
             # 提取响应内容
             if "choices" in result and len(result["choices"]) > 0:
@@ -420,24 +480,42 @@ class LLMWebSearchNode:
         max_tokens: int = 2000,
         top_p: float = 1.0,
         image=None,
-        detail_level: str = "auto"
+        detail_level: str = "auto",
+        image_mode: str = "first",
+        max_images: int = 4,
+        search_token_budget: int = 1500,
+        graph_prompt: Optional[dict] = None,
+        unique_id: Optional[str] = None
     ) -> Tuple[str, str, str, str]:
         """
         执行网络搜索并调用LLM API
+        
+        搜索结果去重、按相关度排序并截断到 search_token_budget 后再拼入提示词，
+        search_results 输出实际提供给模型的结果
         """
         search_results = ""
+        stats = None
         
         # 如果启用搜索，先执行搜索
         if enable_search:
-            print(f"[LLM Web Search] 执行网络搜索: {prompt}")
-            search_results = self.perform_search(
+            logger.debug("执行网络搜索: %s", prompt)
+            items, search_error = self.perform_search(
                 prompt, 
                 search_api, 
                 search_api_key, 
                 google_cx, 
                 num_results
             )
-            print(f"[LLM Web Search] 搜索结果:\n{search_results[:500]}...")
+            if search_error:
+                search_results = search_error
+            else:
+                items, stats = build_search_context(prompt, items, search_token_budget)
+                search_results = format_results(items)
+                logger.info("搜索结果 %d 条，去重 %d 条，选用 %d 条（截断 %d 条），约 %d tokens",
+                            stats["candidates"], stats["duplicates"], stats["selected"],
+                            stats["truncated"], stats["tokens"])
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("搜索结果:\n%s...", search_results[:500])
             
             # 将搜索结果整合到提示词中
             enhanced_prompt = f"""基于以下网络搜索结果，回答用户的问题：
@@ -462,9 +540,16 @@ class LLMWebSearchNode:
             max_tokens=max_tokens,
             top_p=top_p,
             image=image,
-            detail_level=detail_level
+            detail_level=detail_level,
+            image_mode=image_mode,
+            max_images=max_images,
+            build_full_response=output_is_linked(graph_prompt, unique_id, 2)
         )
         
+        if stats is not None and usage_info:
+            usage_info += f"；搜索上下文: {stats['selected']}/{stats['candidates']} 条，约 {stats['tokens']} tokens"
+        
+        logger.info("LLM响应完成，模型: %s，搜索: %s", model, "启用" if enable_search else "禁用")
         return (response_text, search_results, full_response, usage_info)
 
 
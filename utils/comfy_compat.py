@@ -0,0 +1,92 @@
+"""
+ComfyUI 运行时辅助函数
+
+这些函数只依赖 ComfyUI 传入的隐藏输入（PROMPT / UNIQUE_ID）或按需导入 ComfyUI 模块，
+在 ComfyUI 之外直接调用节点时会退化为保守行为。
+"""
+
+
+def output_is_linked(prompt, unique_id, output_index):
+    """
+    判断节点的某个输出是否被工作流中的其他节点连接
+
+    Args:
+        prompt (dict): ComfyUI 隐藏输入 PROMPT（节点ID -> 节点定义）
+        unique_id (str): 当前节点ID（隐藏输入 UNIQUE_ID）
+        output_index (int): 输出序号（对应 RETURN_TYPES 中的位置）
+
+    Returns:
+        bool: 已连接返回 True；无法判断（非 ComfyUI 调用）时也返回 True
+    """
+    if not prompt or unique_id is None:
+        return True
+
+    unique_id = str(unique_id)
+    for node in prompt.values():
+        inputs = node.get("inputs", {}) if isinstance(node, dict) else {}
+        for value in inputs.values():
+            if (isinstance(value, (list, tuple)) and len(value) == 2
+                    and str(value[0]) == unique_id and value[1] == output_index):
+                return True
+    return False
+
+
+def execution_blocker(message=None):
+    """
+    创建 ComfyUI 的 ExecutionBlocker，阻止下游节点执行
+
+    Args:
+        message (str): 为 None 时静默阻止；否则下游执行时报告该错误信息
+
+    Returns:
+        ExecutionBlocker 实例；ComfyUI 版本过旧或不在 ComfyUI 中运行时返回 None
+    """
+    try:
+        from comfy_execution.graph import ExecutionBlocker
+    except ImportError:
+        return None
+    return ExecutionBlocker(message)
+
+
+class _NullProgressBar:
+    def update(self, value):
+        pass
+
+    def update_absolute(self, value, total=None, preview=None):
+        pass
+
+
+def progress_bar(total):
+    """
+    创建 ComfyUI 的节点进度条（comfy.utils.ProgressBar）
+
+    Args:
+        total (int): 总步数
+
+    Returns:
+        带 update / update_absolute 方法的进度条；不在 ComfyUI 中运行时返回空实现
+    """
+    try:
+        from comfy.utils import ProgressBar
+    except ImportError:
+        return _NullProgressBar()
+    return ProgressBar(total)
+
+
+def progress_text(text, unique_id):
+    """
+    在节点上显示文本进度（PromptServer.send_progress_text），如流式输出的内容
+
+    Args:
+        text (str): 显示的文本
+        unique_id (str): 当前节点ID（隐藏输入 UNIQUE_ID）；为 None、ComfyUI 版本过旧或不在 ComfyUI 中运行时忽略
+    """
+    if unique_id is None:
+        return
+    try:
+        from server import PromptServer
+        send = getattr(PromptServer.instance, "send_progress_text", None)
+    except Exception:
+        return
+    if send is not None:
+        send(text, unique_id)
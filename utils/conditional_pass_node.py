@@ -1,3 +1,6 @@
+from .comfy_compat import execution_blocker
+
+
 # 创建AnyType类以支持通配符类型
 class AnyType(str):
     def __ne__(self, __value: object) -> bool:
@@ -12,10 +15,14 @@ class ConditionalPassNode:
     ComfyUI节点：条件传递节点
     根据布尔值决定是否传递值到下一个节点
     如果condition为True，则输出value继续流程
-    如果condition为False，则输出None（后续节点需要处理None值）
+    如果condition为False，则阻止下游节点执行
     
-    注意：ComfyUI无法真正"终止"流程，当condition为False时，节点会输出None。
-    建议后续节点检查输入是否为None来决定是否执行。
+    value 是惰性输入：ComfyUI 先计算 condition，再通过 check_lazy_status 询问是否需要 value。
+    condition为False时不会请求value，因此上游分支（如Seedream/万相/LLM调用）根本不会执行。
+    condition 可以直接连接 StringIsNotEmptyNode 等布尔输出。
+    
+    condition为False时输出 ExecutionBlocker，下游节点会被静默跳过；
+    关闭 block_downstream 或在不支持 ExecutionBlocker 的旧版 ComfyUI 中则输出None。
     """
     
     def __init__(self):
@@ -31,10 +38,17 @@ class ConditionalPassNode:
             "required": {
                 "condition": ("BOOLEAN", {
                     "default": True,
-                    "tooltip": "条件值，True时传递值，False时输出None"
+                    "tooltip": "条件值，True时传递值，False时不计算上游分支并阻止下游执行"
                 }),
                 "value": (any_type, {
-                    "tooltip": "要传递的值，可以是任何类型"
+                    "lazy": True,
+                    "tooltip": "要传递的值，可以是任何类型（仅在condition为True时计算）"
+                })
+            },
+            "optional": {
+                "block_downstream": ("BOOLEAN", {
+                    "default": True,
+                    "tooltip": "condition为False时阻止下游节点执行；关闭则输出None"
                 })
             }
         }
@@ -51,22 +65,41 @@ class ConditionalPassNode:
     FUNCTION = "conditional_pass"
     CATEGORY = "XJ Nodes/Utils"
     
-    def conditional_pass(self, condition, value):
+    def check_lazy_status(self, condition, value=None, block_downstream=True):
+        """
+        告诉ComfyUI还需要计算哪些惰性输入
+        
+        Args:
+            condition (bool): 已计算好的条件值
+            value: 惰性输入，尚未计算时为None
+        
+        Returns:
+            list: 需要计算的输入名称列表
+        """
+        if condition:
+            return ["value"]
+        return []
+    
+    def conditional_pass(self, condition, value=None, block_downstream=True):
         """
         根据条件决定是否传递值
         
         Args:
             condition (bool): 条件值
-            value: 要传递的值
+            value: 要传递的值（condition为False时未计算）
+            block_downstream (bool): condition为False时是否阻止下游执行
         
         Returns:
-            tuple: 如果condition为True返回(value,)，否则返回(None,)
+            tuple: 如果condition为True返回(value,)，否则返回(ExecutionBlocker,)或(None,)
         """
         if condition:
             return (value,)
-        else:
-            # 返回None，后续节点可以检查是否为None来决定是否执行
-            return (None,)
+        if block_downstream:
+            blocker = execution_blocker(None)
+            if blocker is not None:
+                return (blocker,)
+        # 返回None，后续节点可以检查是否为None来决定是否执行
+        return (None,)
 
 
 # ComfyUI节点映射
@@ -0,0 +1,214 @@
+"""
+火山方舟上下文缓存（Context API）
+
+豆包工作流每次调用都重复发送相同的长系统提示词（常常还有同一张图像），每次都要重新计算这部分前缀。
+开启后，节点把这段前缀通过 /api/v3/context/create（common_prefix 模式）创建为上下文缓存，
+之后在有效期内改用 /api/v3/context/chat/completions，只发送 context_id 与新增的消息：
+
+- 缓存按前缀内容寻址（接口地址、API Key、模型、前缀消息的指纹，图像按内容摘要），
+  索引保存在磁盘上，ComfyUI 重启后仍复用未过期的 context_id
+- 有效期由创建时的 ttl 决定；使用时顺延（服务端按最后一次使用计时，索引只在顺延较多时写回磁盘），
+  服务端已过期或不存在时自动删除记录并重新创建
+- 前缀无法缓存（如模型不支持、前缀过短）或缓存对话请求被拒绝时，该前缀在一段时间内不再尝试，
+  直接发送完整请求
+- stats() 返回命中 / 创建 / 失败次数、命中率与响应中报告的缓存 tokens
+
+环境变量:
+- XJ_NODES_CONTEXT_CACHE_TTL: 新建上下文的有效期（秒，默认 3600，方舟允许 3600-604800）
+- XJ_NODES_CONTEXT_CACHE_INDEX: 磁盘索引路径（默认 ~/.cache/xj_nodes/ark_contexts.json）
+"""
+
+import os
+import threading
+import time
+
+from . import json_codec, transport
+from .fingerprint import payload_fingerprint
+from .logger import get_logger
+
+logger = get_logger("context_cache")
+
+# 距过期不足该秒数的缓存视为失效，避免请求途中过期
+EXPIRY_MARGIN = 60
+# 前缀创建失败（或缓存对话请求被拒绝）后该前缀暂停使用缓存的秒数
+FAILURE_BACKOFF = 600
+# 命中时有效期顺延超过该秒数才写回磁盘索引，避免每次命中都重写文件
+# （记录的有效期最多比服务端早这么久，只会偏保守）
+REFRESH_INTERVAL = 300
+
+_state_lock = threading.Lock()
+_index = None
+_failed_until = {}
+_stats = {"hits": 0, "creates": 0, "failures": 0, "invalidations": 0, "cached_tokens": 0}
+_config = {
+    "ttl": int(os.getenv("XJ_NODES_CONTEXT_CACHE_TTL", "3600") or 3600),
+    "index_path": os.getenv("XJ_NODES_CONTEXT_CACHE_INDEX",
+                            os.path.join(os.path.expanduser("~"), ".cache", "xj_nodes", "ark_contexts.json")),
+}
+
+
+def configure(ttl=None, index_path=None):
+    """
+    运行时调整上下文缓存
+
+    Args:
+        ttl (int): 新建上下文的有效期（秒）
+        index_path (str): 磁盘索引路径；改变后重新加载
+    """
+    global _index
+    with _state_lock:
+        _failed_until.clear()
+        if ttl is not None:
+            _config["ttl"] = int(ttl)
+        if index_path is not None and index_path != _config["index_path"]:
+            _config["index_path"] = index_path
+            _index = None
+
+
+def stats():
+    """返回命中、创建、失败次数，命中率与累计缓存 tokens"""
+    with _state_lock:
+        result = dict(_stats)
+    lookups = result["hits"] + result["creates"]
+    result["hit_rate"] = round(result["hits"] / lookups, 4) if lookups else 0.0
+    return result
+
+
+def api_urls(api_url):
+    """
+    由 /chat/completions 地址得到 (创建地址, 缓存对话地址)
+
+    Args:
+        api_url (str): 如 https://ark.cn-beijing.volces.com/api/v3/chat/completions
+    """
+    base = api_url.rstrip("/")
+    if base.endswith("/chat/completions"):
+        base = base[:-len("/chat/completions")]
+    return f"{base}/context/create", f"{base}/context/chat/completions"
+
+
+# ---------- 磁盘索引 ----------
+
+def _load_index():
+    """加载磁盘索引并丢弃过期条目（调用方持有 _state_lock）"""
+    global _index
+    if _index is None:
+        _index = {}
+        path = _config["index_path"]
+        try:
+            if os.path.exists(path):
+                with open(path, "r", encoding="utf-8") as f:
+                    _index = json_codec.loads(f.read())
+        except Exception as e:
+            logger.warning("上下文缓存索引无法读取，已忽略: %s", e)
+            _index = {}
+        now = time.time()
+        _index = {key: entry for key, entry in _index.items() if entry.get("expires_at", 0) > now}
+    return _index
+
+
+def _save_index():
+    """原子写入磁盘索引（调用方持有 _state_lock）"""
+    path = _config["index_path"]
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(json_codec.dumps(_index))
+        os.replace(temp_path, path)
+    except Exception as e:
+        logger.warning("上下文缓存索引无法保存: %s", e)
+
+
+# ---------- 创建与查找 ----------
+
+def _create(api_url, headers, model, prefix_messages, ttl):
+    """调用 /context/create，返回 (context_id, 前缀 tokens)"""
+    create_url, _ = api_urls(api_url)
+    response = transport.post(create_url, headers=headers, timeout=120, json={
+        "model": model,
+        "messages": prefix_messages,
+        "mode": "common_prefix",
+        "ttl": ttl,
+    })
+    response.raise_for_status()
+    result = json_codec.response_json(response)
+    if not result.get("id"):
+        raise Exception(f"响应中没有 context id: {json_codec.dumps_elided(result)[:200]}")
+    return result["id"], (result.get("usage") or {}).get("prompt_tokens", 0)
+
+
+def get_or_create(api_url, headers, model, prefix_messages):
+    """
+    返回前缀对应的 context_id，没有可用缓存时创建
+
+    Args:
+        api_url (str): /chat/completions 地址
+        headers (dict): 含 Authorization 的请求头
+        model (str): 模型名称或 Endpoint ID
+        prefix_messages (list): 要缓存的前缀消息（可含 Base64Blob 图像）
+
+    Returns:
+        str | None: context_id；前缀无法缓存时返回 None，调用方应发送完整请求
+    """
+    key = payload_fingerprint(api_urls(api_url)[0], headers.get("Authorization", ""), model, prefix_messages)
+    now = time.time()
+    with _state_lock:
+        entry = _load_index().get(key)
+        if entry is not None and entry["expires_at"] - EXPIRY_MARGIN > now:
+            _stats["hits"] += 1
+            # 服务端按最后一次使用计算有效期
+            if now + entry["ttl"] - entry["expires_at"] > REFRESH_INTERVAL:
+                entry["expires_at"] = now + entry["ttl"]
+                _save_index()
+            logger.debug("上下文缓存命中: %s", entry["id"])
+            return entry["id"]
+        if _failed_until.get(key, 0) > now:
+            return None
+
+    ttl = _config["ttl"]
+    try:
+        context_id, tokens = _create(api_url, headers, model, prefix_messages, ttl)
+    except Exception as e:
+        with _state_lock:
+            _stats["failures"] += 1
+            _failed_until[key] = time.time() + FAILURE_BACKOFF
+        logger.warning("上下文缓存创建失败，%d 秒内该前缀直接发送完整请求: %s", FAILURE_BACKOFF, e)
+        return None
+
+    with _state_lock:
+        _load_index()[key] = {"id": context_id, "ttl": ttl, "expires_at": now + ttl, "tokens": tokens}
+        _stats["creates"] += 1
+        _save_index()
+    logger.info("已创建上下文缓存 %s（前缀 %d tokens，有效期 %d 秒）", context_id, tokens, ttl)
+    return context_id
+
+
+def invalidate(context_id, backoff=False):
+    """
+    删除 context_id 的记录，下次重新创建
+
+    Args:
+        context_id (str): 上下文ID
+        backoff (bool): 缓存对话请求因其他原因被拒绝时为 True，
+            该前缀在 FAILURE_BACKOFF 秒内不再使用缓存，直接发送完整请求
+    """
+    with _state_lock:
+        index = _load_index()
+        keys = [key for key, entry in index.items() if entry["id"] == context_id]
+        for key in keys:
+            del index[key]
+            _stats["invalidations"] += 1
+            if backoff:
+                _failed_until[key] = time.time() + FAILURE_BACKOFF
+        if keys:
+            _save_index()
+
+
+def record_usage(usage):
+    """累计响应 usage 中报告的缓存 tokens（prompt_tokens_details.cached_tokens）"""
+    cached = ((usage or {}).get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+    if cached:
+        with _state_lock:
+            _stats["cached_tokens"] += cached
+    return cached
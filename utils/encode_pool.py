@@ -0,0 +1,280 @@
+"""
+多进程图像编码池（可选）
+
+批量模式下几十张 2K~4K 图像的 PNG/JPEG 编码会成为 CPU 瓶颈，而且都在 ComfyUI 的执行线程上
+串行占用 GIL。开启后，节点把编码交给独立进程：
+
+- 图像张量通过 multiprocessing.shared_memory 交给工作进程，不经过 pickle 复制像素
+- 工作进程直接调用节点自身的编码方法（按 模块/类/方法名 传递，在工作进程中重新查找），与进程内编码结果完全一致
+- submit 返回 Future，调用方可以先提交全部帧，再边取结果边组装 / 上传，编码与网络请求重叠
+- 进程池未开启、图像太小、共享内存不可用或工作进程崩溃时，自动回退到当前线程内编码
+
+工作进程使用 spawn 启动（避免 fork 复制 CUDA 上下文与 ComfyUI 的线程）。ComfyUI 按完整路径
+生成自定义节点的模块名，这样的名字在工作进程中无法导入；工作进程初始化时把节点包目录注册为
+固定别名 WORKER_PACKAGE（只注册包路径，不执行顶层 __init__），函数与节点类都通过该别名导入，
+不依赖 ComfyUI。
+
+环境变量:
+- XJ_NODES_ENCODE_PROCESSES: 工作进程数，0 为关闭（默认 0）
+- XJ_NODES_ENCODE_MIN_PIXELS: 单帧像素数低于该值时在当前线程编码（默认 1000000，约 1K×1K）
+"""
+
+import atexit
+import importlib
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from .lazy_import import lazy_import
+from .logger import get_logger
+
+torch = lazy_import("torch")
+np = lazy_import("numpy")
+shared_memory = lazy_import("multiprocessing.shared_memory")
+
+logger = get_logger("encode_pool")
+
+_state_lock = threading.Lock()
+_pool = None
+_config = {
+    "processes": int(os.getenv("XJ_NODES_ENCODE_PROCESSES", "0") or 0),
+    "min_pixels": int(os.getenv("XJ_NODES_ENCODE_MIN_PIXELS", "1000000") or 0),
+}
+
+
+def configure(processes=None, min_pixels=None):
+    """
+    运行时调整进程池
+
+    Args:
+        processes (int): 工作进程数，0 为关闭；改变后旧进程池在空闲后关闭
+        min_pixels (int): 单帧像素数低于该值时在当前线程编码
+    """
+    global _pool
+    with _state_lock:
+        if processes is not None and int(processes) != _config["processes"]:
+            _config["processes"] = max(0, int(processes))
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+                _pool = None
+        if min_pixels is not None:
+            _config["min_pixels"] = max(0, int(min_pixels))
+
+
+def enabled():
+    """进程池是否开启"""
+    return _config["processes"] > 0
+
+
+# 工作进程中本节点包的固定模块名
+WORKER_PACKAGE = "xj_nodes_encode_worker"
+
+# 本节点包在当前进程中的模块名（ComfyUI 下可能是完整路径）
+_PACKAGE_NAME = __name__.rsplit(".", 2)[0]
+_PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 工作进程初始化：把节点包目录注册为 WORKER_PACKAGE（exec 为内置函数，无需按模块名 pickle）
+_WORKER_BOOTSTRAP = """
+import sys, types
+package = types.ModuleType({name!r})
+package.__path__ = [{path!r}]
+sys.modules.setdefault({name!r}, package)
+"""
+
+
+class _ModuleRef:
+    """pickle 后在工作进程中按模块名导入"""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __reduce__(self):
+        return importlib.import_module, (self.name,)
+
+
+class _WorkerEntry:
+    """工作进程入口 _encode_in_worker 的引用，pickle 后按 WORKER_PACKAGE 别名解析"""
+
+    def __reduce__(self):
+        return getattr, (_ModuleRef(f"{WORKER_PACKAGE}.utils.encode_pool"), "_encode_in_worker")
+
+
+def _worker_target(method):
+    """
+    把编码方法转换为工作进程可以重新查找的描述
+
+    Returns:
+        tuple | None: (相对模块名, 类或函数的限定名, 方法名, 实例属性)；不属于本节点包时返回 None
+    """
+    owner = getattr(method, "__self__", None)
+    target = type(owner) if owner is not None else method
+    module = getattr(target, "__module__", "")
+    if not module.startswith(_PACKAGE_NAME + "."):
+        return None
+    relative = module[len(_PACKAGE_NAME):]
+    if owner is None:
+        return relative, method.__qualname__, None, None
+    return relative, target.__qualname__, method.__name__, dict(vars(owner))
+
+
+def _resolve_target(target):
+    """在工作进程中按 _worker_target 的描述取回编码方法"""
+    relative, qualname, method_name, state = target
+    obj = importlib.import_module(WORKER_PACKAGE + relative)
+    for part in qualname.split("."):
+        obj = getattr(obj, part)
+    if method_name is None:
+        return obj
+    instance = obj.__new__(obj)
+    instance.__dict__.update(state)
+    return getattr(instance, method_name)
+
+
+def get_pool():
+    """
+    返回共享的进程池（惰性创建）；未开启时返回 None
+    """
+    global _pool
+    if not enabled():
+        return None
+    if _pool is None:
+        with _state_lock:
+            if _pool is None and enabled():
+                _pool = ProcessPoolExecutor(
+                    max_workers=_config["processes"],
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=exec,
+                    initargs=(_WORKER_BOOTSTRAP.format(name=WORKER_PACKAGE, path=_PACKAGE_DIR), {}),
+                )
+                logger.info("图像编码进程池已启动，进程数: %d", _config["processes"])
+    return _pool
+
+
+def _discard_pool(pool):
+    """工作进程崩溃后丢弃进程池，下次提交时重建"""
+    global _pool
+    with _state_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+
+def shutdown():
+    """关闭进程池（解释器退出时自动调用）"""
+    global _pool
+    with _state_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True)
+
+
+atexit.register(shutdown)
+
+
+def _call_on_buffer(method, buffer, shape, dtype, args):
+    """在共享内存视图上调用编码方法；异常只带回消息，避免回溯继续引用共享内存"""
+    frame = torch.from_numpy(np.ndarray(shape, dtype=dtype, buffer=buffer))
+    try:
+        return method(frame, *args), None
+    except Exception as e:
+        return None, str(e)
+
+
+def _encode_in_worker(target, name, shape, dtype, args):
+    """工作进程入口：挂载共享内存，调用节点的编码方法"""
+    method = _resolve_target(target)
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        result, error = _call_on_buffer(method, block.buf, shape, dtype, args)
+    finally:
+        block.close()
+    if error is not None:
+        raise Exception(error)
+    return result
+
+
+def _release(block):
+    block.close()
+    block.unlink()
+
+
+def _run_inline(method, frame, args):
+    """在当前线程编码，包装为已完成的 Future"""
+    future = Future()
+    try:
+        future.set_result(method(frame, *args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def submit(method, frame, *args):
+    """
+    提交一帧编码
+
+    Args:
+        method: 节点的编码方法（本节点包中的绑定方法或模块级函数），签名为 method(tensor, *args)
+        frame (torch.Tensor): 图像张量，原样传给 method
+        *args: 额外参数（需可 pickle）
+
+    Returns:
+        Future: 编码结果
+    """
+    pixels = frame.shape[-3] * frame.shape[-2] if len(frame.shape) >= 3 else 0
+    if not enabled() or pixels < _config["min_pixels"]:
+        return _run_inline(method, frame, args)
+    target = _worker_target(method)
+    if target is None:
+        return _run_inline(method, frame, args)
+
+    try:
+        pool = get_pool()
+    except Exception as e:
+        logger.warning("编码进程池无法启动，回退到线程内编码: %s", e)
+        return _run_inline(method, frame, args)
+    if pool is None:
+        return _run_inline(method, frame, args)
+
+    try:
+        array = frame.detach().cpu().contiguous().numpy()
+        block = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+    except Exception as e:
+        logger.warning("共享内存不可用，回退到线程内编码: %s", e)
+        return _run_inline(method, frame, args)
+    np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+
+    try:
+        future = pool.submit(_WorkerEntry(), target, block.name, array.shape, array.dtype.str, args)
+    except Exception as e:
+        _release(block)
+        logger.warning("编码进程池不可用，回退到线程内编码: %s", e)
+        _discard_pool(pool)
+        return _run_inline(method, frame, args)
+    future.add_done_callback(lambda _: _release(block))
+    return future
+
+
+def result(future, method, frame, *args):
+    """
+    取回 submit 的结果；工作进程崩溃时在当前线程重新编码这一帧
+    """
+    try:
+        return future.result()
+    except BrokenProcessPool as e:
+        logger.warning("编码工作进程异常退出，回退到线程内编码: %s", e)
+        pool = _pool
+        if pool is not None:
+            _discard_pool(pool)
+        return method(frame, *args)
+
+
+def encode(method, frame, *args):
+    """
+    编码单帧（开启进程池时在工作进程中编码，释放执行线程的 GIL）
+
+    Returns:
+        method 的返回值
+    """
+    return result(submit(method, frame, *args), method, frame, *args)
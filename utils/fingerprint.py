@@ -0,0 +1,82 @@
+"""
+节点输入指纹（用于 IS_CHANGED）
+
+ComfyUI 在执行前调用节点的 IS_CHANGED，返回值与上次不同才会重新执行。
+IS_CHANGED 只收到控件上填写的常量输入，连接的输入（图像、上游节点输出的文本等）为 None；
+上游输出是否变化由 ComfyUI 按连接的上游节点判断，不在这里计算。
+
+API 节点统一用控件参数的哈希作为指纹：参数不变时返回相同指纹，ComfyUI 可直接复用缓存而不访问网络；
+随机种子（seed=-1）返回 NaN，由于 NaN 不等于自身，每次都会重新执行。
+"""
+
+import hashlib
+
+from .streaming_body import Base64Blob
+
+# ComfyUI 隐藏输入，每次运行都可能变化，不参与指纹
+IGNORED_INPUTS = {"graph_prompt", "unique_id", "extra_pnginfo"}
+
+# 参与指纹的控件值类型；连接的输入（None，或直接调用时传入的张量等对象）不参与
+WIDGET_TYPES = (str, int, float, bool)
+
+
+def fingerprint_inputs(inputs, seed_keys=("seed",)):
+    """
+    计算节点控件参数的指纹，供 IS_CHANGED 返回
+
+    Args:
+        inputs (dict): IS_CHANGED 收到的输入
+        seed_keys (tuple): 表示随机种子的输入名，值为 -1 时视为随机
+
+    Returns:
+        str | float: 十六进制指纹；随机种子时返回 float("nan") 强制重新执行
+    """
+    for key in seed_keys:
+        if inputs.get(key) == -1:
+            return float("nan")
+
+    hasher = hashlib.blake2b(digest_size=16)
+    for key in sorted(inputs):
+        value = inputs[key]
+        if key in IGNORED_INPUTS or not isinstance(value, WIDGET_TYPES):
+            continue
+        hasher.update(f"{key}={value!r}\0".encode("utf-8"))
+    return hasher.hexdigest()
+
+
+def _feed_payload(hasher, obj):
+    """按结构写入哈希：字典按键排序，图像数据只写入 SHA-256 摘要"""
+    if isinstance(obj, dict):
+        hasher.update(b"{")
+        for key in sorted(obj):
+            _feed_payload(hasher, key)
+            _feed_payload(hasher, obj[key])
+        hasher.update(b"}")
+    elif isinstance(obj, (list, tuple)):
+        hasher.update(b"[")
+        for value in obj:
+            _feed_payload(hasher, value)
+        hasher.update(b"]")
+    elif isinstance(obj, Base64Blob):
+        data = obj.data.encode("ascii") if isinstance(obj.data, str) else obj.data
+        hasher.update(f"blob:{obj.prefix}:".encode("utf-8") + hashlib.sha256(data).digest())
+    elif isinstance(obj, (bytes, bytearray, memoryview)):
+        hasher.update(b"bytes:" + hashlib.sha256(obj).digest())
+    else:
+        hasher.update(f"{type(obj).__name__}:{obj!r}\0".encode("utf-8"))
+
+
+def payload_fingerprint(*parts):
+    """
+    计算请求内容的指纹（任务日志、上下文缓存等按请求内容寻址时使用）
+
+    Args:
+        *parts: 接口地址、API Key、请求体等（dict / list / str / bytes / Base64Blob）
+
+    Returns:
+        str: 十六进制指纹；不包含任何明文
+    """
+    hasher = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        _feed_payload(hasher, part)
+    return hasher.hexdigest()
@@ -0,0 +1,186 @@
+"""
+异步任务日志
+
+万相等异步接口提交后由服务端渲染，ComfyUI 重启时进程内的任务状态全部丢失，
+重新执行会再次提交（重复计费、重复等待）。本模块把已提交且尚未结束的任务记录在磁盘上：
+
+- 按 task_id 记录请求体哈希（含 API Key 与接口地址）、提交进程的运行 ID 与状态
+- 只有之前的进程提交、且该进程结束时仍在进行中（PENDING / RUNNING）的任务可以被接管；
+  当前进程内的相同请求总是重新提交，每条记录只能被接管一次
+- 任务进入终止状态（成功、失败、取消）或服务端已查不到时删除记录：已完成的结果不会被新的提交复用
+
+DashScope 的任务与结果 URL 保留 24 小时，记录的有效期与之一致。
+
+环境变量:
+- XJ_NODES_JOB_JOURNAL: 0 关闭（默认 1，开启）
+- XJ_NODES_JOB_JOURNAL_PATH: 日志路径（默认 ~/.cache/xj_nodes/jobs.json）
+- XJ_NODES_JOB_JOURNAL_TTL: 记录有效期（秒，默认 86400）
+"""
+
+import os
+import threading
+import time
+import uuid
+
+from . import json_codec
+from .fingerprint import payload_fingerprint
+from .logger import get_logger
+
+logger = get_logger("job_journal")
+
+# 距过期不足该秒数的记录视为失效，避免接管即将被服务端清理的任务
+EXPIRY_MARGIN = 600
+
+# 可以被接管的状态（提交进程结束时任务仍在进行中）
+IN_FLIGHT_STATUSES = {"PENDING", "RUNNING"}
+
+# 当前进程的运行 ID：本进程提交的任务不会被本进程接管
+RUN_ID = uuid.uuid4().hex
+
+_state_lock = threading.Lock()
+_journal = None
+_config = {
+    "enabled": os.getenv("XJ_NODES_JOB_JOURNAL", "1").strip().lower() not in ("0", "false", "off", "no"),
+    "path": os.getenv("XJ_NODES_JOB_JOURNAL_PATH",
+                      os.path.join(os.path.expanduser("~"), ".cache", "xj_nodes", "jobs.json")),
+    "ttl": float(os.getenv("XJ_NODES_JOB_JOURNAL_TTL", "86400") or 86400),
+}
+
+
+def configure(enabled=None, path=None, ttl=None):
+    """
+    运行时调整任务日志
+
+    Args:
+        enabled (bool): 是否开启
+        path (str): 日志路径；改变后重新加载
+        ttl (float): 记录有效期（秒）
+    """
+    global _journal
+    with _state_lock:
+        if enabled is not None:
+            _config["enabled"] = bool(enabled)
+        if ttl is not None:
+            _config["ttl"] = float(ttl)
+        if path is not None and path != _config["path"]:
+            _config["path"] = path
+            _journal = None
+
+
+def request_key(url, api_key, payload):
+    """
+    请求的哈希：同一账号向同一接口提交相同请求体时相同（日志中不保存 API Key 与请求体明文）
+
+    Args:
+        url (str): 提交地址
+        api_key (str): API Key
+        payload (dict): 请求体（可含 Base64Blob）
+
+    Returns:
+        str: 十六进制哈希
+    """
+    return payload_fingerprint(url, api_key, payload)
+
+
+# ---------- 磁盘日志 ----------
+
+def _load():
+    """加载日志并丢弃过期记录（调用方持有 _state_lock）"""
+    global _journal
+    if _journal is None:
+        _journal = {}
+        path = _config["path"]
+        try:
+            if os.path.exists(path):
+                with open(path, "r", encoding="utf-8") as f:
+                    _journal = json_codec.loads(f.read())
+        except Exception as e:
+            logger.warning("任务日志无法读取，已忽略: %s", e)
+            _journal = {}
+    now = time.time()
+    expired = [task_id for task_id, entry in _journal.items()
+               if entry.get("expires_at", 0) - EXPIRY_MARGIN <= now or "key" not in entry]
+    for task_id in expired:
+        del _journal[task_id]
+    return _journal
+
+
+def _save():
+    """原子写入日志（调用方持有 _state_lock）"""
+    path = _config["path"]
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(json_codec.dumps(_journal))
+        os.replace(temp_path, path)
+    except Exception as e:
+        logger.warning("任务日志无法保存: %s", e)
+
+
+# ---------- 记录与查找 ----------
+
+def lookup(key):
+    """
+    查找之前的进程提交、仍在进行中的相同请求，并由当前进程接管
+
+    Args:
+        key (str): request_key 的结果
+
+    Returns:
+        dict | None: 记录（task_id / status / submitted_at）；未开启或没有可接管的任务时返回 None
+    """
+    if not _config["enabled"]:
+        return None
+    with _state_lock:
+        for task_id, entry in _load().items():
+            if (entry["key"] == key and entry.get("run_id") != RUN_ID
+                    and entry.get("status") in IN_FLIGHT_STATUSES):
+                # 接管后归属当前进程，同一条记录不会再被接管
+                entry["run_id"] = RUN_ID
+                entry["updated_at"] = time.time()
+                _save()
+                return dict(entry, task_id=task_id)
+        return None
+
+
+def record_submit(key, task_id, kind=""):
+    """记录新提交的任务"""
+    if not _config["enabled"]:
+        return
+    now = time.time()
+    with _state_lock:
+        _load()[task_id] = {"key": key, "kind": kind, "run_id": RUN_ID, "status": "PENDING",
+                            "submitted_at": now, "updated_at": now, "expires_at": now + _config["ttl"]}
+        _save()
+
+
+def update(task_id, status):
+    """
+    更新任务状态；进入终止状态时删除记录
+
+    Args:
+        task_id (str): 任务ID
+        status (str): 任务状态
+    """
+    if not _config["enabled"]:
+        return
+    with _state_lock:
+        entry = _load().get(task_id)
+        if entry is None or entry["status"] == status:
+            return  # 状态未变化，不重写文件
+        if status in IN_FLIGHT_STATUSES:
+            entry["status"] = status
+            entry["updated_at"] = time.time()
+        else:
+            del _journal[task_id]
+        _save()
+
+
+def discard(task_id):
+    """删除记录（任务已结束、结果下载失败或服务端已查不到）"""
+    if not _config["enabled"]:
+        return
+    with _state_lock:
+        if _load().pop(task_id, None) is not None:
+            _save()
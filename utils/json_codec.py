@@ -0,0 +1,234 @@
+"""
+JSON 编解码层
+
+节点解析接口响应、序列化 full_response / 错误信息统一走本模块：
+
+- 安装了 orjson 时使用 orjson（解析多 MB 的 b64_json 响应快数倍），否则使用标准库 json
+- 两种后端输出格式一致：紧凑格式为 (",", ":") 分隔，indent=2 与 json.dumps(indent=2) 相同，均不转义非 ASCII 字符
+- orjson 不支持的输入（序列化超过 64 位的整数、解析 NaN 字面量等）自动回退到标准库；
+  注意 orjson 把超过 64 位的整数解析为 float，接口响应中不会出现这类数值
+- elide_blobs / dumps_elided 把 base64 图像替换为占位说明，日志与 full_response 不再携带图像数据
+- loads_with_blobs 解析时把 b64_json 等字段的值留在原始响应字节中，以 memoryview 切片返回，
+  不为每张图像生成几十 MB 的 str（解码见 utils.image_codec.decode_base64_views）
+
+请求体的序列化不在此处（见 utils.streaming_body），以保持与 requests 的 json= 参数逐字节一致。
+"""
+
+import json
+import re
+
+from .lazy_import import lazy_import
+
+requests = lazy_import("requests")
+
+try:
+    import orjson
+except ImportError:  # 可选依赖
+    orjson = None
+
+# 当前使用的后端
+BACKEND = "orjson" if orjson is not None else "json"
+
+# orjson.JSONDecodeError 是 json.JSONDecodeError 的子类，两种后端都抛出该类型
+JSONDecodeError = json.JSONDecodeError
+
+# 视为图像数据的字段名与最短长度
+BLOB_KEYS = {"b64_json", "image_base64", "base64", "b64"}
+BLOB_MIN_LENGTH = 1024
+# 未知字段的长字符串：开头 256 个字符全部是 base64 字符时视为图像数据
+_BASE64_HEAD = re.compile(r"[A-Za-z0-9+/]{256}")
+_GENERIC_BLOB_MIN_LENGTH = 4096
+
+
+def loads(data):
+    """
+    解析 JSON
+
+    Args:
+        data (str | bytes | bytearray | memoryview): JSON 文本
+
+    Returns:
+        解析结果
+
+    Raises:
+        JSONDecodeError: 不是合法的 JSON
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass  # 交给标准库：兼容 NaN 等扩展写法，非法输入时给出标准的错误信息
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    return json.loads(data)
+
+
+def dumps(obj, indent=None):
+    """
+    序列化为 JSON 字符串（不转义非 ASCII 字符）
+
+    Args:
+        obj: 可序列化对象
+        indent (int): None 为紧凑格式，2 为两空格缩进（其他值使用标准库）
+
+    Returns:
+        str
+    """
+    if orjson is not None and indent in (None, 2):
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent == 2 else 0)
+        try:
+            return orjson.dumps(obj, option=option).decode("utf-8")
+        except TypeError:
+            pass  # orjson.JSONEncodeError 是 TypeError 的子类，如超大整数，回退到标准库
+    if indent is None:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+    return json.dumps(obj, ensure_ascii=False, indent=indent)
+
+
+_KEY_SEPARATOR = re.compile(rb'\s*:\s*"')
+
+
+def _find_blob_value(data, keys, position):
+    """从 position 起查找下一个 "key": " 之后字符串值的起始位置；bytes.find 比正则扫描整段响应快得多"""
+    best = -1
+    for key in keys:
+        search = position
+        while True:
+            found = data.find(key, search)
+            if found < 0:
+                break
+            match = _KEY_SEPARATOR.match(data, found + len(key))
+            if match:
+                if best < 0 or match.end() < best:
+                    best = match.end()
+                break
+            search = found + 1
+    return best
+
+
+def loads_with_blobs(data, keys=("b64_json",), start=0):
+    """
+    解析 JSON，指定字段的字符串值不转换为 str，而是以原始字节的 memoryview 切片返回
+
+    先在原始字节中定位这些字段值的位置，用序号占位后解析剩余的 JSON 信封（只有几百字节），
+    再把占位换回切片。base64 不含引号与反斜杠，值的结尾即下一个引号；
+    含 "\\/" 转义的值返回去掉转义后的 bytes，含其他转义的值保持为 str。
+
+    Args:
+        data (bytes): JSON 文本
+        keys (tuple[str]): 字段名
+        start (int): JSON 在 data 中的起始位置（如 SSE 行的 "data:" 之后），省去切片复制
+
+    Returns:
+        解析结果；匹配字段的值为 memoryview 或 bytes
+    """
+    if isinstance(data, str):
+        return loads(data[start:])
+    view = memoryview(data)
+    quoted_keys = [b'"' + key.encode("utf-8") + b'"' for key in keys]
+    pieces, blobs = [], []
+    position = search = start
+    while True:
+        begin = _find_blob_value(data, quoted_keys, search)
+        if begin < 0:
+            break
+        end = data.find(b'"', begin)
+        if end < 0:
+            break
+        search = end + 1
+        if data.find(b"\\", begin, end) >= 0:
+            if data[end - 1] == 0x5C:
+                continue  # 转义的引号，不是 base64，交给 JSON 解析器
+            value = bytes(view[begin:end]).replace(b"\\/", b"/")
+            if b"\\" in value:
+                continue  # 其他转义交给 JSON 解析器
+        else:
+            value = view[begin:end]
+        pieces.append(view[position:begin])
+        pieces.append(str(len(blobs)).encode("ascii"))
+        blobs.append(value)
+        position = end
+    if not blobs:
+        return loads(view[start:] if start else data)
+    pieces.append(view[position:])
+    result = loads(b"".join(pieces))
+    _restore_blobs(result, frozenset(keys), blobs)
+    return result
+
+
+def _restore_blobs(obj, keys, blobs):
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            if key in keys and isinstance(value, str) and value.isdigit():
+                obj[key] = blobs[int(value)]
+            else:
+                _restore_blobs(value, keys, blobs)
+    elif isinstance(obj, list):
+        for value in obj:
+            _restore_blobs(value, keys, blobs)
+
+
+def response_json(response, blob_keys=None):
+    """
+    解析 requests.Response 的 JSON 响应体（替代 response.json()）
+
+    直接从响应字节解析，省去 response.text 的解码与字符集探测；
+    解析失败时与 response.json() 一样抛出 requests.exceptions.JSONDecodeError。
+
+    Args:
+        response: requests 响应
+        blob_keys (tuple[str]): 指定时按 loads_with_blobs 解析，这些字段的值为 memoryview
+    """
+    encoding = (response.encoding or "utf-8").lower().replace("-", "").replace("_", "")
+    data = response.content if encoding in ("utf8", "ascii") else response.text
+    try:
+        if blob_keys:
+            return loads_with_blobs(data, blob_keys)
+        return loads(data)
+    except JSONDecodeError as e:
+        raise requests.exceptions.JSONDecodeError(e.msg, e.doc if isinstance(e.doc, str) else "", e.pos)
+
+
+def _is_blob(key, value):
+    if not isinstance(value, str) or len(value) < BLOB_MIN_LENGTH:
+        return False
+    if key in BLOB_KEYS:
+        return True
+    head = value[:64]
+    if head.startswith("data:") and ";base64," in head:
+        return True
+    return len(value) >= _GENERIC_BLOB_MIN_LENGTH and _BASE64_HEAD.fullmatch(value[:256]) is not None
+
+
+def _placeholder(value):
+    prefix = ""
+    if value.startswith("data:"):
+        prefix = value[:value.index(",") + 1]
+    return f"{prefix}<base64 已省略，{len(value) - len(prefix)} 字符>"
+
+
+def elide_blobs(obj, key=None):
+    """
+    返回把 base64 图像数据替换为占位说明后的副本（原对象不变）
+
+    Args:
+        obj: 解析后的 JSON 对象
+
+    Returns:
+        与 obj 结构相同的对象
+    """
+    if isinstance(obj, dict):
+        return {k: elide_blobs(v, k) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [elide_blobs(v, key) for v in obj]
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        # loads_with_blobs 返回的图像数据
+        return f"<base64 已省略，{len(obj)} 字符>"
+    if _is_blob(key, obj):
+        return _placeholder(obj)
+    return obj
+
+
+def dumps_elided(obj, indent=None):
+    """省略 base64 图像数据后序列化，用于日志、错误信息与 full_response 输出"""
+    return dumps(elide_blobs(obj), indent=indent)
@@ -0,0 +1,59 @@
+"""
+延迟导入工具
+
+节点模块在顶层写 `torch = lazy_import("torch")`，模块本身在 ComfyUI 启动注册节点时
+不会真正导入 torch / numpy / PIL / requests，直到节点第一次执行访问属性时才加载。
+"""
+
+import importlib
+import sys
+import threading
+import types
+
+
+class LazyModule(types.ModuleType):
+    """
+    模块代理：首次访问属性时才导入真实模块
+    """
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.__dict__["_lazy_name"] = name
+        self.__dict__["_lazy_module"] = None
+        self.__dict__["_lazy_lock"] = threading.Lock()
+
+    def _load(self):
+        module = self.__dict__["_lazy_module"]
+        if module is None:
+            with self.__dict__["_lazy_lock"]:
+                module = self.__dict__["_lazy_module"]
+                if module is None:
+                    module = importlib.import_module(self.__dict__["_lazy_name"])
+                    self.__dict__["_lazy_module"] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = "loaded" if self.__dict__["_lazy_module"] is not None else "not loaded"
+        return f"<lazy module '{self.__dict__['_lazy_name']}' ({state})>"
+
+
+def lazy_import(name):
+    """
+    返回模块的延迟代理；如果模块已经被导入则直接返回真实模块
+
+    Args:
+        name (str): 模块全名，如 "PIL.Image"
+
+    Returns:
+        module: 真实模块或 LazyModule 代理
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    return LazyModule(name)
@@ -0,0 +1,82 @@
+"""
+XJ Nodes 统一日志模块
+
+所有节点通过 get_logger() 获取 "xj_nodes.*" 命名空间下的 logger，
+替代逐行 print，支持日志级别、惰性格式化（logger.debug("%s", x)）和静默模式。
+
+环境变量:
+- XJ_NODES_LOG_LEVEL: 日志级别（DEBUG/INFO/WARNING/ERROR），默认 INFO
+- XJ_NODES_QUIET: 设为 1/true 时只输出 WARNING 及以上级别
+"""
+
+import logging
+import os
+import sys
+
+ROOT_LOGGER_NAME = "xj_nodes"
+
+_TRUE_VALUES = ("1", "true", "yes", "on")
+
+_configured = False
+
+
+def _resolve_level():
+    """根据环境变量确定日志级别"""
+    if os.getenv("XJ_NODES_QUIET", "").strip().lower() in _TRUE_VALUES:
+        return logging.WARNING
+    level_name = os.getenv("XJ_NODES_LOG_LEVEL", "INFO").strip().upper()
+    level = logging.getLevelName(level_name)
+    return level if isinstance(level, int) else logging.INFO
+
+
+def _configure_root():
+    """为 xj_nodes 根 logger 挂载处理器（只执行一次）"""
+    global _configured
+    if _configured:
+        return
+    root = logging.getLogger(ROOT_LOGGER_NAME)
+    root.setLevel(_resolve_level())
+    if not root.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter("[%(name)s] %(levelname)s: %(message)s"))
+        root.addHandler(handler)
+    # 避免 ComfyUI 根 logger 重复输出
+    root.propagate = False
+    _configured = True
+
+
+def get_logger(name):
+    """
+    获取节点模块使用的 logger
+
+    Args:
+        name (str): 模块短名称，如 "llm_api"
+
+    Returns:
+        logging.Logger: xj_nodes.<name> logger
+    """
+    _configure_root()
+    return logging.getLogger(f"{ROOT_LOGGER_NAME}.{name}")
+
+
+def set_level(level):
+    """
+    运行时调整日志级别
+
+    Args:
+        level (int|str): logging 级别或级别名称
+    """
+    _configure_root()
+    if isinstance(level, str):
+        level = logging.getLevelName(level.strip().upper())
+    logging.getLogger(ROOT_LOGGER_NAME).setLevel(level)
+
+
+def set_quiet(quiet=True):
+    """
+    开启/关闭静默模式（静默时只输出 WARNING 及以上）
+
+    Args:
+        quiet (bool): 是否静默
+    """
+    set_level(logging.WARNING if quiet else _resolve_level())
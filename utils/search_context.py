@@ -0,0 +1,202 @@
+"""
+搜索结果上下文构建
+
+搜索节点把搜索结果作为上下文拼进提示词。结果原样全部拼接时，长摘要会拉长预填充耗时与费用，
+甚至超出模型上下文。这里在调用 LLM 之前：
+
+1. 按链接与摘要内容去重（同一页面的不同 URL 形式、转载的相同摘要）
+2. 用 BM25 按与问题的相关度排序（英文按单词，中日韩文字按相邻两字切分，不依赖分词库）
+3. 按相关度依次放入，直到达到 token 预算；单条摘要最多占预算的一半，放不下的最后一条截断摘要，其余丢弃
+
+搜索结果统一为 {"title", "snippet", "link"} 字典。
+"""
+
+import math
+import re
+from urllib.parse import urlsplit
+
+from .tokens import estimate_tokens, truncate_to_tokens
+
+# BM25 参数
+BM25_K1 = 1.2
+BM25_B = 0.75
+# 摘要的连续 3 词片段（shingle）集合 Jaccard 相似度达到该值视为重复
+DUPLICATE_THRESHOLD = 0.8
+SHINGLE_SIZE = 3
+# 剩余预算少于该值时不再截断放入新的结果
+MIN_SNIPPET_TOKENS = 24
+# 单条结果最多占用预算的比例，避免一条长摘要挤掉其他来源
+MAX_ITEM_SHARE = 0.5
+
+_WORDS = re.compile(r"[a-z0-9]+|[\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff]+")
+_WIDE_RUN = re.compile(r"[\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff]+")
+
+
+def tokenize(text):
+    """
+    切分检索用的词：英文数字按单词（小写），中日韩文字按相邻两字（单字成段时保留单字）
+
+    Returns:
+        list[str]: 词列表
+    """
+    terms = []
+    for word in _WORDS.findall((text or "").lower()):
+        if _WIDE_RUN.fullmatch(word) and len(word) > 1:
+            terms.extend(word[i:i + 2] for i in range(len(word) - 1))
+        else:
+            terms.append(word)
+    return terms
+
+
+def bm25_scores(query, documents):
+    """
+    计算每篇文档对查询的 BM25 得分（IDF 在这批文档内统计）
+
+    Args:
+        query (str): 查询
+        documents (list[str]): 文档文本
+
+    Returns:
+        list[float]: 与 documents 对应的得分
+    """
+    docs = [tokenize(doc) for doc in documents]
+    if not docs:
+        return []
+    query_terms = set(tokenize(query))
+    average_length = sum(len(doc) for doc in docs) / len(docs) or 1.0
+    frequencies = []
+    document_frequency = {}
+    for doc in docs:
+        counts = {}
+        for term in doc:
+            if term in query_terms:
+                counts[term] = counts.get(term, 0) + 1
+        frequencies.append(counts)
+        for term in counts:
+            document_frequency[term] = document_frequency.get(term, 0) + 1
+
+    total = len(docs)
+    idf = {term: math.log((total - df + 0.5) / (df + 0.5) + 1.0) for term, df in document_frequency.items()}
+    scores = []
+    for doc, counts in zip(docs, frequencies):
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * len(doc) / average_length)
+        scores.append(sum(idf[term] * tf * (BM25_K1 + 1) / (tf + norm) for term, tf in counts.items()))
+    return scores
+
+
+def normalize_link(link):
+    """用于去重的链接：忽略协议、www.、末尾斜杠、片段与大小写"""
+    if not link:
+        return ""
+    parts = urlsplit(link.strip().lower())
+    host = parts.netloc[4:] if parts.netloc.startswith("www.") else parts.netloc
+    path = parts.path.rstrip("/")
+    return f"{host}{path}?{parts.query}" if parts.query else f"{host}{path}"
+
+
+def format_result(item):
+    """单条结果的上下文文本"""
+    lines = []
+    if item.get("title"):
+        lines.append(f"标题: {item['title']}")
+    lines.append(f"摘要: {item.get('snippet', '')}")
+    if item.get("link"):
+        lines.append(f"链接: {item['link']}")
+    return "\n".join(lines) + "\n"
+
+
+def format_results(items):
+    """拼接多条结果，没有结果时返回提示"""
+    return "\n".join(format_result(item) for item in items) if items else "未找到相关搜索结果。"
+
+
+def shingles(text):
+    """连续 SHINGLE_SIZE 个词组成的片段集合（比词集合更能区分同一主题下的不同文本）"""
+    terms = tokenize(text)
+    if len(terms) < SHINGLE_SIZE:
+        return {tuple(terms)} if terms else set()
+    return {tuple(terms[i:i + SHINGLE_SIZE]) for i in range(len(terms) - SHINGLE_SIZE + 1)}
+
+
+def dedupe(items):
+    """
+    去除重复结果，保留先出现的一条
+
+    Returns:
+        tuple: (保留的结果, 丢弃的条数)
+    """
+    kept, kept_shingles, links = [], [], set()
+    for item in items:
+        link = normalize_link(item.get("link"))
+        if link and link in links:
+            continue
+        pieces = shingles(item.get("snippet", ""))
+        if pieces and any(len(pieces & other) / len(pieces | other) >= DUPLICATE_THRESHOLD
+                          for other in kept_shingles):
+            continue
+        if link:
+            links.add(link)
+        kept.append(item)
+        kept_shingles.append(pieces)
+    return kept, len(items) - len(kept)
+
+
+def _fit(item, max_tokens):
+    """
+    把单条结果放进 max_tokens 以内，必要时截断摘要
+
+    Returns:
+        tuple | None: (结果, tokens, 是否截断)；连截断后的最短摘要都放不下时返回 None
+    """
+    tokens = estimate_tokens(format_result(item))
+    if tokens <= max_tokens:
+        return item, tokens, False
+    snippet = item.get("snippet", "")
+    room = max_tokens - (tokens - estimate_tokens(snippet))
+    if room < MIN_SNIPPET_TOKENS:
+        return None
+    item = dict(item, snippet=truncate_to_tokens(snippet, room))
+    return item, estimate_tokens(format_result(item)), True
+
+
+def build_search_context(query, items, token_budget):
+    """
+    去重、按相关度排序并截断到 token 预算
+
+    Args:
+        query (str): 用户问题
+        items (list[dict]): 搜索结果（title / snippet / link）
+        token_budget (int): 搜索结果部分的 token 预算，0 表示不限制（仍去重排序）
+
+    Returns:
+        tuple: (选中的结果列表, 统计 dict：candidates / duplicates / selected / truncated / dropped / tokens)
+    """
+    unique, duplicates = dedupe(items)
+    scores = bm25_scores(query, [f"{item.get('title', '')} {item.get('snippet', '')}" for item in unique])
+    # 得分相同时保持搜索引擎原有顺序
+    ranked = [unique[i] for i in sorted(range(len(unique)), key=lambda i: -scores[i])]
+
+    selected, used, truncated = [], 0, 0
+    item_limit = max(int(token_budget * MAX_ITEM_SHARE), MIN_SNIPPET_TOKENS * 2)
+    for item in ranked:
+        if token_budget <= 0:
+            selected.append(item)
+            used += estimate_tokens(format_result(item))
+            continue
+        fitted = _fit(item, min(item_limit, token_budget - used))
+        if fitted is None:
+            # 剩余预算放不下，之后的结果全部丢弃
+            break
+        item, tokens, was_truncated = fitted
+        selected.append(item)
+        used += tokens
+        truncated += was_truncated
+
+    return selected, {
+        "candidates": len(items),
+        "duplicates": duplicates,
+        "selected": len(selected),
+        "truncated": truncated,
+        "dropped": len(ranked) - len(selected),
+        "tokens": used,
+    }
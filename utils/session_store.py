@@ -0,0 +1,234 @@
+"""
+多轮会话存储
+
+LLM 节点默认每次调用只发送系统提示词 + 一轮用户消息。会话节点按会话 ID 保存历史轮次：
+
+- 会话保存在内存中（按最近使用保留最多 max_sessions 个），配置目录后同时写入磁盘，
+  ComfyUI 重启后继续同一会话
+- 每次调用把历史原样追加在系统提示词之后，消息列表只追加不改写，
+  服务商的前缀缓存（OpenAI / DeepSeek / 通义等的自动 prompt caching）可以命中之前的全部轮次
+- 超出 token 预算时一次性把最早的若干轮压缩到预算的一定比例以下（而不是每轮丢一条），
+  压缩后的前缀在之后许多轮内保持不变，缓存继续命中
+- 被压缩的轮次合并为摘要，作为系统提示词之后的第二条 system 消息
+- 同一会话的读取、修改、保存由 session_lock() 串行化，并发执行不会丢失轮次
+
+环境变量:
+- XJ_NODES_SESSION_DIR: 会话持久化目录（默认空，仅保存在内存中）
+- XJ_NODES_SESSION_MAX: 内存中保留的会话数（默认 64）
+"""
+
+import hashlib
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+from . import json_codec
+from .logger import get_logger
+from .tokens import MESSAGE_OVERHEAD, estimate_message_tokens, estimate_messages_tokens, estimate_tokens
+
+logger = get_logger("session_store")
+
+# 摘要消息的前缀
+SUMMARY_HEADER = "以下是此前对话的摘要："
+
+_state_lock = threading.Lock()
+_sessions = OrderedDict()
+# 会话ID -> 锁；没有调用方持有时自动释放
+_session_locks = weakref.WeakValueDictionary()
+_config = {
+    "directory": os.getenv("XJ_NODES_SESSION_DIR", ""),
+    "max_sessions": int(os.getenv("XJ_NODES_SESSION_MAX", "64") or 64),
+}
+
+
+def configure(directory=None, max_sessions=None):
+    """
+    运行时调整会话存储
+
+    Args:
+        directory (str): 持久化目录，空字符串表示仅保存在内存中
+        max_sessions (int): 内存中保留的会话数
+    """
+    with _state_lock:
+        if directory is not None and directory != _config["directory"]:
+            _config["directory"] = directory
+            _sessions.clear()
+        if max_sessions is not None:
+            _config["max_sessions"] = max(1, int(max_sessions))
+
+
+def new_session(session_id):
+    """空会话"""
+    now = time.time()
+    return {"id": session_id, "system_prompt": "", "summary": "", "turns": [], "compacted_turns": 0,
+            "created_at": now, "updated_at": now}
+
+
+# ---------- 磁盘 ----------
+
+def _path(session_id):
+    """会话文件路径（按 ID 的哈希命名，ID 可以包含任意字符）"""
+    name = hashlib.blake2b(session_id.encode("utf-8"), digest_size=12).hexdigest()
+    return os.path.join(_config["directory"], f"{name}.json")
+
+
+def _read(session_id):
+    path = _path(session_id)
+    try:
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                session = json_codec.loads(f.read())
+            if session.get("id") == session_id:
+                return session
+    except Exception as e:
+        logger.warning("会话 %s 无法读取，已重新开始: %s", session_id, e)
+    return None
+
+
+def _write(session):
+    """原子写入会话文件"""
+    path = _path(session["id"])
+    try:
+        os.makedirs(_config["directory"], exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(json_codec.dumps(session))
+        os.replace(temp_path, path)
+    except Exception as e:
+        logger.warning("会话 %s 无法保存: %s", session["id"], e)
+
+
+# ---------- 读写 ----------
+
+def session_lock(session_id):
+    """
+    会话的锁：从 load() 到 save() 期间持有，同一会话的并发执行依次进行
+
+    Returns:
+        threading.Lock: 同一会话ID在被持有期间返回同一个锁
+    """
+    with _state_lock:
+        lock = _session_locks.get(session_id)
+        if lock is None:
+            lock = threading.Lock()
+            _session_locks[session_id] = lock
+        return lock
+
+
+def load(session_id):
+    """
+    读取会话，不存在时返回空会话
+
+    Returns:
+        dict: 会话的副本，修改后调用 save() 保存
+    """
+    with _state_lock:
+        session = _sessions.get(session_id)
+        if session is None and _config["directory"]:
+            session = _read(session_id)
+        if session is None:
+            return new_session(session_id)
+        _sessions[session_id] = session
+        _sessions.move_to_end(session_id)
+        return dict(session, turns=list(session["turns"]))
+
+
+def save(session):
+    """保存会话（内存中超出数量时丢弃最久未使用的会话，磁盘上的不受影响）"""
+    session["updated_at"] = time.time()
+    with _state_lock:
+        _sessions[session["id"]] = session
+        _sessions.move_to_end(session["id"])
+        while len(_sessions) > _config["max_sessions"]:
+            _sessions.popitem(last=False)
+        if _config["directory"]:
+            _write(session)
+
+
+def reset(session_id):
+    """清空会话历史"""
+    with _state_lock:
+        _sessions.pop(session_id, None)
+        if _config["directory"]:
+            try:
+                os.remove(_path(session_id))
+            except FileNotFoundError:
+                pass
+
+
+# ---------- 消息与压缩 ----------
+
+def prefix_messages(session):
+    """稳定前缀：系统提示词 + 摘要"""
+    messages = []
+    if session["system_prompt"]:
+        messages.append({"role": "system", "content": session["system_prompt"]})
+    if session["summary"]:
+        messages.append({"role": "system", "content": f"{SUMMARY_HEADER}\n{session['summary']}"})
+    return messages
+
+
+def build_messages(session, prompt):
+    """本次请求的完整消息列表：前缀 + 历史轮次 + 新的用户消息"""
+    return prefix_messages(session) + session["turns"] + [{"role": "user", "content": prompt}]
+
+
+def plan_compaction(session, prompt, budget, target_ratio=0.5, summary_tokens=0):
+    """
+    判断是否需要压缩，返回应压缩的最早轮次数（按完整的一问一答计）
+
+    未超出预算时返回 0；超出时压缩到预算的 target_ratio 以下，之后多轮内无需再压缩，
+    前缀保持不变。新的用户消息总是保留，即使单独就超出预算。
+
+    Args:
+        session (dict): 会话
+        prompt (str): 新的用户消息
+        budget (int): 请求消息的 token 预算
+        target_ratio (float): 压缩后的目标比例
+        summary_tokens (int): 压缩后新摘要最多占用的 tokens（替换原摘要），0 表示保留原摘要
+
+    Returns:
+        int: 需要压缩的消息条数（偶数）
+    """
+    messages = build_messages(session, prompt)
+    total = estimate_messages_tokens(messages)
+    if total <= budget:
+        return 0
+    target = budget * target_ratio
+    if summary_tokens:
+        # 按新摘要的上限预留空间，压缩后加入摘要也不超出目标
+        if session["summary"]:
+            total -= estimate_message_tokens(prefix_messages(session)[-1])
+        total += MESSAGE_OVERHEAD + estimate_tokens(SUMMARY_HEADER) + summary_tokens
+    count = 0
+    turns = session["turns"]
+    while count < len(turns) and total > target:
+        total -= estimate_message_tokens(turns[count])
+        if count + 1 < len(turns):
+            total -= estimate_message_tokens(turns[count + 1])
+        count += 2
+    return min(count, len(turns))
+
+
+def transcript(turns):
+    """把轮次转换为供摘要使用的文本"""
+    names = {"user": "用户", "assistant": "助手"}
+    return "\n\n".join(f"{names.get(turn['role'], turn['role'])}: {turn['content']}" for turn in turns)
+
+
+def apply_compaction(session, count, summary):
+    """移除最早的 count 条消息，并以 summary 替换原摘要（summary 为 None 时保留原摘要）"""
+    session["turns"] = session["turns"][count:]
+    session["compacted_turns"] += count
+    if summary is not None:
+        session["summary"] = summary.strip()
+    return session
+
+
+def append_turn(session, prompt, reply):
+    """追加一问一答"""
+    session["turns"].append({"role": "user", "content": prompt})
+    session["turns"].append({"role": "assistant", "content": reply})
+    return session
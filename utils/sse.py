@@ -0,0 +1,194 @@
+"""
+Server-Sent Events（SSE）解析工具
+
+用于 OpenAI 兼容 /chat/completions（含火山方舟联网搜索）与 Seedream 组图的流式响应（stream=true）。
+"""
+
+from . import json_codec
+
+# 图像事件的 data 行可达几十 MB，按大块读取
+LARGE_EVENT_CHUNK_SIZE = 256 * 1024
+
+
+def _iter_available(response, chunk_size):
+    """
+    读取已到达的数据：iter_content 要等凑满 chunk_size 才返回，事件末尾的数据会滞留到下一个事件到达；
+    urllib3 2 的 read1 有数据就返回。响应体已完整读取（录制 / 回放）时按块切分
+    """
+    read1 = getattr(getattr(response, "raw", None), "read1", None)
+    if read1 is None or getattr(response, "_content_consumed", True):
+        yield from response.iter_content(chunk_size=chunk_size)
+        return
+    while True:
+        chunk = read1(chunk_size, decode_content=True)
+        if not chunk:
+            break
+        yield chunk
+    response._content_consumed = True
+
+
+def iter_lines(response, chunk_size=LARGE_EVENT_CHUNK_SIZE):
+    """
+    逐行读取流式响应（bytes，不含换行符）
+
+    response.iter_lines() 每读一块都把未结束的行与新块拼接并重新切分，
+    几十 MB 的单行要反复复制；这里在 bytearray 中累积，只在新到的数据中查找换行。
+
+    Args:
+        response: 以 stream=True 发起的 requests 响应
+        chunk_size (int): 每次读取的最大字节数
+
+    Yields:
+        bytes: 每一行
+    """
+    buffer = bytearray()
+    for chunk in _iter_available(response, chunk_size):
+        search = len(buffer)
+        buffer += chunk
+        start = 0
+        while True:
+            end = buffer.find(b"\n", search)
+            if end < 0:
+                break
+            with memoryview(buffer) as view:
+                line = bytes(view[start:end])
+            yield line[:-1] if line.endswith(b"\r") else line
+            start = search = end + 1
+        if start:
+            del buffer[:start]
+    if buffer:
+        yield bytes(buffer)
+
+
+def iter_sse_events(response, blob_keys=None):
+    """
+    逐条解析 SSE 响应中的 data 事件
+
+    Args:
+        response: 以 stream=True 发起的 requests 响应
+        blob_keys (tuple[str]): 指定时用 json_codec.loads_with_blobs 解析，
+            这些字段的值为 memoryview（用于 b64_json 等图像事件）
+
+    Yields:
+        dict: 每个 data 行解析后的 JSON；遇到 [DONE] 时结束
+    """
+    for raw_line in iter_lines(response):
+        if not raw_line:
+            continue
+        if blob_keys:
+            if not raw_line.startswith(b"data:"):
+                continue
+            if len(raw_line) < 32 and raw_line[5:].strip() == b"[DONE]":
+                break
+            yield json_codec.loads_with_blobs(raw_line, blob_keys, start=5)
+            continue
+        line = raw_line.decode("utf-8")
+        if not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if data == "[DONE]":
+            break
+        yield json_codec.loads(data)
+
+
+class ChatStreamMerger:
+    """
+    逐个合并 chat.completion.chunk 事件（merge_chat_stream 的增量版本），
+    供需要边接收边展示内容的节点使用
+
+    除文本内容外还合并 reasoning_content、按 index 拼接的 tool_calls 分片，
+    以及火山方舟联网搜索返回的 references。
+    """
+
+    def __init__(self):
+        self.merged = {"object": "chat.completion", "choices": []}
+        self.role = "assistant"
+        self.finish_reason = None
+        self.references = []
+        self._content_parts = []
+        self._reasoning_parts = []
+        self._tool_calls = {}
+
+    @property
+    def content(self):
+        """目前收到的全部文本内容"""
+        return "".join(self._content_parts)
+
+    def add(self, event):
+        """
+        合并一个事件
+
+        Args:
+            event (dict): iter_sse_events 产生的事件
+
+        Returns:
+            tuple: (本事件的文本增量, 本事件中新出现的工具调用列表)
+        """
+        for key in ("id", "model", "created"):
+            if key in event and key not in self.merged:
+                self.merged[key] = event[key]
+        if event.get("usage"):
+            self.merged["usage"] = event["usage"]
+        if event.get("references"):
+            self.references.extend(event["references"])
+
+        content = []
+        started = []
+        for choice in event.get("choices") or []:
+            delta = choice.get("delta") or {}
+            self.role = delta.get("role") or self.role
+            if delta.get("content"):
+                self._content_parts.append(delta["content"])
+                content.append(delta["content"])
+            if delta.get("reasoning_content"):
+                self._reasoning_parts.append(delta["reasoning_content"])
+            for call in delta.get("tool_calls") or []:
+                index = call.get("index", len(self._tool_calls))
+                merged_call = self._tool_calls.get(index)
+                if merged_call is None:
+                    merged_call = self._tool_calls[index] = {
+                        "id": call.get("id"), "type": call.get("type") or "function",
+                        "function": {"name": "", "arguments": ""}}
+                    started.append(merged_call)
+                for key, value in call.items():
+                    if key == "function":
+                        value = value or {}
+                        merged_call["function"]["name"] += value.get("name") or ""
+                        merged_call["function"]["arguments"] += value.get("arguments") or ""
+                    elif key != "index" and value is not None:
+                        merged_call[key] = value
+            if choice.get("finish_reason"):
+                self.finish_reason = choice["finish_reason"]
+        return "".join(content), started
+
+    def result(self):
+        """
+        Returns:
+            dict: 与非流式 /chat/completions 响应相同结构的字典
+        """
+        message = {"role": self.role, "content": self.content}
+        if self._reasoning_parts:
+            message["reasoning_content"] = "".join(self._reasoning_parts)
+        if self._tool_calls:
+            message["tool_calls"] = [self._tool_calls[index] for index in sorted(self._tool_calls)]
+        merged = dict(self.merged)
+        merged["choices"] = [{"index": 0, "message": message, "finish_reason": self.finish_reason}]
+        if self.references:
+            merged["references"] = self.references
+        return merged
+
+
+def merge_chat_stream(events):
+    """
+    将 chat.completion.chunk 事件合并为非流式响应结构
+
+    Args:
+        events: iter_sse_events 产生的事件序列
+
+    Returns:
+        dict: 与非流式 /chat/completions 响应相同结构的字典
+    """
+    merger = ChatStreamMerger()
+    for event in events:
+        merger.add(event)
+    return merger.result()
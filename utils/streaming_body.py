@@ -0,0 +1,150 @@
+"""
+流式 JSON 请求体
+
+图像类接口的请求体几乎全部是 base64 图像。常规写法会依次生成 base64 字符串、
+json.dumps 后的整段 JSON、requests 编码后的 bytes，4K 图像时每次请求多出几份 20~40MB 的副本。
+
+节点在 payload 中用 Base64Blob 包装编码后的图像字节，transport 发送时把 payload 转成 JSONBody：
+JSON 信封只序列化一次（不含图像），图像字节按块 base64 编码后直接写入 socket，
+每个在途请求额外占用的内存只有一个块的大小。
+
+JSONBody 可重复迭代（录制回放计算请求体哈希后仍可发送）且实现 __len__，
+requests 据此设置 Content-Length，不使用 chunked 编码。不含 Base64Blob 的 payload
+与 requests 的 json= 参数序列化结果逐字节相同。
+"""
+
+import base64
+import json
+import re
+import uuid
+
+# 每块原始字节数（3 的倍数，对应 64KB base64）
+RAW_CHUNK_SIZE = 48 * 1024
+
+
+class Base64Blob:
+    """
+    JSON 字符串值 prefix + base64(data)，发送时按块编码
+
+    Args:
+        data (bytes): 编码后的图像字节（PNG/JPEG 等）
+        prefix (str): 字符串前缀，如 "data:image/png;base64,"
+    """
+
+    __slots__ = ("data", "prefix", "_prefix_bytes")
+
+    def __init__(self, data, prefix=""):
+        self.data = data
+        self.prefix = prefix
+        self._prefix_bytes = json.dumps(prefix)[1:-1].encode("ascii")
+
+    def __len__(self):
+        """字符串值的长度（与 str(blob) 相同）"""
+        return len(self.prefix) + 4 * ((len(self.data) + 2) // 3)
+
+    def __str__(self):
+        return self.prefix + base64.b64encode(self.data).decode("ascii")
+
+    def __repr__(self):
+        return f"<Base64Blob prefix={self.prefix!r} bytes={len(self.data)}>"
+
+    def encoded_size(self):
+        """写入 JSON 后占用的字节数（不含两侧引号）"""
+        return len(self._prefix_bytes) + 4 * ((len(self.data) + 2) // 3)
+
+    def iter_encoded(self, chunk_size=RAW_CHUNK_SIZE):
+        """按块产出 JSON 转义后的前缀与 base64 内容"""
+        if self._prefix_bytes:
+            yield self._prefix_bytes
+        view = memoryview(self.data)
+        for start in range(0, len(view), chunk_size):
+            yield base64.b64encode(view[start:start + chunk_size])
+
+
+def data_uri(value, mime):
+    """
+    构造图像 data URI
+
+    Args:
+        value (bytes | str): 图像字节（返回流式 Base64Blob）或已编码的 base64 字符串
+        mime (str): 如 "image/png"
+
+    Returns:
+        Base64Blob | str
+    """
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return Base64Blob(value, f"data:{mime};base64,")
+    return f"data:{mime};base64,{value}"
+
+
+def contains_blobs(obj):
+    """payload 中是否包含 Base64Blob"""
+    if isinstance(obj, Base64Blob):
+        return True
+    if isinstance(obj, dict):
+        return any(contains_blobs(v) for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return any(contains_blobs(v) for v in obj)
+    return False
+
+
+def materialize(obj):
+    """把 payload 中的 Base64Blob 换成普通字符串（用于需要完整 JSON 文本的场景，如批量任务的 JSONL）"""
+    if isinstance(obj, Base64Blob):
+        return str(obj)
+    if isinstance(obj, dict):
+        return {k: materialize(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [materialize(v) for v in obj]
+    return obj
+
+
+class JSONBody:
+    """
+    可重复迭代的流式 JSON 请求体
+
+    Args:
+        payload (dict): 请求数据，可包含 Base64Blob
+        chunk_size (int): base64 编码的每块原始字节数
+    """
+
+    def __init__(self, payload, chunk_size=RAW_CHUNK_SIZE):
+        self.chunk_size = chunk_size - chunk_size % 3 or 3
+        token = f"xj-blob-{uuid.uuid4().hex}"
+        blobs = []
+
+        def replace(obj):
+            if isinstance(obj, Base64Blob):
+                blobs.append(obj)
+                return f"{token}:{len(blobs) - 1}"
+            if isinstance(obj, dict):
+                return {k: replace(v) for k, v in obj.items()}
+            if isinstance(obj, (list, tuple)):
+                return [replace(v) for v in obj]
+            return obj
+
+        # 与 requests 的 json= 参数使用相同的序列化选项
+        envelope = json.dumps(replace(payload), allow_nan=False)
+        pieces = re.split(f"{token}:(\\d+)", envelope)
+        # pieces 交替为信封文本与占位序号，占位符两侧的引号保留在信封文本中
+        self._parts = []
+        for index, piece in enumerate(pieces):
+            if index % 2:
+                self._parts.append(blobs[int(piece)])
+            elif piece:
+                self._parts.append(piece.encode("utf-8"))
+        self._length = sum(part.encoded_size() if isinstance(part, Base64Blob) else len(part)
+                           for part in self._parts)
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        for part in self._parts:
+            if isinstance(part, Base64Blob):
+                yield from part.iter_encoded(self.chunk_size)
+            else:
+                yield part
+
+    def __repr__(self):
+        return f"<JSONBody {self._length} bytes>"
@@ -0,0 +1,79 @@
+"""
+token 数估算
+
+不同服务商的分词器各不相同，节点只需要预算级别的估算（判断何时压缩历史、截断上下文），
+不引入 tiktoken 等依赖：
+
+- 中日韩字符约 1 个 token
+- 其他字符约 4 个字符 1 个 token
+- 每条消息另计少量格式开销，图像按固定值估算
+"""
+
+import re
+
+# 每条消息的格式开销（role、分隔符等）
+MESSAGE_OVERHEAD = 4
+# 单张图像的估算 tokens（低分辨率模式约 85，高分辨率约 1000+，按偏大估算）
+IMAGE_TOKENS = 1000
+
+_WIDE_CHARS = re.compile("[\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]")
+
+
+def estimate_tokens(text):
+    """
+    估算文本的 token 数
+
+    Args:
+        text (str): 任意文本
+
+    Returns:
+        int: 估算的 token 数
+    """
+    if not text:
+        return 0
+    wide = len(_WIDE_CHARS.findall(text))
+    return wide + (len(text) - wide + 3) // 4
+
+
+def estimate_message_tokens(message):
+    """估算一条 chat 消息的 token 数（content 可以是字符串或多段 content 列表）"""
+    content = message.get("content")
+    tokens = MESSAGE_OVERHEAD
+    if isinstance(content, str):
+        tokens += estimate_tokens(content)
+    elif isinstance(content, list):
+        for part in content:
+            if part.get("type") == "text":
+                tokens += estimate_tokens(part.get("text", ""))
+            else:
+                tokens += IMAGE_TOKENS
+    return tokens
+
+
+def estimate_messages_tokens(messages):
+    """估算消息列表的 token 数"""
+    return sum(estimate_message_tokens(message) for message in messages)
+
+
+def truncate_to_tokens(text, max_tokens, suffix="…"):
+    """
+    把文本截断到约 max_tokens 个 token 以内（按估算值，从末尾截断）
+
+    Args:
+        text (str): 原文本
+        max_tokens (int): token 上限
+        suffix (str): 截断后追加的标记
+
+    Returns:
+        str: 未超出时原样返回
+    """
+    tokens = estimate_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+    # 按比例估计截断位置，再逐步收缩（中英文混排时比例不准）
+    end = max(1, len(text) * max_tokens // tokens)
+    while end > 1 and estimate_tokens(text[:end].rstrip() + suffix) > max_tokens:
+        end = end * 9 // 10
+    return text[:end].rstrip() + suffix
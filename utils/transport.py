@@ -0,0 +1,354 @@
+"""
+HTTP 传输层
+
+所有节点的 HTTP 请求都通过本模块发出（transport.get / transport.post），
+支持三种模式：
+
+- live:   直接访问第三方接口（默认），复用同一个连接池
+- record: 访问真实接口，同时把请求/响应写入 cassette 目录
+- replay: 不访问网络，从 cassette 目录按请求内容回放响应，可按原始或缩放后的耗时回放
+
+cassette 目录结构:
+    exchanges.jsonl      每行一次请求/响应交换（API Key 等敏感信息已脱敏）
+    blobs/<sha256>       超过阈值的请求/响应体，按内容寻址存储（相同内容只存一份）
+
+环境变量:
+- XJ_NODES_TRANSPORT: live / record / replay
+- XJ_NODES_CASSETTE_DIR: cassette 目录，默认当前目录下的 xj_nodes_cassettes
+- XJ_NODES_REPLAY_TIMING: 回放耗时缩放系数，1 为原始耗时，0 为不等待（默认 0）
+- XJ_NODES_HTTP_TIMEOUT_CAP: 请求超时上限（秒），压测时用于缩短各节点自带的超时
+"""
+
+import base64
+import hashlib
+import http.cookiejar
+import os
+import threading
+import time
+from collections import deque
+from datetime import timedelta
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from . import json_codec
+from .lazy_import import lazy_import
+from .logger import get_logger
+from .streaming_body import JSONBody, contains_blobs
+
+requests = lazy_import("requests")
+
+logger = get_logger("transport")
+
+MODES = ("live", "record", "replay")
+
+# 超过该大小的请求/响应体写入 blobs/ 目录
+BLOB_THRESHOLD = 64 * 1024
+
+# 需要脱敏的请求头与查询参数（小写）
+SENSITIVE_HEADERS = {"authorization", "x-api-key", "api-key", "proxy-authorization", "cookie"}
+SENSITIVE_PARAMS = {"api_key", "key", "token", "access_token", "apikey"}
+REDACTED = "REDACTED"
+
+_state_lock = threading.Lock()
+_session = None
+_cassette = None
+_config = {
+    "mode": os.getenv("XJ_NODES_TRANSPORT", "live").strip().lower() or "live",
+    "cassette_dir": os.getenv("XJ_NODES_CASSETTE_DIR", "xj_nodes_cassettes"),
+    "timing_scale": float(os.getenv("XJ_NODES_REPLAY_TIMING", "0") or 0),
+    "timeout_cap": float(os.getenv("XJ_NODES_HTTP_TIMEOUT_CAP", "0") or 0) or None,
+}
+
+
+class CassetteMissError(Exception):
+    """回放模式下找不到匹配的录制记录"""
+
+
+def configure(mode=None, cassette_dir=None, timing_scale=None, timeout_cap=None):
+    """
+    运行时切换传输模式
+
+    Args:
+        mode (str): live / record / replay
+        cassette_dir (str): cassette 目录
+        timing_scale (float): 回放耗时缩放系数
+        timeout_cap (float): 请求超时上限（秒），0 表示取消上限
+    """
+    global _cassette
+    with _state_lock:
+        if mode is not None:
+            if mode not in MODES:
+                raise ValueError(f"未知的传输模式: {mode}，可选: {', '.join(MODES)}")
+            _config["mode"] = mode
+        if cassette_dir is not None:
+            _config["cassette_dir"] = cassette_dir
+        if timing_scale is not None:
+            _config["timing_scale"] = float(timing_scale)
+        if timeout_cap is not None:
+            _config["timeout_cap"] = float(timeout_cap) or None
+        _cassette = None
+
+
+def get_mode():
+    """返回当前传输模式"""
+    return _config["mode"]
+
+
+def get_session():
+    """
+    返回共享的 requests.Session（线程安全地惰性创建）
+
+    所有节点共用一个连接池，避免每次调用重新建立 TCP/TLS 连接。
+    """
+    global _session
+    if _session is None:
+        with _state_lock:
+            if _session is None:
+                session = requests.Session()
+                # 所有服务商共用一个会话，不保存任何 Cookie，避免跨服务商携带
+                session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+                adapter = requests.adapters.HTTPAdapter(pool_connections=16, pool_maxsize=64)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+
+def _get_cassette():
+    global _cassette
+    if _cassette is None:
+        with _state_lock:
+            if _cassette is None:
+                _cassette = Cassette(_config["cassette_dir"])
+    return _cassette
+
+
+def request(method, url, timeout=None, stream=False, **kwargs):
+    """
+    发送 HTTP 请求（签名与 requests.request 一致）
+
+    json= 中包含 Base64Blob 时改用流式请求体（utils.streaming_body），图像按块编码后直接写入 socket。
+
+    Returns:
+        requests.Response
+    """
+    if kwargs.get("json") is not None and contains_blobs(kwargs["json"]):
+        kwargs["data"] = JSONBody(kwargs.pop("json"))
+        headers = dict(kwargs.get("headers") or {})
+        if not any(k.lower() == "content-type" for k in headers):
+            headers["Content-Type"] = "application/json"
+        kwargs["headers"] = headers
+    prepared = get_session().prepare_request(requests.Request(method.upper(), url, **kwargs))
+    mode = _config["mode"]
+
+    if mode == "replay":
+        return _get_cassette().replay(prepared, timing_scale=_config["timing_scale"])
+
+    cap = _config["timeout_cap"]
+    if cap is not None:
+        timeout = cap if timeout is None else min(timeout, cap)
+
+    start = time.perf_counter()
+    response = get_session().send(prepared, timeout=timeout, stream=stream)
+    if mode == "record":
+        headers_elapsed = time.perf_counter() - start
+        body = response.content  # 录制时需要读取完整响应体
+        _get_cassette().record(prepared, response, body,
+                               headers_elapsed, time.perf_counter() - start)
+    return response
+
+
+def raise_for_status(response):
+    """
+    检查状态码（替代 response.raise_for_status()）
+
+    失败时先读取完整响应体再抛出：流式响应随后在 with 块中关闭，
+    异常处理中仍可从 e.response 读取服务商返回的错误详情。
+    """
+    if not response.ok:
+        response.content
+    response.raise_for_status()
+
+
+def get(url, **kwargs):
+    """发送 GET 请求"""
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    """发送 POST 请求"""
+    return request("POST", url, **kwargs)
+
+
+# ---------- 脱敏与匹配 ----------
+
+def redact_url(url):
+    """去掉 URL 查询参数中的密钥"""
+    parts = urlsplit(url)
+    if not parts.query:
+        return url
+    query = [(k, REDACTED if k.lower() in SENSITIVE_PARAMS else v)
+             for k, v in parse_qsl(parts.query, keep_blank_values=True)]
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def redact_headers(headers):
+    """去掉请求头中的密钥"""
+    return {k: (REDACTED if k.lower() in SENSITIVE_HEADERS else v) for k, v in headers.items()}
+
+
+def body_bytes(body):
+    """把 PreparedRequest.body 规整为 bytes（可迭代请求体会被完整读取）"""
+    if body is None:
+        return b""
+    if isinstance(body, bytes):
+        return body
+    if isinstance(body, str):
+        return body.encode("utf-8")
+    if hasattr(body, "read"):
+        data = body.read()
+        if hasattr(body, "seek"):
+            body.seek(0)
+        return data if isinstance(data, bytes) else data.encode("utf-8")
+    return b"".join(chunk if isinstance(chunk, bytes) else chunk.encode("utf-8") for chunk in body)
+
+
+def exchange_key(method, redacted_url, body_sha256):
+    """请求的匹配键：方法 + 脱敏 URL + 请求体哈希"""
+    return hashlib.sha256(f"{method} {redacted_url} {body_sha256}".encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """
+    cassette 目录的读写
+
+    回放时同一匹配键的多条记录按录制顺序依次返回（例如轮询同一任务的多次查询），
+    用完后重复最后一条。没有录制过该请求体时才按方法+URL匹配其他请求体的记录。
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.blob_dir = os.path.join(directory, "blobs")
+        self.index_path = os.path.join(directory, "exchanges.jsonl")
+        self._lock = threading.Lock()
+        self._by_key = None
+        self._by_url = None
+
+    # ----- 存储 -----
+
+    def _store_body(self, data):
+        """小的文本体内联保存，大体积或二进制内容按 sha256 写入 blobs/"""
+        digest = hashlib.sha256(data).hexdigest()
+        if len(data) <= BLOB_THRESHOLD:
+            try:
+                return {"text": data.decode("utf-8"), "sha256": digest}
+            except UnicodeDecodeError:
+                return {"b64": base64.b64encode(data).decode("ascii"), "sha256": digest}
+        os.makedirs(self.blob_dir, exist_ok=True)
+        path = os.path.join(self.blob_dir, digest)
+        if not os.path.exists(path):
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return {"blob": digest, "size": len(data), "sha256": digest}
+
+    def _load_body(self, stored):
+        if "text" in stored:
+            return stored["text"].encode("utf-8")
+        if "b64" in stored:
+            return base64.b64decode(stored["b64"])
+        with open(os.path.join(self.blob_dir, stored["blob"]), "rb") as f:
+            return f.read()
+
+    def record(self, prepared, response, body, headers_elapsed, total_elapsed):
+        """追加一条交换记录"""
+        request_body = body_bytes(prepared.body)
+        url = redact_url(prepared.url)
+        request_sha = hashlib.sha256(request_body).hexdigest()
+        entry = {
+            "key": exchange_key(prepared.method, url, request_sha),
+            "method": prepared.method,
+            "url": url,
+            "recorded_at": time.time(),
+            "request": {
+                "headers": redact_headers(prepared.headers),
+                "body": self._store_body(request_body) if request_body else None,
+            },
+            "response": {
+                "status": response.status_code,
+                "reason": response.reason,
+                "headers": dict(response.headers),
+                "body": self._store_body(body),
+            },
+            "elapsed": headers_elapsed,
+            "total_elapsed": total_elapsed,
+        }
+        line = json_codec.dumps(entry)
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self.index_path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+            self._by_key = None
+            self._by_url = None
+
+    # ----- 回放 -----
+
+    def _load_index(self):
+        by_key, by_url = {}, {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    # 两个索引共享同一条记录，按任一索引取出后在另一个索引中也视为已使用
+                    record = {"entry": json_codec.loads(line), "used": False}
+                    by_key.setdefault(record["entry"]["key"], deque()).append(record)
+                    by_url.setdefault((record["entry"]["method"], record["entry"]["url"]), deque()).append(record)
+        self._by_key, self._by_url = by_key, by_url
+
+    @staticmethod
+    def _take(records):
+        """取出最早一条未使用的记录；全部用完时重复最后一条"""
+        while len(records) > 1 and records[0]["used"]:
+            records.popleft()
+        record = records[0]
+        record["used"] = True
+        if len(records) > 1:
+            records.popleft()
+        return record["entry"]
+
+    def _next_entry(self, prepared):
+        url = redact_url(prepared.url)
+        key = exchange_key(prepared.method, url, hashlib.sha256(body_bytes(prepared.body)).hexdigest())
+        with self._lock:
+            if self._by_key is None:
+                self._load_index()
+            # 完整请求内容有记录时只在这些记录中取（用完后重复最后一条），
+            # 不会拿到同一 URL 下其他请求体的响应；没有记录时才按方法+URL匹配
+            for records in (self._by_key.get(key), self._by_url.get((prepared.method, url))):
+                if records:
+                    return self._take(records)
+        raise CassetteMissError(f"cassette 中没有匹配的记录: {prepared.method} {url}")
+
+    def replay(self, prepared, timing_scale=0.0):
+        """构造与录制时一致的 requests.Response"""
+        try:
+            entry = self._next_entry(prepared)
+        except CassetteMissError as e:
+            raise requests.exceptions.ConnectionError(str(e), request=prepared)
+
+        if timing_scale > 0:
+            time.sleep(entry.get("total_elapsed", entry.get("elapsed", 0)) * timing_scale)
+
+        stored = entry["response"]
+        response = requests.Response()
+        response.status_code = stored["status"]
+        response.reason = stored.get("reason")
+        response.headers = requests.structures.CaseInsensitiveDict(stored["headers"])
+        response._content = self._load_body(stored["body"])
+        response._content_consumed = True
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response.url = prepared.url
+        response.request = prepared
+        response.elapsed = timedelta(seconds=entry.get("elapsed", 0))
+        return response
@@ -0,0 +1,278 @@
+"""
+图像上传缓存（可选）
+
+同一张图像配合不同提示词反复调用时，每次请求都要内联几 MB 的 base64。开启后，
+节点先把编码后的图像上传一次，之后在有效期内只在请求中引用 URL，请求体从 MB 级降到几百字节：
+
+- dashscope: 阿里云百炼临时存储（/api/v1/uploads getPolicy + OSS 表单上传），得到 oss:// 地址，
+  有效期 48 小时，只能用于上传时指定的模型；请求需带 X-DashScope-OssResourceResolve: enable 头
+- store: 自建对象存储（MinIO / S3 预签名网关 / 任意支持 PUT 的 HTTP 服务），
+  PUT {STORE_URL}/{sha256}.{ext}，请求中引用 {PUBLIC_URL}/{sha256}.{ext}
+
+缓存按编码后图像的 SHA-256 寻址（dashscope 另按 API Key 与模型区分），索引保存在磁盘上，
+ComfyUI 重启后仍可复用未过期的引用。上传失败时节点回退为内联 base64，不影响调用。
+
+环境变量:
+- XJ_NODES_UPLOAD_CACHE: 1 开启（默认 0，关闭）
+- XJ_NODES_UPLOAD_STORE_URL: 对象存储的 PUT 地址前缀；未设置时非 DashScope 接口仍内联图像
+- XJ_NODES_UPLOAD_PUBLIC_URL: 服务商访问图像使用的地址前缀（默认同 STORE_URL）
+- XJ_NODES_UPLOAD_STORE_TOKEN: PUT 请求的 Bearer Token（可选）
+- XJ_NODES_UPLOAD_TTL: 对象存储中图像的保留时间（秒，默认 86400），应不超过存储的生命周期规则
+- XJ_NODES_UPLOAD_INDEX: 磁盘索引路径（默认 ~/.cache/xj_nodes/uploads.json）
+"""
+
+import hashlib
+import os
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+from . import json_codec, transport
+from .logger import get_logger
+from .streaming_body import data_uri
+
+logger = get_logger("upload_cache")
+
+BACKENDS = ("dashscope", "store")
+
+# DashScope 临时存储
+DASHSCOPE_POLICY_URL = "https://dashscope.aliyuncs.com/api/v1/uploads"
+DASHSCOPE_TTL = 48 * 3600
+# 引用 oss:// 地址的请求需要携带的请求头
+OSS_RESOLVE_HEADER = ("X-DashScope-OssResourceResolve", "enable")
+
+# 距过期不足该秒数的引用视为失效，避免请求途中过期
+EXPIRY_MARGIN = 600
+# 上传失败后该后端暂停上传的秒数（期间直接内联，避免每次调用都等待超时）
+FAILURE_BACKOFF = 300
+
+_EXTENSIONS = {"image/png": ".png", "image/jpeg": ".jpg", "image/webp": ".webp"}
+
+_state_lock = threading.Lock()
+_index = None
+_backoff_until = {}
+_stats = {"hits": 0, "uploads": 0, "failures": 0, "bytes_saved": 0}
+_config = {
+    "enabled": os.getenv("XJ_NODES_UPLOAD_CACHE", "0").strip().lower() in ("1", "true", "on", "yes"),
+    "store_url": os.getenv("XJ_NODES_UPLOAD_STORE_URL", "").rstrip("/"),
+    "public_url": os.getenv("XJ_NODES_UPLOAD_PUBLIC_URL", "").rstrip("/"),
+    "store_token": os.getenv("XJ_NODES_UPLOAD_STORE_TOKEN", ""),
+    "ttl": float(os.getenv("XJ_NODES_UPLOAD_TTL", "86400") or 86400),
+    "index_path": os.getenv("XJ_NODES_UPLOAD_INDEX",
+                            os.path.join(os.path.expanduser("~"), ".cache", "xj_nodes", "uploads.json")),
+}
+
+
+def configure(enabled=None, store_url=None, public_url=None, store_token=None, ttl=None, index_path=None):
+    """
+    运行时调整上传缓存
+
+    Args:
+        enabled (bool): 是否开启
+        store_url (str): 对象存储的 PUT 地址前缀，空字符串表示不使用对象存储
+        public_url (str): 服务商访问图像使用的地址前缀
+        store_token (str): PUT 请求的 Bearer Token
+        ttl (float): 对象存储中图像的保留时间（秒）
+        index_path (str): 磁盘索引路径；改变后重新加载
+    """
+    global _index
+    with _state_lock:
+        _backoff_until.clear()
+        if enabled is not None:
+            _config["enabled"] = bool(enabled)
+        if store_url is not None:
+            _config["store_url"] = store_url.rstrip("/")
+        if public_url is not None:
+            _config["public_url"] = public_url.rstrip("/")
+        if store_token is not None:
+            _config["store_token"] = store_token
+        if ttl is not None:
+            _config["ttl"] = float(ttl)
+        if index_path is not None and index_path != _config["index_path"]:
+            _config["index_path"] = index_path
+            _index = None
+
+
+def enabled(backend):
+    """指定后端是否可用（dashscope 开启即可用，store 还需配置 STORE_URL）"""
+    if not _config["enabled"]:
+        return False
+    if backend == "store":
+        return bool(_config["store_url"])
+    return backend == "dashscope"
+
+
+def backend_for(api_url):
+    """按接口地址选择后端：DashScope（含 OpenAI 兼容模式）用临时存储，其他用对象存储"""
+    return "dashscope" if "dashscope" in (api_url or "") else "store"
+
+
+def stats():
+    """返回命中、上传、失败次数与省去的上传字节数"""
+    with _state_lock:
+        return dict(_stats)
+
+
+# ---------- 磁盘索引 ----------
+
+def _load_index():
+    """加载磁盘索引并丢弃过期条目（调用方持有 _state_lock）"""
+    global _index
+    if _index is None:
+        _index = {}
+        path = _config["index_path"]
+        try:
+            if os.path.exists(path):
+                with open(path, "r", encoding="utf-8") as f:
+                    _index = json_codec.loads(f.read())
+        except Exception as e:
+            logger.warning("上传缓存索引无法读取，已忽略: %s", e)
+            _index = {}
+        now = time.time()
+        _index = {key: entry for key, entry in _index.items() if entry.get("expires_at", 0) > now}
+    return _index
+
+
+def _save_index():
+    """原子写入磁盘索引（调用方持有 _state_lock）"""
+    path = _config["index_path"]
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(json_codec.dumps(_index))
+        os.replace(temp_path, path)
+    except Exception as e:
+        logger.warning("上传缓存索引无法保存: %s", e)
+
+
+def _cache_key(backend, digest, api_key=None, model=None):
+    if backend == "dashscope":
+        # 临时存储的文件只能由上传它的账号、用于指定的模型；索引中不保存 API Key 明文
+        scope = hashlib.blake2b(f"{api_key}\0{model}".encode("utf-8"), digest_size=8).hexdigest()
+        return f"dashscope:{scope}:{digest}"
+    return f"store:{_config['public_url'] or _config['store_url']}:{digest}"
+
+
+# ---------- 上传 ----------
+
+def _upload_dashscope(data, name, mime, api_key, model):
+    """上传到 DashScope 临时存储，返回 (oss:// 地址, 有效期秒数)"""
+    response = transport.get(DASHSCOPE_POLICY_URL, params={"action": "getPolicy", "model": model},
+                             headers={"Authorization": f"Bearer {api_key}"}, timeout=30)
+    response.raise_for_status()
+    policy = json_codec.response_json(response)["data"]
+    key = f"{policy['upload_dir']}/{name}"
+    fields = {
+        "OSSAccessKeyId": policy["oss_access_key_id"],
+        "Signature": policy["signature"],
+        "policy": policy["policy"],
+        "x-oss-object-acl": policy["x_oss_object_acl"],
+        "x-oss-forbid-overwrite": policy["x_oss_forbid_overwrite"],
+        "key": key,
+        "success_action_status": "200",
+    }
+    files = [(field, (None, value)) for field, value in fields.items()]
+    files.append(("file", (name, data, mime)))
+    response = transport.post(policy["upload_host"], files=files, timeout=120)
+    response.raise_for_status()
+    return f"oss://{key}", DASHSCOPE_TTL
+
+
+def _remaining_ttl(response):
+    """
+    已存在对象的剩余保留时间：按 HEAD 响应的 Last-Modified 计算（生命周期规则按对象写入时间删除）
+
+    Returns:
+        float | None: 剩余秒数；没有或无法解析 Last-Modified 时返回 None
+    """
+    try:
+        modified = parsedate_to_datetime(response.headers["Last-Modified"]).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return None
+    return _config["ttl"] - max(0.0, time.time() - modified)
+
+
+def _upload_store(data, name, mime):
+    """上传到对象存储（已存在且未临近过期的同名对象跳过上传），返回 (公开地址, 有效期秒数)"""
+    headers = {}
+    if _config["store_token"]:
+        headers["Authorization"] = f"Bearer {_config['store_token']}"
+    target = f"{_config['store_url']}/{name}"
+    public = f"{_config['public_url'] or _config['store_url']}/{name}"
+    # 按内容命名，其他进程或机器可能已经上传过；有效期从对方上传的时间算起，
+    # 无法确定上传时间或即将过期时重新上传，刷新对象的写入时间
+    response = transport.request("HEAD", target, headers=headers, timeout=30)
+    if response.status_code == 200:
+        remaining = _remaining_ttl(response)
+        if remaining is not None and remaining > EXPIRY_MARGIN:
+            return public, remaining
+    response = transport.request("PUT", target, data=data,
+                                 headers=dict(headers, **{"Content-Type": mime}), timeout=120)
+    response.raise_for_status()
+    return public, _config["ttl"]
+
+
+def resolve(data, mime, backend, api_key=None, model=None):
+    """
+    返回已上传图像的引用地址，未上传过时先上传
+
+    Args:
+        data (bytes): 编码后的图像
+        mime (str): 如 "image/png"
+        backend (str): dashscope / store
+        api_key (str): DashScope API Key（dashscope 后端）
+        model (str): 使用该图像的模型（dashscope 后端）
+
+    Returns:
+        str | None: 图像地址；未开启或上传失败时返回 None，调用方应内联图像
+    """
+    if not data or not enabled(backend):
+        return None
+    digest = hashlib.sha256(data).hexdigest()
+    key = _cache_key(backend, digest, api_key, model)
+    now = time.time()
+    with _state_lock:
+        entry = _load_index().get(key)
+        if entry is not None and entry["expires_at"] - EXPIRY_MARGIN > now:
+            _stats["hits"] += 1
+            _stats["bytes_saved"] += len(data)
+            logger.debug("上传缓存命中: %s", entry["url"])
+            return entry["url"]
+
+    if _backoff_until.get(backend, 0) > now:
+        return None
+
+    name = f"{digest}{_EXTENSIONS.get(mime, '.bin')}"
+    try:
+        if backend == "dashscope":
+            url, ttl = _upload_dashscope(data, name, mime, api_key, model)
+        else:
+            url, ttl = _upload_store(data, name, mime)
+    except Exception as e:
+        with _state_lock:
+            _stats["failures"] += 1
+            _backoff_until[backend] = time.time() + FAILURE_BACKOFF
+        logger.warning("图像上传失败，%d 秒内改为内联 base64: %s", FAILURE_BACKOFF, e)
+        return None
+
+    with _state_lock:
+        _load_index()[key] = {"url": url, "expires_at": now + ttl, "size": len(data)}
+        _stats["uploads"] += 1
+        _save_index()
+    logger.info("已上传图像 %d KB -> %s，有效期 %.0f 小时", len(data) // 1024, url, ttl / 3600)
+    return url
+
+
+def image_value(data, mime, backend, api_key=None, model=None):
+    """
+    请求中图像字段的值：已上传时为地址，否则为 data URI（Base64Blob，由 transport 流式发送）
+    """
+    return resolve(data, mime, backend, api_key, model) or data_uri(data, mime)
+
+
+def add_oss_header(headers, *values):
+    """values 中有 oss:// 地址时，为请求头加上 DashScope 的 OSS 地址解析开关"""
+    if any(isinstance(value, str) and value.startswith("oss://") for value in values):
+        headers[OSS_RESOLVE_HEADER[0]] = OSS_RESOLVE_HEADER[1]
+    return headers